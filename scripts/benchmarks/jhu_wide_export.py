@@ -0,0 +1,155 @@
+"""Benchmark `jhu.shared.standard_export` against the previous implementation (one pivot per measure).
+
+Builds the JHU table from the current public files (`public/data/jhu/`), exports it with both implementations, checks
+that all exported CSVs are identical and prints their execution times.
+
+Example usage:
+
+```
+python benchmarks/jhu_wide_export.py --repeat 3
+```
+"""
+import os
+import argparse
+import filecmp
+import tempfile
+import time
+
+import pandas as pd
+
+from cowidev.utils.utils import get_project_dir
+from cowidev.jhu.shared import (
+    BASE_MEASURES,
+    FULL_DATA_COLS,
+    GRAPHER_COL_NAMES,
+    JHU_LONG_FILENAME,
+    KEYS,
+    PER_MILLION_MEASURES,
+    existsin,
+    get_aggregates_spec,
+    inject_biweekly_growth,
+    inject_cfr,
+    inject_days_since,
+    inject_doubling_days,
+    inject_exemplars,
+    inject_owid_aggregates,
+    inject_per_million,
+    inject_rolling_avg,
+    inject_weekly_growth,
+    standard_export,
+    zero_day,
+)
+
+
+JHU_DIR = os.path.join(get_project_dir(), "public", "data", "jhu")
+GRAPHER_NAME = "COVID-19 - Johns Hopkins University"
+TABLE_AGGREGATES = [
+    "World",
+    "North America",
+    "South America",
+    "Europe",
+    "Africa",
+    "Asia",
+    "Oceania",
+    "European Union",
+    "High income",
+    "Upper middle income",
+    "Lower middle income",
+    "Low income",
+]
+
+
+def standard_export_pivot(df, output_path, grapher_name):
+    """Previous implementation (grapher dates mapped row by row, one `pivot` per measure)."""
+    df_grapher = df.copy()
+    df_grapher["date"] = pd.to_datetime(df_grapher["date"]).map(lambda date: (date - zero_day).days)
+    df_grapher[GRAPHER_COL_NAMES.keys()].rename(columns=GRAPHER_COL_NAMES).to_csv(
+        os.path.join(output_path, "%s.csv" % grapher_name), index=False
+    )
+    excluded_aggregates = list(set(get_aggregates_spec().keys()) - set(TABLE_AGGREGATES))
+    df_table = df[~df["location"].isin(excluded_aggregates)]
+    full_data_cols = existsin(FULL_DATA_COLS, df_table.columns)
+    df_table[full_data_cols].dropna(subset=BASE_MEASURES, how="all").to_csv(
+        os.path.join(output_path, "full_data.csv"), index=False
+    )
+    long_cols = existsin([*KEYS, *BASE_MEASURES, *PER_MILLION_MEASURES], df_table.columns)
+    df_long = df_table[long_cols].sort_values(["location", "date"]).astype({"date": str})
+    df_long.to_parquet(os.path.join(output_path, JHU_LONG_FILENAME), index=False)
+    for col_name in [*BASE_MEASURES, *PER_MILLION_MEASURES]:
+        df_pivot = df_table.pivot(index="date", columns="location", values=col_name)
+        cols = df_pivot.columns.tolist()
+        cols.insert(0, cols.pop(cols.index("World")))
+        df_pivot[cols].to_csv(os.path.join(output_path, "%s.csv" % col_name))
+    return True
+
+
+def load_data():
+    """Standardized JHU table, built from the public wide files (country rows only)."""
+    measures = ["new_cases", "new_deaths", "total_cases", "total_deaths"]
+    df = pd.concat(
+        [
+            pd.read_csv(os.path.join(JHU_DIR, f"{measure}.csv"))
+            .melt(id_vars="date", var_name="location", value_name=measure)
+            .set_index(KEYS)
+            for measure in measures
+        ],
+        axis=1,
+    ).reset_index()
+    df = df[~df.location.isin(get_aggregates_spec().keys())].dropna(subset=measures, how="all")
+    df = df.assign(date=pd.to_datetime(df.date))
+    df = inject_owid_aggregates(df)
+    df = inject_weekly_growth(df)
+    df = inject_biweekly_growth(df)
+    df = inject_doubling_days(df)
+    df = inject_per_million(df, [*measures, "weekly_cases", "weekly_deaths", "biweekly_cases", "biweekly_deaths"])
+    df = inject_rolling_avg(df)
+    df = inject_cfr(df)
+    df = inject_days_since(df)
+    df = inject_exemplars(df)
+    return df.sort_values(by=["location", "date"])
+
+
+def _time(func, df, output_path, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.time()
+        func(df.copy(), output_path, GRAPHER_NAME)
+        times.append(time.time() - t0)
+    return min(times)
+
+
+def run(repeat: int = 3):
+    df = load_data()
+    print(f"Benchmarking JHU export on {len(df)} rows, {df.location.nunique()} locations…")
+    with tempfile.TemporaryDirectory() as path_old, tempfile.TemporaryDirectory() as path_new:
+        t_old = _time(standard_export_pivot, df, path_old, repeat)
+        t_new = _time(standard_export, df, path_new, repeat)
+        files = sorted(f for f in os.listdir(path_old) if f.endswith(".csv"))
+        _, mismatch, errors = filecmp.cmpfiles(path_old, path_new, files, shallow=False)
+        if mismatch or errors:
+            raise AssertionError(f"Exported files differ: {mismatch + errors}")
+        pd.testing.assert_frame_equal(
+            pd.read_parquet(os.path.join(path_old, JHU_LONG_FILENAME)),
+            pd.read_parquet(os.path.join(path_new, JHU_LONG_FILENAME)),
+        )
+    print(f"{len(files)} CSV files are identical.")
+    print(
+        pd.DataFrame(
+            {
+                "implementation": ["pivot per measure", "multi-measure pivot"],
+                "execution_time (sec)": [t_old, t_new],
+            }
+        ).to_string(index=False)
+    )
+    print(f"Speed-up: x{t_old / t_new:.1f}")
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per implementation (best is kept).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    run(repeat=args.repeat)
@@ -0,0 +1,87 @@
+"""Benchmark `megafile.steps.vax.add_rolling_vaccinations` against the previous per-location implementation.
+
+Runs both implementations on the real vaccinations file (`public/data/vaccinations/vaccinations.csv`), checks that
+their outputs match and prints their execution times.
+
+Example usage:
+
+```
+python benchmarks/rolling_vaccinations.py --repeat 5
+```
+"""
+import os
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from cowidev.utils.utils import get_project_dir
+from cowidev.megafile.steps.vax import add_rolling_vaccinations, get_vax
+
+
+VAX_CSV = os.path.join(get_project_dir(), "public", "data", "vaccinations", "vaccinations.csv")
+POPULATION_CSV = os.path.join(get_project_dir(), "scripts", "input", "un", "population_latest.csv")
+
+
+def _add_rolling(df: pd.DataFrame) -> pd.DataFrame:
+    last_known_date = df.loc[df.total_vaccinations.notnull(), "date"].max()
+    for n_months in (6, 9, 12):
+        n_days = round(365.2425 * n_months / 12)
+        df[f"rolling_vaccinations_{n_months}m"] = (
+            df.total_vaccinations.interpolate(method="linear").diff().rolling(n_days, min_periods=1).sum().round()
+        )
+        df.loc[df.date > last_known_date, f"rolling_vaccinations_{n_months}m"] = np.NaN
+        df[f"rolling_vaccinations_{n_months}m_per_hundred"] = (
+            df[f"rolling_vaccinations_{n_months}m"] * 100 / df.population
+        ).round(2)
+    return df
+
+
+def add_rolling_vaccinations_groupby(df: pd.DataFrame) -> pd.DataFrame:
+    """Previous implementation (one `_add_rolling` call per location)."""
+    return df.groupby("location").apply(_add_rolling).reset_index(drop=True)
+
+
+def load_data():
+    vax = get_vax(VAX_CSV)
+    population = pd.read_csv(POPULATION_CSV, usecols=["entity", "population"]).rename(columns={"entity": "location"})
+    return vax.merge(population, on="location", how="left")
+
+
+def _time(func, df, repeat):
+    times = []
+    for _ in range(repeat):
+        df_ = df.copy()
+        t0 = time.time()
+        result = func(df_)
+        times.append(time.time() - t0)
+    return result, min(times)
+
+
+def run(repeat: int = 3):
+    df = load_data()
+    print(f"Benchmarking rolling vaccinations on {len(df)} rows, {df.location.nunique()} locations…")
+    result_old, t_old = _time(add_rolling_vaccinations_groupby, df, repeat)
+    result_new, t_new = _time(add_rolling_vaccinations, df, repeat)
+    pd.testing.assert_frame_equal(result_old, result_new)
+    print(
+        pd.DataFrame(
+            {
+                "implementation": ["groupby.apply", "vectorized"],
+                "execution_time (sec)": [t_old, t_new],
+            }
+        ).to_string(index=False)
+    )
+    print(f"Speed-up: x{t_old / t_new:.1f}")
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per implementation (best is kept).")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    run(repeat=args.repeat)
@@ -0,0 +1,401 @@
+"""Benchmark suite: run the main pipeline stages offline on frozen fixtures and check them for regressions.
+
+Stages:
+- `jhu`: `jhu.__main__.load_standardized` (JHU table with aggregates and derived variables).
+- `vax`: `DatasetGenerator.run` (vaccinations `generate-dataset` step).
+- `megafile`: `generate_megafile` (full build and exports).
+
+`snapshot` freezes the inputs of all stages (`scripts/input`, `public/data`, `scripts/output/vaccinations`, ...) into a
+fixtures directory, together with the remote files they read (GitHub CSVs and S3 objects). If the `process-data`
+outputs (`scripts/*.preliminary.csv`) are missing, they are rebuilt from the public vaccination files.
+
+`run` executes each stage in its own process, on a scratch copy of the fixtures (so that outputs do not leak from one
+run to the next), with `OWID_COVID_PROJECT_DIR` pointing at the copy. Network access is disabled: remote CSVs are read
+from the fixtures and S3 is replaced by a local stand-in (uploads are discarded). Wall time and peak RSS of each stage
+are compared with the baseline, and the command fails if any of them is above the baseline by more than the threshold.
+Peak RSS is measured both for the stage process and for its worker processes (e.g. joblib's loky workers in the
+megafile stage), as the largest RSS among them.
+
+Stages without a baseline are not compared: their results are recorded as their baseline, with a warning. The baseline
+(`baseline.json`) records, per stage, the machine, Python and pandas versions it was measured with, and `run` warns
+when they differ from the current ones. Results are only comparable in the same environment: record the baseline with
+the pinned requirements (`requirements.txt`) on the machine used for comparisons, or re-create it
+(`run --save-baseline`) before comparing runs on a different one.
+
+Example usage:
+
+```
+python benchmarks/suite.py snapshot
+python benchmarks/suite.py run --repeat 3 --save-baseline
+python benchmarks/suite.py run --stages jhu megafile --threshold 0.1
+```
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import argparse
+import resource
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+from urllib.parse import urlparse
+
+import pandas as pd
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.abspath(os.path.join(BENCHMARKS_DIR, "..", ".."))
+FIXTURES_DIR = os.path.join(BENCHMARKS_DIR, "fixtures")
+BASELINE_JSON = os.path.join(BENCHMARKS_DIR, "baseline.json")
+THRESHOLD = 0.2
+
+# Paths (relative to the project directory) copied into the fixtures
+FIXTURE_PATHS = [
+    "public/data",
+    "scripts/input",
+    "scripts/grapher",
+    "scripts/output/vaccinations",
+    "scripts/scripts/annotations_internal.yaml",
+    "scripts/scripts/README.md.template",
+    "scripts/config.yaml",
+    "scripts/vaccinations.preliminary.csv",
+    "scripts/metadata.preliminary.csv",
+]
+# Remote files read by the stages
+REMOTE_FILES = [
+    "https://github.com/crondonm/TrackingR/raw/main/Estimates-Database/database.csv",
+    "s3://covid-19/internal/variants/covid-variants.csv",
+]
+STAGES = ["jhu", "vax", "megafile"]
+METRICS = ["wall_time", "peak_rss_mb", "peak_rss_children_mb"]
+
+
+def _remote_path(fixtures_dir: str, url: str) -> str:
+    # Location of a remote file in the fixtures, e.g. remote/github.com/<path> or remote/s3/<bucket>/<path>
+    url = urlparse(url)
+    host = "s3" if url.scheme == "s3" else url.netloc
+    bucket = url.netloc if url.scheme == "s3" else ""
+    return os.path.join(fixtures_dir, "remote", host, bucket, url.path.lstrip("/"))
+
+
+# Snapshot
+def snapshot(fixtures_dir: str = FIXTURES_DIR):
+    """Freeze current inputs into `fixtures_dir` (replacing previous fixtures)."""
+    project_dir = os.path.join(fixtures_dir, "project")
+    if os.path.isdir(fixtures_dir):
+        shutil.rmtree(fixtures_dir)
+    for path in FIXTURE_PATHS:
+        src, dst = os.path.join(PROJECT_DIR, path), os.path.join(project_dir, path)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst)
+        elif os.path.isfile(src):
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(src, dst)
+        else:
+            print(f"Skipping {path} (not found)")
+    if not os.path.isfile(os.path.join(project_dir, "scripts", "vaccinations.preliminary.csv")):
+        print("Rebuilding vaccinations `process-data` outputs from public files…")
+        _build_vax_preliminary(project_dir)
+
+    missing = []
+    for url in REMOTE_FILES:
+        print(f"Downloading {url}…")
+        try:
+            _download(url, _remote_path(fixtures_dir, url))
+        except Exception as e:
+            print(f"Could not download {url} ({e})")
+            missing.append(url)
+    manifest = {
+        "created": datetime.utcnow().replace(microsecond=0).isoformat(),
+        "remote_files": [url for url in REMOTE_FILES if url not in missing],
+    }
+    with open(os.path.join(fixtures_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    if missing:
+        print(f"Stages reading {missing} will fail until the snapshot is taken with network access.")
+    print(f"Fixtures saved to {fixtures_dir}")
+
+
+def _build_vax_preliminary(project_dir: str):
+    # Same content as `process-data` outputs: processed country files and metadata of the locations in the last
+    # `generate-dataset` run
+    vax_dir = os.path.join(project_dir, "public", "data", "vaccinations")
+    metadata = pd.read_csv(os.path.join(vax_dir, "locations.csv"), usecols=["location", "source_name"]).merge(
+        pd.read_csv(os.path.join(project_dir, "scripts", "output", "vaccinations", "automation_state.csv")),
+        on="location",
+        how="left",
+    )
+    df = pd.concat(
+        [pd.read_csv(os.path.join(vax_dir, "country_data", f"{location}.csv")) for location in metadata.location],
+        ignore_index=True,
+    )
+    df.sort_values(by=["location", "date"]).to_csv(
+        os.path.join(project_dir, "scripts", "vaccinations.preliminary.csv"), index=False
+    )
+    metadata.to_csv(os.path.join(project_dir, "scripts", "metadata.preliminary.csv"), index=False)
+
+
+def _download(url: str, output_path: str):
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    if url.startswith("s3://"):
+        from cowidev.utils.s3 import S3
+
+        S3().download_from_s3(url, output_path)
+    else:
+        import requests
+
+        response = requests.get(url, timeout=60)
+        response.raise_for_status()
+        with open(output_path, "wb") as f:
+            f.write(response.content)
+
+
+# Run
+def run(
+    stages: list = STAGES,
+    fixtures_dir: str = FIXTURES_DIR,
+    baseline_path: str = BASELINE_JSON,
+    repeat: int = 1,
+    threshold: float = THRESHOLD,
+    save_baseline: bool = False,
+) -> bool:
+    """Run `stages` on the fixtures and compare the results with the baseline.
+
+    Args:
+        stages (list, optional): Stages to run. Defaults to all stages.
+        fixtures_dir (str, optional): Fixtures directory (see `snapshot`). Defaults to FIXTURES_DIR.
+        baseline_path (str, optional): Baseline JSON file. Defaults to BASELINE_JSON.
+        repeat (int, optional): Number of runs per stage. The best wall time and the highest peak RSS are kept.
+                                Defaults to 1.
+        threshold (float, optional): Maximum relative increase over the baseline (e.g. 0.2 -> +20%). Defaults to
+                                        THRESHOLD.
+        save_baseline (bool, optional): Set to True to store the results as the new baseline of all `stages`.
+                                        Otherwise, only stages without a baseline are stored. Defaults to False.
+
+    Returns:
+        bool: True if no stage regressed.
+    """
+    if not os.path.isdir(os.path.join(fixtures_dir, "project")):
+        raise FileNotFoundError(f"No fixtures found in {fixtures_dir}. Run `suite.py snapshot` first.")
+    results = {}
+    for stage in stages:
+        runs = [_run_stage(stage, fixtures_dir) for _ in range(repeat)]
+        results[stage] = {
+            "wall_time": round(min(r["wall_time"] for r in runs), 2),
+            "peak_rss_mb": round(max(r["peak_rss_mb"] for r in runs), 1),
+            "peak_rss_children_mb": round(max(r["peak_rss_children_mb"] for r in runs), 1),
+        }
+        print(
+            f"{stage}: {results[stage]['wall_time']} sec, {results[stage]['peak_rss_mb']} MB (workers:"
+            f" {results[stage]['peak_rss_children_mb']} MB)"
+        )
+
+    baseline = _load_baseline(baseline_path).get("stages", {})
+    _check_environment(results, baseline)
+    ok = _report(results, baseline, threshold)
+    stages_save = list(results) if save_baseline else [stage for stage in results if stage not in baseline]
+    if stages_save:
+        if not save_baseline:
+            print(f"WARNING: No baseline for stages {stages_save}, their results are recorded as the baseline.")
+        environment = {"created": datetime.utcnow().replace(microsecond=0).isoformat(), **_environment()}
+        baseline = {**baseline, **{stage: {**results[stage], **environment} for stage in stages_save}}
+        with open(baseline_path, "w") as f:
+            json.dump({"stages": baseline}, f, indent=2)
+        print(f"Baseline of {stages_save} saved to {baseline_path}")
+    return ok
+
+
+def _environment() -> dict:
+    return {
+        "machine": f"{platform.node()} ({platform.machine()}, {os.cpu_count()} CPUs)",
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+    }
+
+
+def _check_environment(results: dict, baseline: dict):
+    environment = _environment()
+    for stage in results:
+        for key, value in environment.items():
+            value_baseline = baseline.get(stage, {}).get(key)
+            if value_baseline is not None and value_baseline != value:
+                print(
+                    f"WARNING: Baseline of {stage} was recorded with {key} {value_baseline}, current is {value}."
+                    " Results may not be comparable."
+                )
+
+
+def _load_baseline(path: str) -> dict:
+    if not os.path.isfile(path):
+        print(f"No baseline found in {path}")
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _report(results: dict, baseline: dict, threshold: float) -> bool:
+    rows = []
+    for stage, result in results.items():
+        for metric in METRICS:
+            base = baseline.get(stage, {}).get(metric)
+            change = result[metric] / base - 1 if base else None
+            rows.append(
+                {
+                    "stage": stage,
+                    "metric": metric,
+                    "baseline": base,
+                    "current": result[metric],
+                    "change (%)": None if change is None else round(100 * change, 1),
+                    "regression": change is not None and change > threshold,
+                }
+            )
+    df = pd.DataFrame(rows)
+    print("---")
+    print(df.to_string(index=False))
+    print("---")
+    if df.regression.any():
+        print(f"Regressions above {threshold:.0%}: {', '.join(df.loc[df.regression, 'stage'].unique())}")
+        return False
+    return True
+
+
+def _run_stage(stage: str, fixtures_dir: str) -> dict:
+    # Run stage in a new process, on a scratch copy of the fixtures
+    with tempfile.TemporaryDirectory() as tmp:
+        project_dir = os.path.join(tmp, "project")
+        shutil.copytree(os.path.join(fixtures_dir, "project"), project_dir)
+        result_path = os.path.join(tmp, "result.json")
+        env = {**os.environ, "OWID_COVID_PROJECT_DIR": project_dir}
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_stage", stage, fixtures_dir, result_path],
+            env=env,
+            cwd=project_dir,
+            check=True,
+        )
+        with open(result_path) as f:
+            return json.load(f)
+
+
+# Stages (run inside the stage process)
+def _stage_jhu():
+    from cowidev.jhu.__main__ import _load_merged, load_standardized
+
+    df = _load_merged()
+    return lambda: load_standardized(df)
+
+
+def _stage_vax():
+    from cowidev.vax.cmd.generate_dataset import main_generate_dataset
+
+    return main_generate_dataset
+
+
+def _stage_megafile():
+    from cowidev.megafile.generate import generate_megafile
+
+    return lambda: generate_megafile(full=True)
+
+
+def _execute_stage(stage: str, fixtures_dir: str, result_path: str):
+    _go_offline(fixtures_dir)
+    func = globals()[f"_stage_{stage}"]()  # Imports and input loading are not timed
+    t0 = time.time()
+    func()
+    wall_time = time.time() - t0
+    _shutdown_workers()
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    unit = 1024**2 if sys.platform == "darwin" else 1024
+    result = {
+        "wall_time": wall_time,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / unit,
+        # Largest peak RSS among the terminated child processes
+        "peak_rss_children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / unit,
+    }
+    with open(result_path, "w") as f:
+        json.dump(result, f)
+
+
+def _shutdown_workers():
+    # joblib keeps its loky workers alive for reuse. They only count in RUSAGE_CHILDREN once they have exited and been
+    # waited for
+    from joblib.externals.loky import reusable_executor
+
+    if reusable_executor._executor is not None:
+        reusable_executor._executor.shutdown(wait=True)
+
+
+class _OfflineS3Client:
+    """Stand-in for the boto3 S3 client: downloads are served from the fixtures, uploads are discarded."""
+
+    def __init__(self, fixtures_dir: str):
+        self.fixtures_dir = fixtures_dir
+
+    def download_file(self, bucket_name, s3_file, local_path):
+        shutil.copy(_remote_path(self.fixtures_dir, f"s3://{bucket_name}/{s3_file}"), local_path)
+
+    def upload_file(self, local_path, bucket_name, s3_file, **kwargs):
+        pass
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": ""}
+
+
+def _go_offline(fixtures_dir: str):
+    from cowidev.utils.s3 import S3
+
+    def _no_network(*args, **kwargs):
+        raise ConnectionError("Network access is disabled in benchmarks (see `suite.py snapshot`).")
+
+    def _read_csv(filepath_or_buffer, *args, **kwargs):
+        if isinstance(filepath_or_buffer, str) and filepath_or_buffer.startswith(("http://", "https://")):
+            filepath_or_buffer = _remote_path(fixtures_dir, filepath_or_buffer)
+        return read_csv(filepath_or_buffer, *args, **kwargs)
+
+    socket.socket.connect = _no_network
+    client = _OfflineS3Client(fixtures_dir)
+    S3.connect = lambda self, *args, **kwargs: client
+    read_csv = pd.read_csv
+    pd.read_csv = _read_csv
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    parser_snapshot = subparsers.add_parser("snapshot", help="Freeze current inputs into the fixtures directory.")
+    parser_snapshot.add_argument("--fixtures", default=FIXTURES_DIR, help="Fixtures directory.")
+    parser_run = subparsers.add_parser("run", help="Run stages on the fixtures and compare them with the baseline.")
+    parser_run.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to run.")
+    parser_run.add_argument("--fixtures", default=FIXTURES_DIR, help="Fixtures directory.")
+    parser_run.add_argument("--baseline", default=BASELINE_JSON, help="Baseline JSON file.")
+    parser_run.add_argument("--repeat", type=int, default=1, help="Number of runs per stage.")
+    parser_run.add_argument(
+        "--threshold", type=float, default=THRESHOLD, help="Maximum relative increase over the baseline."
+    )
+    parser_run.add_argument("--save-baseline", action="store_true", help="Store results as the new baseline.")
+    parser_stage = subparsers.add_parser("_stage")  # Internal: runs one stage in the current process
+    parser_stage.add_argument("stage", choices=STAGES)
+    parser_stage.add_argument("fixtures")
+    parser_stage.add_argument("result")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = _parse_args()
+    if args.command == "snapshot":
+        snapshot(args.fixtures)
+    elif args.command == "run":
+        ok = run(
+            stages=args.stages,
+            fixtures_dir=args.fixtures,
+            baseline_path=args.baseline,
+            repeat=args.repeat,
+            threshold=args.threshold,
+            save_baseline=args.save_baseline,
+        )
+        sys.exit(0 if ok else 1)
+    else:
+        _execute_stage(args.stage, args.fixtures, args.result)
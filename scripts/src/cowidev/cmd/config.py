@@ -2,6 +2,7 @@ from dataclasses import dataclass
 from pyaml_env import parse_config
 
 from cowidev.utils.paths import CONFIG_FILE_NEW as CONFIG_FILE
+from cowidev.utils.supervisor import MODULE_RETRIES, MODULE_TIMEOUT
 
 
 config_raw = parse_config(CONFIG_FILE, raise_if_na=False)
@@ -17,7 +18,9 @@ class BaseGetConfig:
 
 @dataclass()
 class TestingGetConfig(BaseGetConfig):
-    pass
+    supervised: bool = False
+    timeout: float = MODULE_TIMEOUT
+    retries: int = MODULE_RETRIES
 
 
 @dataclass()
@@ -20,6 +20,26 @@ from cowidev.testing.countries import MODULES_NAME, MODULES_NAME_BATCH, MODULES_
     help="Number of threads to use.",
     show_default=True,
 )
+@click.option(
+    "--supervised/--no-supervised",
+    default=CONFIG.pipeline.testing.get.supervised,
+    help="Run each module in its own process, killed on time out. Failed modules are retried with backoff.",
+    show_default=True,
+)
+@click.option(
+    "--timeout",
+    default=CONFIG.pipeline.testing.get.timeout,
+    type=float,
+    help="Maximum execution time of a module, in seconds (only with --supervised).",
+    show_default=True,
+)
+@click.option(
+    "--retries",
+    default=CONFIG.pipeline.testing.get.retries,
+    type=int,
+    help="Maximum number of retries of a failed module (only with --supervised).",
+    show_default=True,
+)
 @click.option(
     "--countries",
     "-c",
@@ -35,7 +55,7 @@ from cowidev.testing.countries import MODULES_NAME, MODULES_NAME_BATCH, MODULES_
     help="List of countries to skip (comma-separated)",
     cls=PythonLiteralOption,
 )
-def click_test_get(parallel, n_jobs, countries, skip_countries):
+def click_test_get(parallel, n_jobs, supervised, timeout, retries, countries, skip_countries):
     """Runs scraping scripts to collect the data from the primary sources. Data is exported to project folder
     scripts/output/testing/.
 
@@ -72,6 +92,9 @@ def click_test_get(parallel, n_jobs, countries, skip_countries):
         n_jobs=n_jobs,
         modules=modules,
         modules_skip=modules_skip,
+        supervised=supervised,
+        timeout=timeout,
+        retries=retries,
     )
 
 
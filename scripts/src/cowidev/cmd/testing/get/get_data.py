@@ -1,11 +1,12 @@
 import time
 import importlib
 
-from joblib import Parallel, delayed
+from joblib import Parallel, delayed, effective_n_jobs
 import pandas as pd
 
 from cowidev.testing.countries import MODULES_NAME
 from cowidev.utils.log import get_logger, print_eoe
+from cowidev.utils.supervisor import MODULE_RETRIES, MODULE_TIMEOUT, run_module_in_process, run_supervised
 
 
 # Logger
@@ -13,8 +14,16 @@ logger = get_logger()
 
 
 class CountryDataGetter:
-    def __init__(self, modules_skip: list = []):
+    def __init__(self, modules_skip: list = [], timeout: float = None):
+        """Module runner.
+
+        Args:
+            modules_skip (list, optional): Modules to skip. Defaults to [].
+            timeout (float, optional): If given, each module runs in a new process, which is killed after `timeout`
+                                        seconds (see `cowidev.utils.supervisor`). Defaults to None.
+        """
         self.modules_skip = modules_skip
+        self.timeout = timeout
 
     def _skip_module(self, module_name):
         return module_name in self.modules_skip
@@ -27,15 +36,23 @@ class CountryDataGetter:
             return {"module_name": module_name, "success": None, "skipped": True, "time": None}
         # Start country scraping
         logger.info(f"TEST - {module_name}: started")
-        module = importlib.import_module(module_name)
-        try:
-            module.main()
-        except Exception as err:
-            success = False
-            logger.error(f"TEST - {module_name}: ❌ {err}", exc_info=True)
+        if self.timeout is not None:
+            result = run_module_in_process(module_name, self.timeout)
+            success = result["success"]
+            if success:
+                logger.info(f"TEST - {module_name}: SUCCESS ✅")
+            else:
+                logger.error(f"TEST - {module_name}: ❌ {result['error']}\n{result['traceback'] or ''}")
         else:
-            success = True
-            logger.info(f"TEST - {module_name}: SUCCESS ✅")
+            module = importlib.import_module(module_name)
+            try:
+                module.main()
+            except Exception as err:
+                success = False
+                logger.error(f"TEST - {module_name}: ❌ {err}", exc_info=True)
+            else:
+                success = True
+                logger.info(f"TEST - {module_name}: SUCCESS ✅")
         t = round(time.time() - t0, 2)
         return {"module_name": module_name, "success": success, "skipped": False, "time": t}
 
@@ -45,15 +62,40 @@ def main_get_data(
     n_jobs: int = -2,
     modules: list = MODULES_NAME,
     modules_skip: list = [],
+    supervised: bool = False,
+    timeout: float = MODULE_TIMEOUT,
+    retries: int = MODULE_RETRIES,
 ):
     """Get data from sources and export to output folder.
 
     Is equivalent to script `run_python_scripts.py`
+
+    Args:
+        parallel (bool, optional): Set to True to run modules in `n_jobs` threads. Defaults to False.
+        n_jobs (int, optional): Number of threads (or processes, if `supervised`). Defaults to -2.
+        modules (list, optional): Modules to run. Defaults to all modules.
+        modules_skip (list, optional): Modules to skip. Defaults to [].
+        supervised (bool, optional): Set to True to run each module in its own process, killed on time out, with
+                                        `n_jobs` processes at a time. Failed modules are retried with backoff (see
+                                        `cowidev.utils.supervisor.run_supervised`). Overrides `parallel`. Defaults to
+                                        False.
+        timeout (float, optional): Maximum execution time of a module, in seconds (only if `supervised`). Defaults to
+                                    MODULE_TIMEOUT.
+        retries (int, optional): Maximum number of retries of a failed module (only if `supervised`). Defaults to
+                                    MODULE_RETRIES.
     """
     t0 = time.time()
     print("-- Getting data... --")
-    country_data_getter = CountryDataGetter(modules_skip)
-    if parallel:
+    country_data_getter = CountryDataGetter(modules_skip, timeout=timeout if supervised else None)
+    if supervised:
+        # Retries happen within the run (with backoff)
+        modules_execution_results = run_supervised(
+            country_data_getter.run,
+            modules,
+            max_workers=effective_n_jobs(n_jobs),
+            retries=retries,
+        )
+    elif parallel:
         modules_execution_results = Parallel(n_jobs=n_jobs, backend="threading")(
             delayed(country_data_getter.run)(
                 module_name,
@@ -72,7 +114,10 @@ def main_get_data(
     # Get timing dataframe
     df_exec = _build_df_execution(modules_execution_results)
     # Retry failed modules
-    _retry_modules_failed(modules_execution_results, country_data_getter)
+    if supervised:
+        _print_modules_failed(modules_execution_results)
+    else:
+        _retry_modules_failed(modules_execution_results, country_data_getter)
     # Print timing details
     t_sec_1, t_min_1, t_sec_2, t_min_2 = _print_timing(t0, t_sec_1, df_exec)
     print_eoe()
@@ -98,6 +143,10 @@ def _retry_modules_failed(modules_execution_results, country_data_getter):
     modules_execution_results = []
     for module_name in modules_failed:
         modules_execution_results.append(country_data_getter.run(module_name))
+    _print_modules_failed(modules_execution_results)
+
+
+def _print_modules_failed(modules_execution_results):
     modules_failed_retrial = [m["module_name"] for m in modules_execution_results if m["success"] is False]
     if len(modules_failed_retrial) > 0:
         failed_str = "\n".join([f"* {m}" for m in modules_failed_retrial])
@@ -6,8 +6,9 @@ import json
 
 import pandas as pd
 from pandas.api.types import is_string_dtype
-from cowidev.utils import paths
+from cowidev.utils import paths, reference
 from cowidev.utils.log import get_logger
+from cowidev.utils.utils import latest_by_group
 from cowidev.hosp.sources import __all__ as sources
 
 
@@ -174,7 +175,7 @@ class HospETL:
     def pipe_metadata(self, df):
         print("Adding ISO & population…")
         shape_og = df.shape
-        population = pd.read_csv(POPULATION_FILE, usecols=["entity", "iso_code", "population"])
+        population = reference.get_population(POPULATION_FILE)[["entity", "iso_code", "population"]]
         df = df.merge(population, on="entity")
         if shape_og[0] != df.shape[0]:
             raise ValueError(f"Dimension 0 after merge is different: {shape_og[0]} --> {df.shape[0]}")
@@ -202,10 +203,8 @@ class HospETL:
 
     def transform_meta(self, df_meta: pd.DataFrame, df: pd.DataFrame, locations_path: str):
         # Get most recent date of data update
-        df_ = (
-            df.groupby(["entity", "iso_code"], as_index=False)
-            .date.max()
-            .rename(columns={"date": "last_observation_date"})
+        df_ = latest_by_group(df[["entity", "iso_code", "date"]], ["entity", "iso_code"], ffill=False).rename(
+            columns={"date": "last_observation_date"}
         )
         # Add iso and observation date to dataframe
         df_meta = df_meta.merge(df_, left_on="location", right_on="entity", how="left")
@@ -3,14 +3,18 @@ import sys
 import pandas as pd
 import numpy as np
 import pytz
+import tempfile
 from datetime import datetime
 from termcolor import colored
-from cowidev.utils.s3 import obj_to_s3
+from cowidev.utils.s3 import S3
 
 CURRENT_DIR = os.path.dirname(__file__)
 sys.path.append(CURRENT_DIR)
 
+from cowidev.megafile.checkpoint import fingerprint_files
 from cowidev.megafile.generate import generate_megafile
+from cowidev.jhu.incremental import JHUCheckpoint, build_incremental
+from cowidev.jhu.subnational import SubnationalSource, export_subnational
 from cowidev.jhu._parser import _parse_args
 from cowidev.jhu.shared import (
     load_population,
@@ -30,7 +34,7 @@ from cowidev.jhu.shared import (
 )
 from cowidev.grapher.db.utils.slack_client import send_warning, send_success
 from cowidev.grapher.db.utils.db_imports import import_dataset
-from cowidev.utils import paths
+from cowidev.utils import paths, reference
 
 
 INPUT_PATH = paths.SCRIPTS.INPUT_JHU
@@ -189,43 +193,56 @@ def check_data_correctness(df_merged):
 
 
 def hide_recent_zeros(df: pd.DataFrame) -> pd.DataFrame:
-    last_reported_date = df.date.max()
-
-    last_positive_cases_date = df.loc[df.new_cases > 0, "date"].max()
-    if pd.isnull(last_positive_cases_date):
-        return df
-    if last_positive_cases_date != last_reported_date:
-        last_known_cases = df.loc[df.date == last_positive_cases_date, "new_cases"].item()
-        if last_known_cases >= 100 and (last_reported_date - last_positive_cases_date).days < 7:
-            df.loc[df.date > last_positive_cases_date, "new_cases"] = np.nan
-
-    last_positive_deaths_date = df.loc[df.new_deaths > 0, "date"].max()
-    if pd.isnull(last_positive_deaths_date):
-        return df
-    if last_positive_deaths_date != last_reported_date:
-        last_known_deaths = df.loc[df.date == last_positive_deaths_date, "new_deaths"].item()
-        if last_known_deaths >= 10 and (last_reported_date - last_positive_deaths_date).days < 7:
-            df.loc[df.date > last_positive_deaths_date, "new_deaths"] = np.nan
-
+    """Hide zeros reported after a large value in the last 7 days (in case it's a temporary reporting error).
+
+    Applies to all locations at once. Rows must be sorted by location and date.
+    """
+    dates = pd.to_datetime(df.date)
+    last_reported_date = dates.groupby(df.location).transform("max")
+    has_positive = pd.Series(True, index=df.index)
+    for metric, threshold in [("new_cases", 100), ("new_deaths", 10)]:
+        positive = df[metric] > 0
+        last_positive_date = dates.where(positive).groupby(df.location).transform("max")
+        last_known_value = df[metric].where(dates == last_positive_date).groupby(df.location).transform("max")
+        # Locations without positive cases are not checked for deaths either
+        has_positive &= last_positive_date.notnull()
+        msk = (
+            has_positive
+            & (last_known_value >= threshold)
+            & ((last_reported_date - last_positive_date).dt.days < 7)
+            & (dates > last_positive_date)
+        )
+        df.loc[msk, metric] = np.nan
     return df
 
 
 def discard_rows(df):
+    df = df.sort_values(["location", "date"])
 
     # Custom data corrections
-    for ldc in LARGE_DATA_CORRECTIONS:
-        df.loc[(df.location == ldc[0]) & (df.date.astype(str) == ldc[1]), f"new_{ldc[2]}"] = np.nan
+    # Duplicated corrections are allowed
+    corrections = (
+        pd.DataFrame(LARGE_DATA_CORRECTIONS, columns=["location", "date", "metric"])
+        .drop_duplicates()
+        .assign(discard=True)
+    )
+    corrections = corrections.pivot(index=["location", "date"], columns="metric", values="discard")
+    msk = corrections.reindex(pd.MultiIndex.from_arrays([df.location, df.date.astype(str)])).notnull().to_numpy()
+    for i, metric in enumerate(corrections.columns):
+        df.loc[msk[:, i], f"new_{metric}"] = np.nan
 
-    # If the last known value is above 1000 cases or 100 deaths but the latest reported value is 0
+    # If the last known value is above 100 cases or 10 deaths but the latest reported value is 0
     # then set that value to NA in case it's a temporary reporting error. (Up to 7 days in the past)
-    df = df.sort_values(["location", "date"]).groupby("location").apply(hide_recent_zeros)
-
-    return df
+    return hide_recent_zeros(df)
 
 
-def load_standardized(df):
+def load_base(df):
     df = df[["date", "location", "new_cases", "new_deaths", "total_cases", "total_deaths"]]
-    df = discard_rows(df)
+    return discard_rows(df)
+
+
+def inject_derived(df):
+    # Values of a row only depend on the last `LOOKBACK_DAYS` of its location (see `jhu.incremental`)
     df = inject_owid_aggregates(df)
     df = inject_weekly_growth(df)
     df = inject_biweekly_growth(df)
@@ -243,14 +260,41 @@ def load_standardized(df):
             "biweekly_deaths",
         ],
     )
-    df = inject_rolling_avg(df)
     df = inject_cfr(df)
+    return df
+
+
+def inject_history(df):
+    # Values depend on the full history of each location. Rolling averages are also computed here: the rolling mean
+    # of a row depends (in the last digits) on where the series starts, and must match that of a full run.
+    df = inject_rolling_avg(df)
     df = inject_days_since(df)
     df = inject_exemplars(df)
     return df.sort_values(by=["location", "date"])
 
 
-def export(df_merged):
+def load_standardized(df):
+    return inject_history(inject_derived(load_base(df)))
+
+
+def load_standardized_incremental(df):
+    checkpoint = JHUCheckpoint(os.path.join(TMP_PATH, "jhu"))
+    return build_incremental(load_base(df), inject_derived, inject_history, checkpoint, _checkpoint_salt())
+
+
+def _checkpoint_salt():
+    # Inputs shared by all rows. If any of them changes, the full history is processed again.
+    return fingerprint_files(
+        [
+            reference.POPULATION_CSV,
+            reference.CONTINENTS_CSV,
+            reference.WB_INCOME_GROUPS_CSV,
+            reference.EU_COUNTRIES_CSV,
+        ]
+    )
+
+
+def export(df_merged, full=False):
     df_loc = df_merged[["Country/Region", "location"]].drop_duplicates()
     df_loc = df_loc.merge(load_owid_continents(), on="location", how="left")
     df_loc = inject_population(df_loc)
@@ -259,97 +303,20 @@ def export(df_merged):
     df_loc = df_loc.sort_values("location")
     df_loc.to_csv(os.path.join(OUTPUT_PATH, "locations.csv"), index=False)
     # The rest of the CSVs
-    return standard_export(load_standardized(df_merged), OUTPUT_PATH, DATASET_NAME)
-
-
-def clean_global_subnational(metric):
-    url = f"https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_{metric}_global.csv"
-    metric = "cases" if metric == "confirmed" else "deaths"
-
-    df = (
-        pd.read_csv(url, na_values="")
-        .drop(columns=["Lat", "Long"])
-        .dropna(subset=["Province/State"])
-        .melt(id_vars=["Country/Region", "Province/State"], var_name="date", value_name=f"total_{metric}")
-        .rename(columns={"Country/Region": "location1", "Province/State": "location2"})
-    )
-    df["date"] = pd.to_datetime(df.date).dt.date.astype(str)
-    df = df.sort_values(["location1", "location2", "date"])
-    df[f"new_{metric}"] = df[f"total_{metric}"] - df.groupby(["location1", "location2"])[f"total_{metric}"].shift(1)
-    df[f"new_{metric}_smoothed"] = (
-        df.groupby(["location1", "location2"]).rolling(7)[f"new_{metric}"].mean().droplevel(level=[0, 1]).round(2)
-    )
-    df["location3"] = pd.NA
-    return df
-
-
-def clean_us_subnational(metric):
-    url = f"https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/time_series_covid19_{metric}_US.csv"
-    metric = "cases" if metric == "confirmed" else "deaths"
-
-    df = (
-        pd.read_csv(url)
-        .drop(
-            columns=[
-                "UID",
-                "iso2",
-                "iso3",
-                "code3",
-                "FIPS",
-                "Country_Region",
-                "Lat",
-                "Long_",
-                "Combined_Key",
-                "Population",
-            ],
-            errors="ignore",
-        )
-        .melt(id_vars=["Province_State", "Admin2"], var_name="date", value_name=f"total_{metric}")
-        .rename(columns={"Province_State": "location2", "Admin2": "location3"})
-    )
-    df["date"] = pd.to_datetime(df.date).dt.date.astype(str)
-    df = df.sort_values(["location2", "location3", "date"])
-    df[f"new_{metric}"] = df[f"total_{metric}"] - df.groupby(["location2", "location3"])[f"total_{metric}"].shift(1)
-    df[f"new_{metric}_smoothed"] = (
-        df.groupby(["location2", "location3"]).rolling(7)[f"new_{metric}"].mean().droplevel(level=[0, 1]).round(2)
-    )
-    df["location1"] = "United States"
-    return df
+    df = load_standardized(df_merged) if full else load_standardized_incremental(df_merged)
+    return standard_export(df, OUTPUT_PATH, DATASET_NAME)
 
 
 def create_subnational():
-    global_cases = clean_global_subnational("confirmed")
-    global_deaths = clean_global_subnational("deaths")
-    us_cases = clean_us_subnational("confirmed")
-    us_deaths = clean_us_subnational("deaths")
-
-    df = pd.concat(
-        [
-            pd.merge(global_cases, global_deaths, on=["location1", "location2", "location3", "date"], how="outer"),
-            pd.merge(us_cases, us_deaths, on=["location1", "location2", "location3", "date"], how="outer"),
-        ]
-    ).sort_values(["location1", "location2", "location3", "date"])[
-        [
-            "location1",
-            "location2",
-            "location3",
-            "date",
-            "total_cases",
-            "new_cases",
-            "new_cases_smoothed",
-            "total_deaths",
-            "new_deaths",
-            "new_deaths_smoothed",
-        ]
-    ]
-    df = df[df.total_cases > 0]
+    sources = [SubnationalSource.from_jhu("global"), SubnationalSource.from_jhu("US")]
     filename = "subnational_cases_deaths"
-    compression = {"method": "zip", "archive_name": f"{filename}.csv"}
-    # df.to_csv(os.path.join(OUTPUT_PATH, f"{filename}.zip"), index=False, compression=compression)
-    obj_to_s3(df, s3_path="s3://covid-19/public/jhu/{filename}.zip", compression=compression, public=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, f"{filename}.zip")
+        export_subnational(output_path, sources)
+        S3().upload_to_s3(output_path, s3_path=f"s3://covid-19/public/jhu/{filename}.zip", public=True)
 
 
-def main(skip_download=False):
+def main(skip_download=False, full=False):
 
     if not skip_download:
         print("\nAttempting to download latest CSV files...")
@@ -363,7 +330,7 @@ def main(skip_download=False):
         print_err("Data correctness check %s.\n" % colored("failed", "red"))
         sys.exit(1)
 
-    if export(df_merged):
+    if export(df_merged, full=full):
         print("Successfully exported CSVs to %s\n" % colored(os.path.abspath(OUTPUT_PATH), "magenta"))
     else:
         print_err("JHU export failed.\n")
@@ -401,15 +368,15 @@ def update_db():
     )
 
 
-def run_step(step: str, skip_download):
+def run_step(step: str, skip_download, full=False):
     if step == "download":
         download_csv()
     if step == "etl":
-        main(skip_download=skip_download)
+        main(skip_download=skip_download, full=full)
     elif step == "grapher-db":
         update_db()
 
 
 if __name__ == "__main__":
     args = _parse_args()
-    run_step(step=args.step, skip_download=args.skip_download)
+    run_step(step=args.step, skip_download=args.skip_download, full=args.full)
@@ -23,5 +23,11 @@ def _parse_args():
         action="store_true",
         help="Skip downloading files from the JHU repository",
     )
+    parser.add_argument(
+        "-f",
+        "--full",
+        action="store_true",
+        help="Process the full history, instead of only the dates with new or changed data since the last run",
+    )
     args = parser.parse_args()
     return args
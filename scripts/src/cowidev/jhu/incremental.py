@@ -0,0 +1,125 @@
+"""Incremental JHU processing.
+
+JHU inputs are append-only: each day adds a new date column. The derived variables of a row only depend on the
+previous `LOOKBACK_DAYS` of data (rolling windows and growth/doubling periods), so there is no need to re-compute the
+full history on every run.
+
+A local checkpoint keeps the last base table (daily series per location, after data corrections) and the derived
+table built from it. On the next run, the new base table is compared with the stored one to find the first date with
+new or changed values. Only rows from that date on are re-derived (using `LOOKBACK_DAYS` of context) and spliced into
+the stored table. Variables that depend on the full history of a location (rolling averages, 'days since' variables
+and exemplars) are re-computed afterwards for all rows.
+"""
+import os
+from datetime import timedelta
+
+import pandas as pd
+
+
+# Rows needed before a date to derive its values: biweekly growth compares 14-day sums that are 14 days apart
+LOOKBACK_DAYS = 28
+KEYS = ["location", "date"]
+
+
+def first_changed_date(df: pd.DataFrame, df_old: pd.DataFrame):
+    """Get the first date with rows added, removed or changed in `df` with respect to `df_old`.
+
+    Returns:
+        First changed date, or None if both tables have the same data.
+    """
+    merged = df.merge(df_old, on=KEYS, how="outer", suffixes=("", "_old"), indicator=True)
+    msk = merged["_merge"] != "both"
+    for column in df.columns.drop(KEYS):
+        new, old = merged[column], merged[f"{column}_old"]
+        msk |= (new != old) & ~(new.isnull() & old.isnull())
+    if not msk.any():
+        return None
+    return merged.loc[msk, "date"].min()
+
+
+class JHUCheckpoint:
+    """Local checkpoint of the base and derived JHU tables.
+
+    Both tables are stored as Parquet files in `path`, together with the salt they were built with.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @property
+    def base_path(self):
+        return os.path.join(self.path, "base.parquet")
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, "derived.parquet")
+
+    @property
+    def salt_path(self):
+        return os.path.join(self.path, "salt.txt")
+
+    def exists(self, salt: str = ""):
+        if not all(os.path.isfile(p) for p in [self.base_path, self.data_path, self.salt_path]):
+            return False
+        with open(self.salt_path, "r") as f:
+            return f.read() == salt
+
+    def load(self):
+        """Load checkpoint.
+
+        Returns:
+            tuple: Base table and derived table.
+        """
+        return pd.read_parquet(self.base_path), pd.read_parquet(self.data_path)
+
+    def save(self, df_base: pd.DataFrame, df: pd.DataFrame, salt: str = ""):
+        os.makedirs(self.path, exist_ok=True)
+        df_base.reset_index(drop=True).to_parquet(self.base_path, index=False)
+        df.reset_index(drop=True).to_parquet(self.data_path, index=False)
+        with open(self.salt_path, "w") as f:
+            f.write(salt)
+
+
+def build_incremental(df_base: pd.DataFrame, derive, finalize, checkpoint: JHUCheckpoint, salt: str = ""):
+    """Build the standardized JHU table, re-deriving only the rows from the first date with new or changed data.
+
+    Args:
+        df_base (pd.DataFrame): Base table, with columns `location`, `date` and the daily series. Series are expected
+                                to have one row per day (no gaps).
+        derive (callable): Function that adds aggregates and derived variables to a base table. The values of a row
+                            can only depend on the previous `LOOKBACK_DAYS` rows of its location.
+        finalize (callable): Function that adds the variables that depend on the full history to the derived table.
+        checkpoint (JHUCheckpoint): Checkpoint with the previous base and derived tables.
+        salt (str, optional): Checkpoints built with a different salt are ignored. Use it to re-build everything when
+                                an input shared by all rows changes (e.g. population). Defaults to "".
+
+    Returns:
+        pd.DataFrame: Standardized table. The checkpoint is updated.
+    """
+    df_base = df_base.reset_index(drop=True)
+    if not checkpoint.exists(salt):
+        print("No JHU checkpoint found, processing the full history…")
+        df = derive(df_base)
+        checkpoint.save(df_base, df, salt)
+        return finalize(df)
+
+    df_base_old, df_old = checkpoint.load()
+    start = None
+    if list(df_base.columns) == list(df_base_old.columns):
+        start = first_changed_date(df_base, df_base_old)
+        if start is None:
+            print("JHU checkpoint: no changes in input data.")
+            return finalize(df_old)
+    else:
+        start = df_base.date.min()
+    print(f"JHU checkpoint: processing data from {start} on…")
+
+    df_new = derive(df_base[df_base.date >= start - timedelta(days=LOOKBACK_DAYS)])
+    df_new = df_new[df_new.date >= start]
+    if list(df_new.columns) != list(df_old.columns):
+        print("JHU columns changed since last checkpoint, processing the full history…")
+        df = derive(df_base)
+    else:
+        df = pd.concat([df_old[df_old.date < start], df_new], ignore_index=True)
+    checkpoint.save(df_base, df, salt)
+    return finalize(df)
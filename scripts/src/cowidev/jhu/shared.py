@@ -1,86 +1,41 @@
 import sys
+import copy
+import functools
 import pandas as pd
 import numpy as np
+from joblib import Parallel, delayed
 import os
 from datetime import datetime
 
+from cowidev.megafile.steps.jhu import JHU_LONG_PATH
 from cowidev.megafile.steps.test import get_testing
-from cowidev.utils import paths
+from cowidev.utils import reference
+from cowidev.utils.aggregates import aggregate_locations
+from cowidev.utils.utils import pct_change_to_doubling_days
 
 
-POPULATION_CSV_PATH = os.path.join(paths.SCRIPTS.INPUT_UN, "population_latest.csv")
-CONTINENTS_CSV_PATH = os.path.join(paths.SCRIPTS.INPUT_OWID, "continents.csv")
-WB_INCOME_GROUPS_CSV_PATH = os.path.join(paths.SCRIPTS.INPUT_WB, "income_groups.csv")
-EU_COUNTRIES_CSV_PATH = os.path.join(paths.SCRIPTS.INPUT_OWID, "eu_countries.csv")
-
 ZERO_DAY = "2020-01-21"
 zero_day = datetime.strptime(ZERO_DAY, "%Y-%m-%d")
 
-# =========
-# Utilities
-# =========
-
-
-def _find_closest_year_row(df, year=2021):
-    """Returns the row which is closest to the year specified (in either direction)"""
-    df = df.copy()
-    df["year"] = df["year"].sort_values(ascending=True)
-    return df.loc[df["year"].map(lambda x: abs(x - year)).idxmin()]
-
-
 # ============
 # Loading data
 # ============
 
 
 def load_population(year=2021):
-    df = pd.read_csv(
-        POPULATION_CSV_PATH,
-        keep_default_na=False,
-        usecols=["entity", "year", "population"],
-    )
-    return (
-        pd.DataFrame([_find_closest_year_row(df_group, year) for loc, df_group in df.groupby("entity")])
-        .dropna()
-        .rename(columns={"entity": "location", "year": "population_year"})
-    )
+    return reference.get_population_closest_year(year)
 
 
 def load_owid_continents():
-    return pd.read_csv(
-        CONTINENTS_CSV_PATH,
-        keep_default_na=False,
-        header=0,
-        names=["location", "code", "year", "continent"],
-        usecols=["location", "continent"],
-    )
-
-
-locations_by_continent = load_owid_continents().groupby("continent")["location"].apply(list).to_dict()
+    return reference.get_continents()[["location", "continent"]]
 
 
 def load_wb_income_groups():
-    return pd.read_csv(
-        WB_INCOME_GROUPS_CSV_PATH,
-        keep_default_na=False,
-        header=0,
-        names=["location", "code", "income_group", "year"],
-        usecols=["location", "income_group"],
-    )
+    return reference.get_income_groups()
 
 
 def load_eu_country_names():
-    df = pd.read_csv(
-        EU_COUNTRIES_CSV_PATH,
-        keep_default_na=False,
-        header=0,
-        names=["location", "eu"],
-        usecols=["location"],
-    )
-    return df["location"].tolist()
-
-
-locations_by_wb_income_group = load_wb_income_groups().groupby("income_group")["location"].apply(list).to_dict()
+    return reference.get_eu_countries()
 
 
 # ==============
@@ -109,45 +64,42 @@ def inject_per_million(df, measures):
 # OWID continents + custom aggregates
 # ===================================
 
-aggregates_spec = {
-    "World": {"include": None, "exclude": None},
-    "World excl. China": {"exclude": ["China"]},
-    "World excl. China and South Korea": {"exclude": ["China", "South Korea"]},
-    "World excl. China, South Korea, Japan and Singapore": {"exclude": ["China", "South Korea", "Japan", "Singapore"]},
-    # European Union
-    "European Union": {"include": load_eu_country_names()},
-    # OWID continents
-    **{continent: {"include": locations, "exclude": None} for continent, locations in locations_by_continent.items()},
-    # Asia without China
-    "Asia excl. China": {"include": list(set(locations_by_continent["Asia"]) - set(["China"]))},
-    # World Bank income groups
-    **{
-        income_group: {"include": locations, "exclude": None}
-        for income_group, locations in locations_by_wb_income_group.items()
-    },
-}
-
 
-def _sum_aggregate(df, name, include=None, exclude=None):
-    df = df.copy()
-    if include:
-        df = df[df["location"].isin(include)]
-    if exclude:
-        df = df[~df["location"].isin(exclude)]
-    df = df.groupby("date").sum().reset_index()
-    df["location"] = name
-    return df
+def get_aggregates_spec():
+    return copy.deepcopy(_get_aggregates_spec())
+
+
+@functools.lru_cache(maxsize=None)
+def _get_aggregates_spec():
+    # Built once per process (reference tables do not change during a run)
+    locations_by_continent = load_owid_continents().groupby("continent")["location"].apply(list).to_dict()
+    locations_by_wb_income_group = load_wb_income_groups().groupby("income_group")["location"].apply(list).to_dict()
+    return {
+        "World": {"include": None, "exclude": None},
+        "World excl. China": {"exclude": ["China"]},
+        "World excl. China and South Korea": {"exclude": ["China", "South Korea"]},
+        "World excl. China, South Korea, Japan and Singapore": {
+            "exclude": ["China", "South Korea", "Japan", "Singapore"]
+        },
+        # European Union
+        "European Union": {"include": load_eu_country_names()},
+        # OWID continents
+        **{
+            continent: {"include": locations, "exclude": None}
+            for continent, locations in locations_by_continent.items()
+        },
+        # Asia without China
+        "Asia excl. China": {"include": list(set(locations_by_continent["Asia"]) - set(["China"]))},
+        # World Bank income groups
+        **{
+            income_group: {"include": locations, "exclude": None}
+            for income_group, locations in locations_by_wb_income_group.items()
+        },
+    }
 
 
 def inject_owid_aggregates(df):
-    return pd.concat(
-        [
-            df,
-            *[_sum_aggregate(df, name, **params) for name, params in aggregates_spec.items()],
-        ],
-        sort=True,
-        ignore_index=True,
-    )
+    return pd.concat([df, aggregate_locations(df, get_aggregates_spec())], sort=True, ignore_index=True)
 
 
 # =======================
@@ -196,38 +148,21 @@ days_since_spec = {
 }
 
 
-def _get_date_of_threshold(df, col, threshold):
-    try:
-        return df["date"][df[col] >= threshold].iloc[0]
-    except:
-        return None
-
-
-def _date_diff(a, b, positive_only=False):
-    if pd.isnull(a) or pd.isnull(b):
-        return None
-    diff = (a - b).days
-    if positive_only and diff < 0:
-        return None
-    return diff
-
-
 def _days_since(df, spec):
-    ref_date = pd.to_datetime(_get_date_of_threshold(df, spec["value_col"], spec["value_threshold"]))
-    return (
-        pd.to_datetime(df["date"]).map(lambda date: _date_diff(date, ref_date, spec["positive_only"])).astype("Int64")
-    )
+    # Date of the first row (within each location) where the value reaches the threshold
+    dates = pd.to_datetime(df["date"])
+    msk = (df[spec["value_col"]] >= spec["value_threshold"]).fillna(False).astype(bool)
+    ref_dates = dates.where(msk).groupby(df["location"]).transform("first")
+    days = (dates - ref_dates).dt.days
+    if spec["positive_only"]:
+        days = days.where(days >= 0)
+    return days.astype("Int64")
 
 
 def inject_days_since(df):
     df = df.copy()
     for col, spec in days_since_spec.items():
-        df[col] = (
-            df[["date", "location", spec["value_col"]]]
-            .groupby("location")
-            .apply(lambda df_group: _days_since(df_group, spec))
-            .reset_index(level=0, drop=True)
-        )
+        df[col] = _days_since(df, spec)
     return df
 
 
@@ -236,16 +171,12 @@ def inject_days_since(df):
 # ===================
 
 
-def _apply_row_cfr_100(row):
-    if pd.notnull(row["total_cases"]) and row["total_cases"] >= 100:
-        return row["cfr"]
-    return pd.NA
-
-
 def inject_cfr(df):
     cfr_series = (df["total_deaths"] / df["total_cases"]) * 100
     df["cfr"] = cfr_series.round(decimals=3)
-    df["cfr_100_cases"] = df.apply(_apply_row_cfr_100, axis=1)
+    msk = (df["total_cases"] >= 100).fillna(False).to_numpy(dtype=bool)
+    # Object column with pd.NA for masked rows (as built row by row before)
+    df["cfr_100_cases"] = df["cfr"].astype(object).where(msk, pd.NA)
     return df
 
 
@@ -308,29 +239,15 @@ def inject_exemplars(df):
     df = inject_population(df)
 
     # Inject days since 100th case IF population ≥ 5M
-    def mapper_days_since(row):
-        if pd.notnull(row["population"]) and row["population"] >= 5e6:
-            return row["days_since_100_total_cases"]
-        return pd.NA
-
-    df["days_since_100_total_cases_and_5m_pop"] = df.apply(mapper_days_since, axis=1)
+    msk_pop = (df["population"] >= 5e6).fillna(False).to_numpy(dtype=bool)
+    df["days_since_100_total_cases_and_5m_pop"] = df["days_since_100_total_cases"].astype(object).where(msk_pop, pd.NA)
 
     # Inject boolean when all exenplar conditions hold
     # Use int because the Grapher doesn't handle non-ints very well
     countries_with_testing_data = set(get_testing()["location"])
-
-    def mapper_bool(row):
-        if (
-            pd.notnull(row["days_since_100_total_cases"])
-            and pd.notnull(row["population"])
-            and row["days_since_100_total_cases"] >= 21
-            and row["population"] >= 5e6
-            and row["location"] in countries_with_testing_data
-        ):
-            return 1
-        return 0
-
-    df["5m_pop_and_21_days_since_100_cases_and_testing"] = df.apply(mapper_bool, axis=1)
+    msk_days = (df["days_since_100_total_cases"] >= 21).fillna(False).to_numpy(dtype=bool)
+    msk_testing = df["location"].isin(countries_with_testing_data).to_numpy(dtype=bool)
+    df["5m_pop_and_21_days_since_100_cases_and_testing"] = np.where(msk_pop & msk_days & msk_testing, 1, 0)
 
     return drop_population(df)
 
@@ -359,23 +276,13 @@ doubling_days_spec = {
 }
 
 
-def pct_change_to_doubling_days(pct_change, periods):
-    if pd.notnull(pct_change) and pct_change != 0:
-        doubling_days = periods * np.log(2) / np.log(1 + pct_change)
-        return np.round(doubling_days, decimals=2)
-    return pd.NA
-
-
 def inject_doubling_days(df):
     for col, spec in doubling_days_spec.items():
         value_col = spec["value_col"]
         periods = spec["periods"]
         df.loc[df[value_col] == 0, value_col] = np.nan
-        df[col] = (
-            df.groupby("location", as_index=False)[value_col]
-            .pct_change(periods=periods, fill_method=None)[value_col]
-            .map(lambda pct: pct_change_to_doubling_days(pct, periods))
-        )
+        pct_change = df.groupby("location")[value_col].pct_change(periods=periods, fill_method=None)
+        df[col] = pct_change_to_doubling_days(pct_change, periods)
     return df
 
 
@@ -510,20 +417,65 @@ def existsin(l1, l2):
     return [x for x in l1 if x in l2]
 
 
-def standard_export(df, output_path, grapher_name):
+def pivot_measures(df, measures, first_columns=("World",)):
+    """Pivot several measures to wide format (date × location), building the date and location codes only once.
+
+    Each table is the same as `df.pivot(index="date", columns="location", values=measure)`, with `first_columns`
+    moved to the front.
+
+    Returns:
+        dict: Wide table of each measure.
+    """
+    date_codes, dates = pd.factorize(df["date"], sort=True)
+    location_codes, locations = pd.factorize(df["location"], sort=True)
+    if pd.Series(date_codes * len(locations) + location_codes).duplicated().any():
+        raise ValueError("Index contains duplicate entries, cannot reshape")
+    columns = locations.tolist()
+    for column in reversed(first_columns):
+        if column in columns:
+            columns.insert(0, columns.pop(columns.index(column)))
+    location_codes = pd.Index(columns).get_indexer(locations)[location_codes]
+    index = pd.Index(dates, name="date")
+    columns = pd.Index(columns, name="location")
+    shape = (len(index), len(columns))
+    complete = len(df) == shape[0] * shape[1]
+
+    pivots = {}
+    for measure in measures:
+        values = df[measure]
+        if isinstance(values.dtype, np.dtype):
+            # Missing cells are NaN (as with pivot, integers become floats)
+            if complete:
+                table = np.empty(shape, dtype=values.dtype)
+            else:
+                table = np.full(shape, np.nan, dtype=np.result_type(values.dtype, np.float64))
+        else:
+            table = np.full(shape, None, dtype=object)
+        table[date_codes, location_codes] = values.to_numpy(dtype=table.dtype)
+        pivots[measure] = pd.DataFrame(table, index=index, columns=columns)
+    return pivots
+
+
+def write_csvs(tables, n_jobs=-2):
+    """Write several DataFrames to CSV in parallel.
+
+    Args:
+        tables (list): List of (DataFrame, path, `to_csv` keyword arguments) tuples.
+        n_jobs (int, optional): Number of threads. Defaults to -2.
+    """
+    Parallel(n_jobs=n_jobs, backend="threading")(delayed(df.to_csv)(path, **kwargs) for df, path, kwargs in tables)
+
+
+def standard_export(df, output_path, grapher_name, n_jobs=-2, long_path=JHU_LONG_PATH):
     # Grapher
-    df_grapher = df.copy()
-    df_grapher["date"] = pd.to_datetime(df_grapher["date"]).map(lambda date: (date - zero_day).days)
-    df_grapher = (
-        df_grapher[GRAPHER_COL_NAMES.keys()]
-        .rename(columns=GRAPHER_COL_NAMES)
-        .to_csv(os.path.join(output_path, "%s.csv" % grapher_name), index=False)
-    )
+    df_grapher = df[GRAPHER_COL_NAMES.keys()].rename(columns=GRAPHER_COL_NAMES)
+    df_grapher["Year"] = (pd.to_datetime(df_grapher["Year"]) - zero_day).dt.days
+    csvs = [(df_grapher, os.path.join(output_path, "%s.csv" % grapher_name), {"index": False})]
 
     # Table & public extracts for external users
     # Excludes aggregates
     excluded_aggregates = list(
-        set(aggregates_spec.keys())
+        set(get_aggregates_spec().keys())
         - set(
             [
                 "World",
@@ -547,11 +499,13 @@ def standard_export(df, output_path, grapher_name):
     df_table[full_data_cols].dropna(subset=BASE_MEASURES, how="all").to_csv(
         os.path.join(output_path, "full_data.csv"), index=False
     )
-    # Pivot variables (wide format)
-    for col_name in [*BASE_MEASURES, *PER_MILLION_MEASURES]:
-        df_pivot = df_table.pivot(index="date", columns="location", values=col_name)
-        # move World to first column
-        cols = df_pivot.columns.tolist()
-        cols.insert(0, cols.pop(cols.index("World")))
-        df_pivot[cols].to_csv(os.path.join(output_path, "%s.csv" % col_name))
+    # Pivot variables (wide format), with World as first column
+    pivots = pivot_measures(df_table, [*BASE_MEASURES, *PER_MILLION_MEASURES], first_columns=["World"])
+    csvs += [(df_pivot, os.path.join(output_path, "%s.csv" % col_name), {}) for col_name, df_pivot in pivots.items()]
+    write_csvs(csvs, n_jobs=n_jobs)
+    # Long format (all measures, used by the megafile). Written after the CSVs, as it is only read if it is newer
+    long_cols = existsin([*KEYS, *BASE_MEASURES, *PER_MILLION_MEASURES], df_table.columns)
+    df_long = df_table[long_cols].sort_values(["location", "date"]).astype({"date": str})
+    os.makedirs(os.path.dirname(long_path), exist_ok=True)
+    df_long.to_parquet(long_path, index=False)
     return True
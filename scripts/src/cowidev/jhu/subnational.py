@@ -0,0 +1,189 @@
+"""Subnational JHU dataset: cases and deaths by province/state (global file) and county (US file).
+
+Time series are processed as wide matrices (one row per location, one column per date): new values are the
+difference along the date axis and smoothed values a 7-day window of cumulative sums. The long output is only built
+for a chunk of locations at a time, and written straight away, so that memory stays flat as the history grows.
+"""
+import io
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+
+URL_TEMPLATE = (
+    "https://raw.githubusercontent.com/CSSEGISandData/COVID-19/master/csse_covid_19_data/csse_covid_19_time_series/"
+    "time_series_covid19_{metric}_{region}.csv"
+)
+KEYS = ["location1", "location2", "location3"]
+COLUMNS = [
+    *KEYS,
+    "date",
+    "total_cases",
+    "new_cases",
+    "new_cases_smoothed",
+    "total_deaths",
+    "new_deaths",
+    "new_deaths_smoothed",
+]
+METRICS = {"confirmed": "cases", "deaths": "deaths"}
+US_ID_COLUMNS = [
+    "UID",
+    "iso2",
+    "iso3",
+    "code3",
+    "FIPS",
+    "Country_Region",
+    "Lat",
+    "Long_",
+    "Combined_Key",
+    "Population",
+]
+SMOOTHING_WINDOW = 7
+
+
+class SubnationalSource:
+    """Cases and deaths of one JHU file pair (global or US), as location × date matrices.
+
+    Attributes:
+        keys (pd.DataFrame): Locations (columns `location1`, `location2` and `location3`), one row per matrix row.
+        dates (np.ndarray): Dates (YYYY-MM-DD), one per matrix column.
+        values (dict): Column name (e.g. `new_cases`) -> matrix.
+        integer (set): Columns with integer values only (no missing values).
+    """
+
+    def __init__(self, keys: pd.DataFrame, dates: np.ndarray, values: dict, integer: set = None):
+        self.keys = keys
+        self.dates = dates
+        self.values = values
+        self.integer = set() if integer is None else integer
+
+    @classmethod
+    def from_jhu(cls, region: str, url_template: str = URL_TEMPLATE):
+        """Load the confirmed and deaths files of `region` ("global" or "US")."""
+        parts = [
+            _load_metric(url_template.format(metric=file_metric, region=region), region, metric)
+            for file_metric, metric in METRICS.items()
+        ]
+        return cls.outer_join(*parts)
+
+    @classmethod
+    def outer_join(cls, *sources):
+        """Combine sources with different columns, over the union of their locations and dates."""
+        keys = pd.concat([s.keys for s in sources], ignore_index=True).drop_duplicates(ignore_index=True)
+        dates = np.array(sorted(set().union(*[s.dates for s in sources])), dtype=object)
+        key_index = _key_index(keys)
+        values, integer = {}, set()
+        for source in sources:
+            rows = key_index.get_indexer(_key_index(source.keys))
+            cols = pd.Index(dates).get_indexer(source.dates)
+            for name, matrix in source.values.items():
+                values[name] = np.full((len(keys), len(dates)), np.nan)
+                values[name][np.ix_(rows, cols)] = matrix
+            integer |= {name for name in source.integer if not np.isnan(values[name]).any()}
+        return cls(keys, dates, values, integer)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def to_frame(self, rows: np.ndarray) -> pd.DataFrame:
+        """Long table for the locations in `rows` (sorted by location and date)."""
+        n_dates = len(self.dates)
+        keys = self.keys.iloc[rows]
+        return pd.DataFrame(
+            {
+                **{key: np.repeat(keys[key].to_numpy(), n_dates) for key in KEYS},
+                "date": np.tile(self.dates, len(rows)),
+                **{name: matrix[rows].ravel() for name, matrix in self.values.items()},
+            }
+        )
+
+
+def _load_metric(url: str, region: str, metric: str) -> SubnationalSource:
+    if region == "global":
+        df = pd.read_csv(url, na_values="").drop(columns=["Lat", "Long"]).dropna(subset=["Province/State"])
+        keys = pd.DataFrame(
+            {"location1": df["Country/Region"], "location2": df["Province/State"], "location3": np.nan}
+        )
+        df = df.drop(columns=["Country/Region", "Province/State"])
+        series_keys = ["location1", "location2"]
+    else:
+        df = pd.read_csv(url).drop(columns=US_ID_COLUMNS, errors="ignore")
+        keys = pd.DataFrame(
+            {"location1": "United States", "location2": df["Province_State"], "location3": df["Admin2"]}
+        )
+        df = df.drop(columns=["Province_State", "Admin2"])
+        series_keys = ["location2", "location3"]
+    keys = keys.reset_index(drop=True).astype(object)
+    is_integer = all(pd.api.types.is_integer_dtype(dtype) for dtype in df.dtypes)
+    dates = pd.to_datetime(df.columns, format="%m/%d/%y")
+    order = np.argsort(dates, kind="stable")
+    totals = df.to_numpy(dtype=float)[:, order]
+
+    new = np.full(totals.shape, np.nan)
+    new[:, 1:] = totals[:, 1:] - totals[:, :-1]
+    # Series with an incomplete location name get no new/smoothed values
+    new[keys[series_keys].isnull().any(axis=1).to_numpy()] = np.nan
+    values = {
+        f"total_{metric}": totals,
+        f"new_{metric}": new,
+        f"new_{metric}_smoothed": np.round(_rolling_mean(new, SMOOTHING_WINDOW), 2),
+    }
+    dates = dates[order].strftime("%Y-%m-%d").to_numpy(dtype=object)
+    return SubnationalSource(keys, dates, values, {f"total_{metric}"} if is_integer else set())
+
+
+def _rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    # Mean of the last `window` values along the date axis (NaN if any of them is NaN)
+    sums = np.cumsum(np.nan_to_num(values), axis=1)
+    nans = np.cumsum(np.isnan(values), axis=1)
+    sums[:, window:] = sums[:, window:] - sums[:, :-window]
+    nans[:, window:] = nans[:, window:] - nans[:, :-window]
+    mean = sums / window
+    mean[nans > 0] = np.nan
+    mean[:, : window - 1] = np.nan
+    return mean
+
+
+def _key_index(keys: pd.DataFrame) -> pd.Index:
+    return pd.Index(list(keys.itertuples(index=False, name=None)), tupleize_cols=False)
+
+
+def write_subnational(file, sources: list, chunksize: int = 500):
+    """Write the subnational dataset as CSV, `chunksize` locations at a time.
+
+    Rows are sorted by location and date, and only rows with cases are kept.
+
+    Args:
+        file: Open text file.
+        sources (list): SubnationalSource objects (e.g. global and US).
+        chunksize (int, optional): Number of locations per chunk. Defaults to 500.
+    """
+    keys = pd.concat(
+        [s.keys.assign(_source=i, _row=np.arange(len(s))) for i, s in enumerate(sources)], ignore_index=True
+    ).sort_values(KEYS)
+    # Totals are written as integers unless a value is missing (or not an integer) in any location
+    dtypes = {
+        column: "int64" if all(column in s.integer for s in sources) else "float"
+        for column in ["total_cases", "total_deaths"]
+    }
+    for i, start in enumerate(range(0, len(keys), chunksize)):
+        chunk = keys.iloc[start : start + chunksize]
+        chunk = chunk.assign(_rank=np.arange(len(chunk)))
+        frames = []
+        for source_id, source_rows in chunk.groupby("_source", sort=False):
+            source = sources[source_id]
+            df = source.to_frame(source_rows["_row"].to_numpy())
+            frames.append(df.assign(_rank=np.repeat(source_rows["_rank"].to_numpy(), len(source.dates))))
+        # Interleave locations from different sources back into sorted order
+        df = pd.concat(frames, ignore_index=True).sort_values("_rank", kind="stable")
+        df = df[df.total_cases > 0].astype(dtypes)
+        df[COLUMNS].to_csv(file, index=False, header=i == 0)
+
+
+def export_subnational(output_path: str, sources: list, chunksize: int = 500):
+    """Export the subnational dataset as a zipped CSV (see `write_subnational`)."""
+    filename = "subnational_cases_deaths.csv"
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        with zf.open(filename, "w", force_zip64=True) as f, io.TextIOWrapper(f, encoding="utf-8", newline="") as file:
+            write_subnational(file, sources, chunksize)
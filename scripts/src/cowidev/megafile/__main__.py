@@ -7,7 +7,9 @@ Merges all COVID-19 data into a 'megafile';
 """
 
 from cowidev.megafile.generate import generate_megafile
+from cowidev.megafile._parser import _parse_args
 
 
 if __name__ == "__main__":
-    generate_megafile()
+    args = _parse_args()
+    generate_megafile(full=args.full)
@@ -0,0 +1,18 @@
+import argparse
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(
+        description="Generate the COVID-19 megafile (owid-covid-data).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help=(
+            "Build all locations from scratch. Otherwise, only locations whose input data changed since the last run"
+            " are re-built."
+        ),
+    )
+    args = parser.parse_args()
+    return args
@@ -0,0 +1,126 @@
+"""Incremental megafile build.
+
+Keeps a local columnar checkpoint with the last megafile table, together with a fingerprint of each input source per
+location. On the next run, only locations whose fingerprints changed are re-merged and re-derived.
+"""
+import os
+import hashlib
+
+import pandas as pd
+
+
+def fingerprint_sources(sources: dict, salt: str = "") -> pd.DataFrame:
+    """Fingerprint each source, per location.
+
+    Args:
+        sources (dict): Source name -> dataframe with columns `location` and `date`.
+        salt (str, optional): Extra text mixed into all hashes. Use it to invalidate all locations at once (e.g.
+                                when an input shared by all locations changes). Defaults to "".
+
+    Returns:
+        pd.DataFrame: Table indexed by location, with one column per source containing the content hash of the
+                        location's rows (empty string if the location is not present in the source).
+    """
+    fingerprints = {name: _fingerprint_locations(df, salt) for name, df in sources.items()}
+    return pd.DataFrame(fingerprints).fillna("").sort_index()
+
+
+def _fingerprint_locations(df: pd.DataFrame, salt: str) -> pd.Series:
+    df = df.sort_values(["location", "date"])
+    row_hashes = pd.util.hash_pandas_object(df, index=False)
+    salt = salt.encode()
+    return row_hashes.groupby(df.location.values).apply(lambda x: hashlib.md5(salt + x.values.tobytes()).hexdigest())
+
+
+def fingerprint_files(filenames: list) -> str:
+    """Content hash of a set of files."""
+    md5 = hashlib.md5()
+    for filename in filenames:
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                md5.update(chunk)
+    return md5.hexdigest()
+
+
+def changed_locations(fingerprints: pd.DataFrame, fingerprints_old: pd.DataFrame) -> list:
+    """Get locations with new or changed fingerprints."""
+    if list(fingerprints.columns) != list(fingerprints_old.columns):
+        return fingerprints.index.tolist()
+    old = fingerprints_old.reindex(fingerprints.index)
+    msk = (fingerprints != old).any(axis=1)
+    return fingerprints.index[msk].tolist()
+
+
+class MegafileCheckpoint:
+    """Local checkpoint of the megafile table and its source fingerprints.
+
+    Both tables are stored as Parquet files in `path`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @property
+    def data_path(self):
+        return os.path.join(self.path, "megafile.parquet")
+
+    @property
+    def fingerprints_path(self):
+        return os.path.join(self.path, "fingerprints.parquet")
+
+    def exists(self):
+        return os.path.isfile(self.data_path) and os.path.isfile(self.fingerprints_path)
+
+    def load(self):
+        """Load checkpoint.
+
+        Returns:
+            tuple: Megafile table and fingerprints table.
+        """
+        df = pd.read_parquet(self.data_path)
+        fingerprints = pd.read_parquet(self.fingerprints_path)
+        return df, fingerprints
+
+    def save(self, df: pd.DataFrame, fingerprints: pd.DataFrame):
+        os.makedirs(self.path, exist_ok=True)
+        df.reset_index(drop=True).to_parquet(self.data_path, index=False)
+        fingerprints.to_parquet(self.fingerprints_path)
+
+
+def build_incremental(sources: dict, build, checkpoint: MegafileCheckpoint, salt: str = ""):
+    """Build the megafile table, re-processing only the locations whose sources changed since the last checkpoint.
+
+    Args:
+        sources (dict): Source name -> dataframe with columns `location` and `date`.
+        build (callable): Function that builds the megafile table from a `sources`-like dictionary.
+        checkpoint (MegafileCheckpoint): Checkpoint with the previous table and fingerprints.
+        salt (str, optional): See `fingerprint_sources`. Defaults to "".
+
+    Returns:
+        tuple: Megafile table (all locations), whether the table changed since the last checkpoint (locations were
+                re-processed or removed) and fingerprints of `sources`. The checkpoint is not updated: save the table
+                and fingerprints once the outputs built from them have been exported, so that a failed export is
+                retried in the next run.
+    """
+    fingerprints = fingerprint_sources(sources, salt)
+    if not checkpoint.exists():
+        print("No megafile checkpoint found, building all locations…")
+        return build(sources), True, fingerprints
+
+    df_old, fingerprints_old = checkpoint.load()
+    locations = changed_locations(fingerprints, fingerprints_old)
+    locations_removed = set(fingerprints_old.index) - set(fingerprints.index)
+    print(f"Megafile checkpoint: {len(locations)} locations changed, {len(locations_removed)} removed.")
+    if not locations and not locations_removed:
+        return df_old, False, fingerprints
+
+    df_old = df_old[df_old.location.isin(fingerprints.index) & ~df_old.location.isin(locations)]
+    if locations:
+        df_new = build({name: df[df.location.isin(locations)] for name, df in sources.items()})
+        if set(df_new.columns) != set(df_old.columns):
+            print("Megafile columns changed since last checkpoint, building all locations…")
+            return build(sources), True, fingerprints
+        df_old = pd.concat([df_new, df_old[df_new.columns]], ignore_index=True)
+
+    df = df_old.sort_values(["location", "date"]).reset_index(drop=True)
+    return df, True, fingerprints
@@ -1,5 +1,6 @@
 import os
 
+from joblib import Parallel, delayed
 import pandas as pd
 import numpy as np
 
@@ -190,7 +191,28 @@ internal_files_columns = {
 }
 
 
-def create_internal(df: pd.DataFrame, output_dir: str, annotations_path: str, country_data: str):
+def create_internal(
+    df: pd.DataFrame,
+    output_dir: str,
+    annotations_path: str,
+    country_data: str,
+    parallel: bool = True,
+    n_jobs: int = -2,
+):
+    """Export internal files (one per stream in `internal_files_columns`).
+
+    Columns shared by several streams are derived once, then each stream is sliced, annotated and written in its own
+    process. Streams are only sliced when they are dispatched to a process.
+
+    Args:
+        df (pd.DataFrame): Megafile table.
+        output_dir (str): Directory where files are exported.
+        annotations_path (str): Path to annotations YAML file.
+        country_data (str): Path to vaccination country data directory.
+        parallel (bool, optional): Set to True to export streams in parallel processes. Defaults to True.
+        n_jobs (int, optional): Number of processes. Check Parallel class in joblib library for more info. Defaults
+                                to -2.
+    """
     # Ensure internal/ dir is created
     os.makedirs(output_dir, exist_ok=True)
 
@@ -228,15 +250,29 @@ def create_internal(df: pd.DataFrame, output_dir: str, annotations_path: str, co
     df = df.pipe(add_total_vaccinations_no_boosters)
 
     # Export
-    for name, config in internal_files_columns.items():
-        output_path = os.path.join(output_dir, f"megafile--{name}.json")
-        value_columns = list(set(config["columns"]) - set(non_value_columns))
-        df_output = df[config["columns"]]
-        if name == "vaccinations-boosters":
-            df_output = df_output.copy().pipe(fillna_boosters_till_valid)
-        df_output = df_output.dropna(subset=value_columns, how=config["dropna"])
-        df_output = annotator.add_annotations(df_output, name)
-        df_to_columnar_json(df_output, output_path)
+    # Column slices are built lazily, as streams are dispatched, so that at most `n_jobs` of them are in memory
+    streams = (
+        (df[config["columns"]], name, config["dropna"], os.path.join(output_dir, f"megafile--{name}.json"))
+        for name, config in internal_files_columns.items()
+    )
+    if parallel:
+        Parallel(n_jobs=n_jobs, pre_dispatch="n_jobs")(
+            delayed(_export_stream)(*stream, annotator, non_value_columns) for stream in streams
+        )
+    else:
+        for stream in streams:
+            _export_stream(*stream, annotator, non_value_columns)
+
+
+def _export_stream(
+    df: pd.DataFrame, name: str, dropna: str, output_path: str, annotator: AnnotatorInternal, non_value_columns: list
+):
+    value_columns = list(set(df.columns) - set(non_value_columns))
+    if name == "vaccinations-boosters":
+        df = df.copy().pipe(fillna_boosters_till_valid)
+    df = df.dropna(subset=value_columns, how=dropna)
+    df = annotator.add_annotations(df, name)
+    df_to_columnar_json(df, output_path)
 
 
 def add_partially_vaccinated(df: pd.DataFrame, country_data: str):
@@ -286,10 +322,10 @@ def fillna_boosters_till_valid(df):
     return df
 
 
-def df_to_columnar_json(complete_dataset, output_path):
+def df_to_columnar_json(complete_dataset, output_path, chunksize=100_000):
     """
     Writes a columnar JSON version of the complete dataset.
-    NA values are dropped from the output.
+    NA values are written as null.
 
     In columnar JSON, the table headers are keys, and the values are lists
     of all cells for a column.
@@ -298,11 +334,36 @@ def df_to_columnar_json(complete_dataset, output_path):
             "iso_code": ["AFG", "AFG", ... ],
             "date": ["2020-03-01", "2020-03-02", ... ]
         }
+
+    The file is streamed column by column, in chunks of `chunksize` rows, so that the complete JSON string is never
+    held in memory. Output is the same as `dict_to_compact_json` on the columnar dictionary.
+
+    The file is first written to a temporary file in the same directory, which then replaces `output_path`. This way,
+    readers never see a partially written file.
     """
-    # Replace NaNs with None in order to be serializable to JSON.
-    # JSON doesn't support NaNs, but it does have null which is represented as None in Python.
-    columnar_dict = complete_dataset.to_dict(orient="list")
-    for k, v in columnar_dict.items():
-        columnar_dict[k] = [x if pd.notnull(x) else None for x in v]
-    with open(output_path, "w") as file:
-        file.write(dict_to_compact_json(columnar_dict))
+    output_path_tmp = f"{output_path}.tmp"
+    try:
+        with open(output_path_tmp, "w") as file:
+            _write_columnar_json(complete_dataset, file, chunksize)
+    except BaseException:
+        if os.path.isfile(output_path_tmp):
+            os.remove(output_path_tmp)
+        raise
+    os.replace(output_path_tmp, output_path)
+
+
+def _write_columnar_json(complete_dataset, file, chunksize):
+    file.write("{")
+    for i, column in enumerate(complete_dataset.columns):
+        if i > 0:
+            file.write(",")
+        file.write(f"{dict_to_compact_json(column)}:[")
+        for start in range(0, len(complete_dataset), chunksize):
+            if start > 0:
+                file.write(",")
+            # Replace NAs with None in order to be serializable to JSON.
+            # JSON doesn't support NaNs, but it does have null which is represented as None in Python.
+            values = complete_dataset.iloc[start : start + chunksize, i].to_numpy(dtype=object, na_value=None)
+            file.write(dict_to_compact_json(values.tolist())[1:-1])
+        file.write("]")
+    file.write("}")
@@ -1,65 +1,81 @@
 import os
-from datetime import date, timedelta
+import tempfile
+from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
 
-from cowidev.utils.s3 import S3, obj_to_s3
-from cowidev.utils.utils import get_project_dir, dict_to_compact_json
+from cowidev.utils.s3 import S3
+from cowidev.utils.utils import get_project_dir, dict_to_compact_json, latest_by_group
 
 
 DATA_DIR = os.path.abspath(os.path.join(get_project_dir(), "public", "data"))
+# Creation date of XLSX files. By default, the workbook stores the time it was written, so unchanged data would produce
+# a different file (and be uploaded again, see `S3.upload_many`)
+XLSX_CREATED = datetime(2020, 1, 1)
 
 
 def create_dataset(df, macro_variables):
     """Export dataset as CSV, XLSX and JSON (complete time series)."""
-    print("Writing to CSV…")
-    filename = os.path.join(DATA_DIR, "owid-covid-data.csv")
-    df.to_csv(filename, index=False)
-    S3().upload_to_s3(filename, "s3://covid-19/public/owid-covid-data.csv", public=True)
-
-    print("Writing to XLSX…")
-    # filename = os.path.join(DATA_DIR, "owid-covid-data.xlsx")
-    # all_covid.to_excel(os.path.join(DATA_DIR, "owid-covid-data.xlsx"), index=False, engine="xlsxwriter")
-    # upload_to_s3(filename, "public/owid-covid-data.xlsx", public=True)
-    obj_to_s3(df, s3_path="s3://covid-19/public/owid-covid-data.xlsx", public=True)
-
-    print("Writing to JSON…")
-    data = df_to_dict(
-        df,
-        macro_variables.keys(),
-        valid_json=True,
-    )
-    obj_to_s3(data, "s3://covid-19/public/owid-covid-data.json", public=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        print("Writing to CSV…")
+        filename_csv = os.path.join(DATA_DIR, "owid-covid-data.csv")
+        df.to_csv(filename_csv, index=False)
+
+        print("Writing to XLSX…")
+        filename_xlsx = os.path.join(tmp, "owid-covid-data.xlsx")
+        _to_excel(df, filename_xlsx)
+
+        print("Writing to JSON…")
+        filename_json = os.path.join(tmp, "owid-covid-data.json")
+        df_to_json(df, filename_json, macro_variables.keys())
+
+        S3().upload_many(
+            [filename_csv, filename_xlsx, filename_json],
+            [
+                "s3://covid-19/public/owid-covid-data.csv",
+                "s3://covid-19/public/owid-covid-data.xlsx",
+                "s3://covid-19/public/owid-covid-data.json",
+            ],
+            public=True,
+            skip_unchanged=True,
+        )
 
 
 def create_latest(df):
     """Export dataset as CSV, XLSX and JSON (latest data points)."""
-    df = df[df.date >= str(date.today() - timedelta(weeks=2))]
-    df = df.sort_values("date")
-
-    latest = [df[df.location == loc].ffill().tail(1).round(3) for loc in set(df.location)]
-    latest = pd.concat(latest)
-    latest = latest.sort_values("location").rename(columns={"date": "last_updated_date"})
+    latest = latest_by_group(df, "location", window=timedelta(weeks=2)).round(3)
+    latest = latest.rename(columns={"date": "last_updated_date"})
 
     print("Writing latest version…")
-    # CSV
-    latest.to_csv(os.path.join(DATA_DIR, "latest", "owid-covid-latest.csv"), index=False)
-    S3().upload_to_s3(
-        os.path.join(DATA_DIR, "latest", "owid-covid-latest.csv"),
-        "s3://covid-19/public/latest/owid-covid-latest.csv",
-        public=True,
-    )
-    # XLSX
-    obj_to_s3(latest, s3_path="s3://covid-19/public/latest/owid-covid-latest.xlsx", public=True)
-    # JSON
-    latest.dropna(subset=["iso_code"]).set_index("iso_code").to_json(
-        os.path.join(DATA_DIR, "latest", "owid-covid-latest.json"), orient="index"
-    )
-    S3().upload_to_s3(
-        os.path.join(DATA_DIR, "latest", "owid-covid-latest.json"),
-        "s3://covid-19/public/latest/owid-covid-latest.json",
-        public=True,
-    )
+    with tempfile.TemporaryDirectory() as tmp:
+        # CSV
+        filename_csv = os.path.join(DATA_DIR, "latest", "owid-covid-latest.csv")
+        latest.to_csv(filename_csv, index=False)
+        # XLSX
+        filename_xlsx = os.path.join(tmp, "owid-covid-latest.xlsx")
+        _to_excel(latest, filename_xlsx)
+        # JSON
+        filename_json = os.path.join(DATA_DIR, "latest", "owid-covid-latest.json")
+        latest.dropna(subset=["iso_code"]).set_index("iso_code").to_json(filename_json, orient="index")
+
+        S3().upload_many(
+            [filename_csv, filename_xlsx, filename_json],
+            [
+                "s3://covid-19/public/latest/owid-covid-latest.csv",
+                "s3://covid-19/public/latest/owid-covid-latest.xlsx",
+                "s3://covid-19/public/latest/owid-covid-latest.json",
+            ],
+            public=True,
+            skip_unchanged=True,
+        )
+
+
+def _to_excel(df, filename):
+    # Same content -> same file
+    with pd.ExcelWriter(filename, engine="xlsxwriter") as writer:
+        writer.book.set_properties({"created": XLSX_CREATED})
+        df.to_excel(writer, index=False)
 
 
 def df_to_dict(complete_dataset, static_columns, valid_json=False):
@@ -68,20 +84,7 @@ def df_to_dict(complete_dataset, static_columns, valid_json=False):
     NA values are dropped from the output.
     Macro variables are normalized by appearing only once, at the root of each ISO code.
     """
-    megajson = {}
-
-    static_columns = ["continent", "location"] + list(static_columns)
-
-    complete_dataset = complete_dataset.dropna(axis="rows", subset=["iso_code"])
-
-    for iso in complete_dataset.iso_code.unique():
-        country_df = complete_dataset[complete_dataset.iso_code == iso].drop(columns=["iso_code"])
-        static_data = country_df.head(1)[static_columns].to_dict("records")[0]
-        megajson[iso] = {k: v for k, v in static_data.items() if pd.notnull(v)}
-        megajson[iso]["data"] = [
-            {k: v for k, v in r.items() if pd.notnull(v)}
-            for r in country_df.drop(columns=static_columns).to_dict("records")
-        ]
+    megajson = dict(_iter_countries(complete_dataset, static_columns))
     if valid_json:
         megajson = dict_to_compact_json(megajson)
     return megajson
@@ -93,6 +96,53 @@ def df_to_json(complete_dataset, output_path, static_columns):
     NA values are dropped from the output.
     Macro variables are normalized by appearing only once, at the root of each ISO code.
     """
-    megajson = df_to_dict(complete_dataset, static_columns, valid_json=True)
     with open(output_path, "w") as file:
-        file.write(megajson)
+        write_json(complete_dataset, file, static_columns)
+
+
+def write_json(complete_dataset, file, static_columns):
+    """Streams the JSON version of the complete dataset (see `df_to_dict`) to an open file, one ISO code at a time.
+
+    Output is the same as `df_to_dict(..., valid_json=True)`, without holding the complete dictionary or string in
+    memory.
+    """
+    file.write("{")
+    for i, (iso, country_data) in enumerate(_iter_countries(complete_dataset, static_columns)):
+        if i > 0:
+            file.write(",")
+        file.write(f"{dict_to_compact_json(iso)}:{dict_to_compact_json(country_data)}")
+    file.write("}")
+
+
+def _iter_countries(complete_dataset, static_columns):
+    """Yields (ISO code, country data) pairs, in order of first appearance of the ISO code.
+
+    Rows are sorted once by ISO code (stable), so that each country is a contiguous block of rows. Nulls are dropped
+    using a precomputed mask of the whole table.
+    """
+    static_columns = ["continent", "location"] + list(static_columns)
+
+    complete_dataset = complete_dataset.dropna(axis="rows", subset=["iso_code"])
+    codes, isos = pd.factorize(complete_dataset.iso_code)
+    complete_dataset = complete_dataset.iloc[np.argsort(codes, kind="stable")]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(isos)))])
+
+    data_columns = complete_dataset.columns.drop(["iso_code"] + static_columns).tolist()
+    static = complete_dataset[static_columns]
+    data = complete_dataset[data_columns]
+    static_notnull = static.notnull().to_numpy()
+    data_notnull = data.notnull().to_numpy()
+
+    for i, iso in enumerate(isos):
+        start, end = offsets[i], offsets[i + 1]
+        country_data = _records(static.iloc[start : start + 1], static_notnull[start : start + 1])[0]
+        country_data["data"] = _records(data.iloc[start:end], data_notnull[start:end])
+        yield iso, country_data
+
+
+def _records(df, notnull):
+    columns = df.columns.tolist()
+    return [
+        {column: value for column, value, msk in zip(columns, row, row_notnull) if msk}
+        for row, row_notnull in zip(df.to_numpy(dtype=object).tolist(), notnull.tolist())
+    ]
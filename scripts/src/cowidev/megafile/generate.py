@@ -3,9 +3,17 @@ from datetime import date
 
 import pandas as pd
 
+from cowidev.utils.reference import get_continents
 from cowidev.utils.utils import get_project_dir, export_timestamp
+from cowidev.megafile.checkpoint import (
+    MegafileCheckpoint,
+    build_incremental,
+    fingerprint_files,
+    fingerprint_sources,
+)
 from cowidev.megafile.steps import (
-    get_base_dataset,
+    load_sources,
+    merge_sources,
     add_macro_variables,
     add_excess_mortality,
     add_rolling_vaccinations,
@@ -26,9 +34,36 @@ README_TMP = os.path.join(get_project_dir(), "scripts", "scripts", "README.md.te
 README_FILE = os.path.join(DATA_DIR, "README.md")
 
 
-def generate_megafile():
-    """Generate megafile data."""
-    all_covid = get_base_dataset()
+# Macro variables
+# - the key is the name of the variable of interest
+# - the value is the path to the corresponding file
+MACRO_VARIABLES = {
+    "population": "un/population_latest.csv",
+    "population_density": "wb/population_density.csv",
+    "median_age": "un/median_age.csv",
+    "aged_65_older": "wb/aged_65_older.csv",
+    "aged_70_older": "un/aged_70_older.csv",
+    "gdp_per_capita": "wb/gdp_per_capita.csv",
+    "extreme_poverty": "wb/extreme_poverty.csv",
+    "cardiovasc_death_rate": "gbd/cardiovasc_death_rate.csv",
+    "diabetes_prevalence": "wb/diabetes_prevalence.csv",
+    "female_smokers": "wb/female_smokers.csv",
+    "male_smokers": "wb/male_smokers.csv",
+    "handwashing_facilities": "un/handwashing_facilities.csv",
+    "hospital_beds_per_thousand": "owid/hospital_beds.csv",
+    "life_expectancy": "owid/life_expectancy.csv",
+    "human_development_index": "un/human_development_index.csv",
+}
+ISO_CODES_CSV = os.path.join(INPUT_DIR, "iso", "iso3166_1_alpha_3_codes.csv")
+CONTINENTS_CSV = os.path.join(INPUT_DIR, "owid", "continents.csv")
+XM_WMD_HMD_CSV = os.path.join(DATA_DIR, "excess_mortality", "excess_mortality.csv")
+XM_ECONOMIST_CSV = os.path.join(DATA_DIR, "excess_mortality", "excess_mortality_economist_estimates.csv")
+CHECKPOINT_DIR = os.path.join(get_project_dir(), "scripts", "tmp", "megafile")
+
+
+def build_megafile(sources: dict):
+    """Build the megafile table from source datasets (see `load_sources`)."""
+    all_covid = merge_sources(sources)
 
     # Remove today's datapoint
     all_covid = all_covid[all_covid["date"] < str(date.today())]
@@ -39,7 +74,7 @@ def generate_megafile():
 
     # Add ISO codes
     print("Adding ISO codes…")
-    iso_codes = pd.read_csv(os.path.join(INPUT_DIR, "iso", "iso3166_1_alpha_3_codes.csv"))
+    iso_codes = pd.read_csv(ISO_CODES_CSV)
 
     missing_iso = set(all_covid.location).difference(set(iso_codes.location))
     if len(missing_iso) > 0:
@@ -50,42 +85,18 @@ def generate_megafile():
 
     # Add continents
     print("Adding continents…")
-    continents = pd.read_csv(
-        os.path.join(INPUT_DIR, "owid", "continents.csv"),
-        names=["_1", "iso_code", "_2", "continent"],
-        usecols=["iso_code", "continent"],
-        header=0,
-    )
+    continents = get_continents(CONTINENTS_CSV)[["iso_code", "continent"]]
 
     all_covid = continents.merge(all_covid, on="iso_code", how="right")
 
     # Add macro variables
-    # - the key is the name of the variable of interest
-    # - the value is the path to the corresponding file
-    macro_variables = {
-        "population": "un/population_latest.csv",
-        "population_density": "wb/population_density.csv",
-        "median_age": "un/median_age.csv",
-        "aged_65_older": "wb/aged_65_older.csv",
-        "aged_70_older": "un/aged_70_older.csv",
-        "gdp_per_capita": "wb/gdp_per_capita.csv",
-        "extreme_poverty": "wb/extreme_poverty.csv",
-        "cardiovasc_death_rate": "gbd/cardiovasc_death_rate.csv",
-        "diabetes_prevalence": "wb/diabetes_prevalence.csv",
-        "female_smokers": "wb/female_smokers.csv",
-        "male_smokers": "wb/male_smokers.csv",
-        "handwashing_facilities": "un/handwashing_facilities.csv",
-        "hospital_beds_per_thousand": "owid/hospital_beds.csv",
-        "life_expectancy": "owid/life_expectancy.csv",
-        "human_development_index": "un/human_development_index.csv",
-    }
-    all_covid = add_macro_variables(all_covid, macro_variables, INPUT_DIR)
+    all_covid = add_macro_variables(all_covid, MACRO_VARIABLES, INPUT_DIR)
 
     # Add excess mortality
     all_covid = add_excess_mortality(
         df=all_covid,
-        wmd_hmd_file=os.path.join(DATA_DIR, "excess_mortality", "excess_mortality.csv"),
-        economist_file=os.path.join(DATA_DIR, "excess_mortality", "excess_mortality_economist_estimates.csv"),
+        wmd_hmd_file=XM_WMD_HMD_CSV,
+        economist_file=XM_ECONOMIST_CSV,
     )
 
     # Calculate rolling vaccinations
@@ -97,6 +108,52 @@ def generate_megafile():
     # Check that we only have 1 unique row for each location/date pair
     assert all_covid.drop_duplicates(subset=["location", "date"]).shape == all_covid.shape
 
+    return all_covid
+
+
+def _checkpoint_salt():
+    # Inputs shared by all locations. If any of them changes (or the day changes, as today's data points are
+    # removed), all locations are re-built.
+    files = [
+        ISO_CODES_CSV,
+        CONTINENTS_CSV,
+        XM_WMD_HMD_CSV,
+        XM_ECONOMIST_CSV,
+        *[os.path.join(INPUT_DIR, file) for file in MACRO_VARIABLES.values()],
+    ]
+    return f"{date.today()}-{fingerprint_files(files)}"
+
+
+def generate_megafile(full: bool = False):
+    """Generate megafile data.
+
+    Args:
+        full (bool, optional): Set to True to build all locations from scratch. Otherwise, only locations whose input
+                                data changed since the last run are re-built (see `megafile.checkpoint`). Defaults to
+                                False.
+    """
+    sources = load_sources()
+    checkpoint = MegafileCheckpoint(CHECKPOINT_DIR)
+    if full:
+        all_covid = build_megafile(sources)
+        fingerprints = fingerprint_sources(sources, _checkpoint_salt())
+    else:
+        all_covid, changed, fingerprints = build_incremental(
+            sources, build_megafile, checkpoint, _checkpoint_salt()
+        )
+        if not changed:
+            print("No changes in input data since last run, skipping exports.")
+            _export_metadata()
+            return
+
+    _export_data(all_covid)
+    # Saved once all exports succeeded, so that a failed export is retried in the next run
+    checkpoint.save(all_covid, fingerprints)
+    _export_metadata()
+    print("All done!")
+
+
+def _export_data(all_covid):
     print("Creating internal files…")
     create_internal(
         df=all_covid,
@@ -130,8 +187,10 @@ def generate_megafile():
     create_latest(all_covid)
 
     # Create datasets
-    create_dataset(all_covid, macro_variables)
+    create_dataset(all_covid, MACRO_VARIABLES)
+
 
+def _export_metadata():
     # Store the last updated time
     dir = os.path.join(get_project_dir(), "public", "data")
     export_timestamp("owid-covid-data-last-updated-timestamp.txt", force_directory=dir)  # @deprecate
@@ -141,5 +200,3 @@ def generate_megafile():
 
     # Export timestamp
     export_timestamp("owid-covid-data-last-updated-timestamp-root.txt")
-
-    print("All done!")
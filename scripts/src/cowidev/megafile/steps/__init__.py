@@ -1,10 +1,12 @@
-from cowidev.megafile.steps.core import get_base_dataset
+from cowidev.megafile.steps.core import get_base_dataset, load_sources, merge_sources
 from cowidev.megafile.steps.macro import add_macro_variables
 from cowidev.megafile.steps.xm import add_excess_mortality
 from cowidev.megafile.steps.vax import add_rolling_vaccinations
 
 __all__ = [
     "get_base_dataset",
+    "load_sources",
+    "merge_sources",
     "add_macro_variables",
     "add_excess_mortality",
     "add_rolling_vaccinations",
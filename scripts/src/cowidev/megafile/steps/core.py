@@ -1,9 +1,14 @@
 import os
+import time
+
+from joblib import Parallel, delayed
+import pandas as pd
 
 from cowidev.utils.utils import get_project_dir
 from cowidev.megafile.steps.cgrt import get_cgrt
 from cowidev.megafile.steps.hosp import get_hosp
 from cowidev.megafile.steps.jhu import get_jhu
+from cowidev.megafile.steps.join import join_sources
 from cowidev.megafile.steps.reprod import get_reprod
 from cowidev.megafile.steps.test import get_testing
 from cowidev.megafile.steps.variants import get_variants
@@ -17,44 +22,125 @@ DATA_DIR = os.path.abspath(os.path.join(get_project_dir(), "public", "data"))
 
 def get_base_dataset():
     """Get owid datasets from: jhu, reproduction rate, hospitalizations, testing ,vaccinations, CGRT."""
-    print("Fetching JHU dataset…")
-    jhu = get_jhu(jhu_dir=os.path.join(get_project_dir(), "public", "data", "jhu"))
+    sources = load_sources()
+    return merge_sources(sources)
 
-    print("Fetching reproduction rate…")
-    reprod = get_reprod(
-        file_url="https://github.com/crondonm/TrackingR/raw/main/Estimates-Database/database.csv",
-        country_mapping=os.path.join(INPUT_DIR, "reproduction", "reprod_country_standardized.csv"),
-    )
 
-    print("Fetching hospital dataset…")
-    hosp = get_hosp(data_file=os.path.join(GRAPHER_DIR, "COVID-2019 - Hospital & ICU.csv"))
+def load_sources(parallel: bool = True, n_jobs: int = None):
+    """Load all source datasets that make up the base dataset.
 
-    print("Fetching testing dataset…")
-    testing = get_testing()
+    Loaders are independent from each other, so by default they run concurrently (most of their time is spent on I/O).
 
-    print("Fetching vaccination dataset…")
-    vax = get_vax(data_file=os.path.join(DATA_DIR, "vaccinations", "vaccinations.csv"))
-    vax = vax[-vax.location.isin(["England", "Northern Ireland", "Scotland", "Wales"])]
+    Args:
+        parallel (bool, optional): Set to True to run loaders in parallel threads. Defaults to True.
+        n_jobs (int, optional): Number of threads. Check Parallel class in joblib library for more info. Defaults to
+                                one thread per loader.
+
+    Returns:
+        dict: Source name -> dataframe with one row per location & date.
+    """
+    t0 = time.time()
+    loaders = _get_loaders()
+    if parallel:
+        n_jobs = n_jobs or len(loaders)
+        results = Parallel(n_jobs=n_jobs, backend="threading")(
+            delayed(_run_loader)(name, *loader) for name, loader in loaders.items()
+        )
+    else:
+        results = [_run_loader(name, *loader) for name, loader in loaders.items()]
+    _print_timing(t0, results)
+    return {r["name"]: r["data"] for r in results}
+
+
+def _get_loaders():
+    # name -> (description, function, kwargs)
+    return {
+        "jhu": (
+            "JHU dataset",
+            get_jhu,
+            {"jhu_dir": os.path.join(get_project_dir(), "public", "data", "jhu")},
+        ),
+        "reprod": (
+            "reproduction rate",
+            get_reprod,
+            {
+                "file_url": "https://github.com/crondonm/TrackingR/raw/main/Estimates-Database/database.csv",
+                "country_mapping": os.path.join(INPUT_DIR, "reproduction", "reprod_country_standardized.csv"),
+            },
+        ),
+        "hosp": (
+            "hospital dataset",
+            get_hosp,
+            {"data_file": os.path.join(GRAPHER_DIR, "COVID-2019 - Hospital & ICU.csv")},
+        ),
+        "testing": (
+            "testing dataset",
+            get_testing,
+            {},
+        ),
+        "vax": (
+            "vaccination dataset",
+            _get_vax,
+            {"data_file": os.path.join(DATA_DIR, "vaccinations", "vaccinations.csv")},
+        ),
+        "cgrt": (
+            "OxCGRT dataset",
+            get_cgrt,
+            {
+                "bsg_latest": os.path.join(INPUT_DIR, "bsg", "latest.csv"),
+                "country_mapping": os.path.join(INPUT_DIR, "bsg", "bsg_country_standardised.csv"),
+            },
+        ),
+        "variants": (
+            "variants dataset",
+            get_variants,
+            {
+                "variants_file": "s3://covid-19/internal/variants/covid-variants.csv",
+                "cases_file": os.path.join(DATA_DIR, "jhu", "full_data.csv"),
+            },
+        ),
+    }
 
-    print("Fetching OxCGRT dataset…")
-    cgrt = get_cgrt(
-        bsg_latest=os.path.join(INPUT_DIR, "bsg", "latest.csv"),
-        country_mapping=os.path.join(INPUT_DIR, "bsg", "bsg_country_standardised.csv"),
-    )
 
-    print("Fetching variants dataset…")
-    variants = get_variants(
-        variants_file="s3://covid-19/internal/variants/covid-variants.csv",
-        cases_file=os.path.join(DATA_DIR, "jhu", "full_data.csv"),
+def _get_vax(data_file: str):
+    vax = get_vax(data_file=data_file)
+    return vax[-vax.location.isin(["England", "Northern Ireland", "Scotland", "Wales"])]
+
+
+def _run_loader(name: str, description: str, loader, kwargs: dict):
+    t0 = time.time()
+    print(f"Fetching {description}…")
+    df = loader(**kwargs)
+    t = round(time.time() - t0, 2)
+    print(f"Fetched {description} ({t} seconds)")
+    return {"name": name, "data": df, "time": t}
+
+
+def _print_timing(t0, results):
+    t_sec = round(time.time() - t0, 2)
+    df_time = (
+        pd.DataFrame([{"source": r["name"], "execution_time (sec)": r["time"]} for r in results])
+        .set_index("source")
+        .sort_values(by="execution_time (sec)", ascending=False)
     )
+    print("---")
+    print("TIMING DETAILS")
+    print(f"Loading sources took {t_sec} seconds.")
+    print(df_time)
+    print("---")
+
 
+def merge_sources(sources: dict):
+    """Merge all source datasets into one table (1 row per location & date)."""
     # Big merge
-    return (
-        jhu.merge(reprod, on=["date", "location"], how="outer")
-        .merge(hosp, on=["date", "location"], how="outer")
-        .merge(testing, on=["date", "location"], how="outer")
-        .merge(vax, on=["date", "location"], how="outer")
-        .merge(cgrt, on=["date", "location"], how="left")
-        .merge(variants, on=["date", "location"], how="left")
-        .sort_values(["location", "date"])
+    return join_sources(
+        [
+            (sources["jhu"], "outer"),
+            (sources["reprod"], "outer"),
+            (sources["hosp"], "outer"),
+            (sources["testing"], "outer"),
+            (sources["vax"], "outer"),
+            (sources["cgrt"], "left"),
+            (sources["variants"], "left"),
+        ]
     )
@@ -1,72 +1,83 @@
-"merge"
 import os
-from functools import reduce
+
+import numpy as np
 import pandas as pd
 
+from cowidev.utils import paths
 
-def get_jhu(jhu_dir: str):
-    """
-    Reads each COVID-19 JHU dataset located in /public/data/jhu/
-    Melts the dataframe to vertical format (1 row per country and date)
-    Merges all JHU dataframes into one with outer joins
 
-    Returns:
-        jhu {dataframe}
-    """
+# Long-format JHU table (one row per location and date, one column per measure), exported by the JHU pipeline after
+# the wide CSVs. It is not published: it lives in the (ignored) local tmp directory. If missing (e.g. in a fresh
+# checkout) or older than the CSVs, the CSVs are read instead.
+JHU_LONG_PATH = os.path.join(paths.SCRIPTS.TMP, "jhu", "jhu_long.parquet")
 
-    jhu_variables = [
-        "total_cases",
-        "new_cases",
-        "weekly_cases",
-        "total_deaths",
-        "new_deaths",
-        "weekly_deaths",
-        "total_cases_per_million",
-        "new_cases_per_million",
-        "weekly_cases_per_million",
-        "total_deaths_per_million",
-        "new_deaths_per_million",
-        "weekly_deaths_per_million",
-    ]
+JHU_VARIABLES = [
+    "total_cases",
+    "new_cases",
+    "weekly_cases",
+    "total_deaths",
+    "new_deaths",
+    "weekly_deaths",
+    "total_cases_per_million",
+    "new_cases_per_million",
+    "weekly_cases_per_million",
+    "total_deaths_per_million",
+    "new_deaths_per_million",
+    "weekly_deaths_per_million",
+]
 
-    data_frames = []
 
-    # Process each file and melt it to vertical format
-    for jhu_var in jhu_variables:
-        tmp = pd.read_csv(os.path.join(jhu_dir, f"{jhu_var}.csv"))
-        country_cols = list(tmp.columns)
-        country_cols.remove("date")
+def get_jhu(jhu_dir: str, long_path: str = JHU_LONG_PATH):
+    """
+    Reads the long-format COVID-19 JHU dataset in `long_path` (only the required columns), or builds it from the wide
+    CSVs located in `jhu_dir` (e.g. /public/data/jhu/) if it is not available
+    Keeps rows with at least one value (1 row per country and date)
 
-        # Carrying last observation forward for International totals to avoid discrepancies
-        if jhu_var[:5] == "total":
-            tmp = tmp.sort_values("date")
-            tmp["International"] = tmp["International"].ffill()
+    Returns:
+        jhu {dataframe}
+    """
+    jhu = _read_jhu_long(jhu_dir, long_path)
 
-        tmp = (
-            pd.melt(tmp, id_vars="date", value_vars=country_cols)
-            .rename(columns={"value": jhu_var, "variable": "location"})
-            .dropna()
-        )
+    # Carrying last observation forward for International totals to avoid discrepancies
+    jhu = _ffill_international_totals(jhu)
+    jhu = jhu.dropna(subset=JHU_VARIABLES, how="all")
 
+    for jhu_var in JHU_VARIABLES:
         if jhu_var[:7] == "weekly_":
-            tmp[jhu_var] = tmp[jhu_var].div(7).round(3)
-            tmp = tmp.rename(
-                errors="ignore",
-                columns={
-                    "weekly_cases": "new_cases_smoothed",
-                    "weekly_deaths": "new_deaths_smoothed",
-                    "weekly_cases_per_million": "new_cases_smoothed_per_million",
-                    "weekly_deaths_per_million": "new_deaths_smoothed_per_million",
-                },
-            )
+            jhu[jhu_var] = jhu[jhu_var].div(7).round(3)
         else:
-            tmp[jhu_var] = tmp[jhu_var].round(3)
-        data_frames.append(tmp)
-
-    # Outer join between all files
-    jhu = reduce(
-        lambda left, right: pd.merge(left, right, on=["date", "location"], how="outer"),
-        data_frames,
+            jhu[jhu_var] = jhu[jhu_var].round(3)
+    jhu = jhu.rename(
+        columns={
+            "weekly_cases": "new_cases_smoothed",
+            "weekly_deaths": "new_deaths_smoothed",
+            "weekly_cases_per_million": "new_cases_smoothed_per_million",
+            "weekly_deaths_per_million": "new_deaths_smoothed_per_million",
+        },
     )
+    return jhu.sort_values(["location", "date"]).reset_index(drop=True)
+
+
+def _read_jhu_long(jhu_dir: str, path_long: str) -> pd.DataFrame:
+    paths_wide = [os.path.join(jhu_dir, f"{jhu_var}.csv") for jhu_var in JHU_VARIABLES]
+    if os.path.isfile(path_long) and os.path.getmtime(path_long) >= max(map(os.path.getmtime, paths_wide)):
+        return pd.read_parquet(path_long, columns=["date", "location", *JHU_VARIABLES])
+    # Melt each wide file (1 column per location) and outer join them
+    data_frames = [
+        pd.read_csv(path)
+        .melt(id_vars="date", var_name="location", value_name=jhu_var)
+        .dropna()
+        .set_index(["date", "location"])
+        for jhu_var, path in zip(JHU_VARIABLES, paths_wide)
+    ]
+    return pd.concat(data_frames, axis=1).rename_axis(["date", "location"]).reset_index()
+
 
-    return jhu
+def _ffill_international_totals(jhu: pd.DataFrame) -> pd.DataFrame:
+    # International totals are forward-filled over all dates in the dataset
+    msk = jhu.location == "International"
+    total_cols = [col for col in JHU_VARIABLES if col[:5] == "total"]
+    international = jhu[msk].set_index("date").reindex(np.sort(jhu.date.unique()))
+    international[total_cols] = international[total_cols].ffill()
+    international = international.rename_axis("date").reset_index().assign(location="International")
+    return pd.concat([jhu[~msk], international[jhu.columns]], ignore_index=True)
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+
+KEYS = ["date", "location"]
+
+
+def join_sources(sources: list) -> pd.DataFrame:
+    """Join source datasets on location & date in a single step.
+
+    Equivalent to chaining `pd.merge(..., on=["date", "location"], how=how)` over `sources` and sorting the result by
+    location and date, but without re-hashing keys and copying the growing table at each merge:
+
+    - Each (location, date) pair is encoded as one integer, from categorical location and date codes.
+    - The key index is built once, as the sorted union of the keys of all 'outer' sources ('left' sources do not add
+      keys).
+    - Each source is aligned against the key index once, and its columns are added to the output table.
+
+    Args:
+        sources (list): List of tuples (df, how). `df` must contain columns `date` and `location`, with
+                        unique pairs. `how` is either 'outer' or 'left', and all 'left' sources must come after the
+                        'outer' ones. The first `how` is ignored.
+
+    Returns:
+        pd.DataFrame: Joined dataset, sorted by location and date.
+    """
+    dfs = [df for df, _ in sources]
+    hows = ["outer"] + [how for _, how in sources[1:]]
+    _check_sources(dfs, hows)
+
+    # Encode keys (categories are sorted, so that sorting keys is equivalent to sorting by location and date)
+    locations = _categories(dfs, "location")
+    dates = _categories(dfs, "date")
+    keys = [_encode_keys(df, locations, dates) for df in dfs]
+    _check_keys(dfs, keys)
+
+    # Build key index
+    index = np.unique(np.concatenate([k for k, how in zip(keys, hows) if how == "outer"]))
+
+    # Decode keys
+    location_codes, date_codes = np.divmod(index, len(dates))
+    df = pd.DataFrame(
+        {
+            "date": dates[date_codes],
+            "location": locations[location_codes],
+        }
+    )
+
+    # Align sources against key index (one source at a time, to keep memory usage low)
+    for df_source, k in zip(dfs, keys):
+        df_source = df_source.drop(columns=KEYS).set_axis(k, axis=0).reindex(index)
+        for column in df_source.columns:
+            df[column] = df_source[column].values
+    return df[_columns_order(dfs)]
+
+
+def _categories(dfs: list, column: str) -> np.ndarray:
+    # Missing values are left out (they are reported by `_check_keys`)
+    values = pd.concat([pd.Series(df[column].unique()) for df in dfs], ignore_index=True).dropna().unique()
+    types = {type(value).__name__ for value in values}
+    if len(types) > 1:
+        raise ValueError(f"Found values of different types in column `{column}`: {sorted(types)}.")
+    return np.sort(values.astype(object))
+
+
+def _encode_keys(df: pd.DataFrame, locations: np.ndarray, dates: np.ndarray) -> np.ndarray:
+    location_codes = pd.Categorical(df.location, categories=locations).codes.astype(np.int64)
+    date_codes = pd.Categorical(df.date, categories=dates).codes.astype(np.int64)
+    # Missing values have code -1 (and therefore a negative key)
+    return np.where((location_codes < 0) | (date_codes < 0), -1, location_codes * len(dates) + date_codes)
+
+
+def _check_sources(dfs: list, hows: list):
+    for how in hows:
+        if how not in ("outer", "left"):
+            raise ValueError(f"Invalid join type {how}. Use 'outer' or 'left'.")
+    if "left" in hows and "outer" in hows[hows.index("left") :]:
+        raise ValueError("All 'left' sources must come after the 'outer' sources.")
+    columns = [c for df in dfs for c in df.columns if c not in KEYS]
+    if len(columns) != len(set(columns)):
+        raise ValueError("Sources must not share columns other than `date` and `location`.")
+
+
+def _check_keys(dfs: list, keys: list):
+    for df, k in zip(dfs, keys):
+        if (k < 0).any():
+            raise ValueError(f"Found missing location/date values in source with columns {df.columns.tolist()}.")
+        if not pd.Index(k).is_unique:
+            raise ValueError(f"Found duplicate location/date rows in source with columns {df.columns.tolist()}.")
+
+
+def _columns_order(dfs):
+    # Same order as with pd.merge: columns of the first source, then the rest.
+    return [*dfs[0].columns, *[c for df in dfs[1:] for c in df.columns if c not in KEYS]]
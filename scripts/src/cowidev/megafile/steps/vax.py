@@ -42,19 +42,63 @@ def get_vax(data_file):
     return vax
 
 
-def _add_rolling(df: pd.DataFrame) -> pd.DataFrame:
-    last_known_date = df.loc[df.total_vaccinations.notnull(), "date"].max()
+def add_rolling_vaccinations(df: pd.DataFrame) -> pd.DataFrame:
+    """Add 6/9/12-month rolling sums of vaccinations (absolute and per hundred) for all locations at once.
+
+    Equivalent to `total_vaccinations.interpolate().diff().rolling(n_days, min_periods=1).sum()` within each location,
+    with values after the last known `total_vaccinations` removed. Rows are returned sorted by location (stable).
+
+    Because the rolling sum of the daily differences of a series is itself a windowed difference of the series, each
+    window is computed as the interpolated total now minus the interpolated total `n_days` rows earlier (or at the
+    first known value, if the window starts before it).
+    """
+    df = df.iloc[np.argsort(df.location.values, kind="stable")].reset_index(drop=True)
+    group_first_valid = _first_valid_position(df)
+    total_vaccinations = _interpolate_grouped(df)
+    position = np.arange(len(df))
+
+    # Last known date per location
+    last_known_date = df[df.total_vaccinations.notnull()].groupby("location").date.max()
+    last_known_date = df.location.map(last_known_date)
+    msk_unknown = (df.date > last_known_date).values
+
     for n_months in (6, 9, 12):
         n_days = round(365.2425 * n_months / 12)
-        df[f"rolling_vaccinations_{n_months}m"] = (
-            df.total_vaccinations.interpolate(method="linear").diff().rolling(n_days, min_periods=1).sum().round()
-        )
-        df.loc[df.date > last_known_date, f"rolling_vaccinations_{n_months}m"] = np.NaN
+        # Rows before (or at) the first known value have no differences within the window
+        position_lag = np.fmax(position - n_days, group_first_valid)
+        msk = (position > group_first_valid) & ~msk_unknown
+        rolling = np.full(len(df), np.nan)
+        rolling[msk] = total_vaccinations[msk] - total_vaccinations[position_lag[msk].astype(int)]
+        df[f"rolling_vaccinations_{n_months}m"] = np.round(rolling)
         df[f"rolling_vaccinations_{n_months}m_per_hundred"] = (
             df[f"rolling_vaccinations_{n_months}m"] * 100 / df.population
         ).round(2)
     return df
 
 
-def add_rolling_vaccinations(df: pd.DataFrame) -> pd.DataFrame:
-    return df.groupby("location").apply(_add_rolling).reset_index(drop=True)
+def _first_valid_position(df: pd.DataFrame) -> np.ndarray:
+    """Position of the first known `total_vaccinations` value of each row's location (NaN if there is none)."""
+    position = pd.Series(np.arange(len(df)), index=df.index, dtype=float).where(df.total_vaccinations.notnull())
+    return position.groupby(df.location).transform("min").values
+
+
+def _interpolate_grouped(df: pd.DataFrame) -> np.ndarray:
+    """Linear interpolation of `total_vaccinations` within each location (equivalent to `Series.interpolate()`).
+
+    Values between two known values are interpolated by row position, values after the last known value are filled
+    with it and values before the first known value are left empty.
+    """
+    values = df.total_vaccinations.values.astype(float)
+    position = pd.Series(np.arange(len(df)), index=df.index, dtype=float).where(df.total_vaccinations.notnull())
+    grouped = position.groupby(df.location)
+    position_prev = grouped.ffill().values
+    position_next = grouped.bfill().values
+
+    result = np.full(len(df), np.nan)
+    msk_prev = ~np.isnan(position_prev)
+    result[msk_prev] = values[position_prev[msk_prev].astype(int)]
+    msk = msk_prev & ~np.isnan(position_next) & (position_next > position_prev)
+    prev = position_prev[msk].astype(int)
+    next_ = position_next[msk].astype(int)
+    result[msk] = values[prev] + (values[next_] - values[prev]) * (np.arange(len(df))[msk] - prev) / (next_ - prev)
+    return result
@@ -1,8 +1,7 @@
 import re
 from cowidev.testing.utils.base import CountryTestBase
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
+from cowidev.utils.web.scraping import get_driver
 
 
 class Belize(CountryTestBase):
@@ -11,12 +10,9 @@ class Belize(CountryTestBase):
     def export(self):
         data = pd.read_csv(self.output_path)
 
-        op = Options()
-        op.add_argument("--headless")
-
         url = "https://sib.org.bz/covid-19/by-the-numbers/"
 
-        with webdriver.Chrome(options=op) as driver:
+        with get_driver() as driver:
             driver.get(url)
             count = int(driver.find_element_by_class_name("stats-number").get_attribute("data-counter-value"))
             date = str(
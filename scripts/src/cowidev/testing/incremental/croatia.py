@@ -1,20 +1,16 @@
 import re
 import time
 from cowidev.testing.utils.base import CountryTestBase
+from cowidev.utils.web.scraping import get_driver
 
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 
 
 SOURCE_URL = "https://www.koronavirus.hr/najnovije/ukupno-dosad-382-zarazene-osobe-u-hrvatskoj/35"
 
 
 def get_tests_snapshot():
-    op = Options()
-    op.add_argument("--headless")
-
-    with webdriver.Chrome(options=op) as driver:
+    with get_driver() as driver:
         driver.get(SOURCE_URL)
         time.sleep(2)
         all_text = driver.find_element_by_tag_name("body").text
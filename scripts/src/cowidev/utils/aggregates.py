@@ -0,0 +1,89 @@
+"""Aggregation of location time series into regions (e.g. World, continents, income groups).
+
+All aggregates are computed at once: values of each metric are arranged into a date × location matrix, which is
+multiplied by the location × aggregate membership matrix.
+"""
+import numpy as np
+import pandas as pd
+
+
+def membership_matrix(locations, aggregates: dict) -> np.ndarray:
+    """Build the location × aggregate membership matrix.
+
+    Args:
+        locations (list): Locations (rows of the matrix).
+        aggregates (dict): Aggregate definitions, as `{name: {"include": [...], "exclude": [...]}}`. A missing (or
+                            None) `include` means all locations, while an empty one means no location.
+
+    Returns:
+        np.ndarray: Boolean matrix of shape (len(locations), len(aggregates)).
+    """
+    locations = pd.Index(locations)
+    membership = np.ones((len(locations), len(aggregates)), dtype=bool)
+    for i, params in enumerate(aggregates.values()):
+        if params.get("include") is not None:
+            membership[:, i] &= locations.isin(params["include"])
+        if params.get("exclude"):
+            membership[:, i] &= ~locations.isin(params["exclude"])
+    return membership
+
+
+def aggregate_locations(
+    df: pd.DataFrame,
+    aggregates: dict,
+    columns: list = None,
+    ffill: bool = False,
+    location_col: str = "location",
+    date_col: str = "date",
+) -> pd.DataFrame:
+    """Sum the time series of locations into aggregates.
+
+    An aggregate has a row for each date with at least one row of its locations. Missing values count as zero. With
+    `ffill=True`, they are first forward-filled within each location (so a location that stopped reporting keeps
+    contributing its last value). One row per location and date is expected.
+
+    Args:
+        df (pd.DataFrame): Input data, in long format.
+        aggregates (dict): Aggregate definitions (see `membership_matrix`).
+        columns (list, optional): Metrics to aggregate. Defaults to all columns but `location_col` and `date_col`.
+        ffill (bool, optional): Forward-fill missing values within each location before summing. Defaults to False.
+        location_col (str, optional): Location column. Defaults to "location".
+        date_col (str, optional): Date column. Defaults to "date".
+
+    Returns:
+        pd.DataFrame: Aggregates, with columns `date_col`, `location_col` and `columns`, sorted by aggregate (in the
+                        order of `aggregates`) and date.
+    """
+    if columns is None:
+        columns = df.columns.drop([location_col, date_col]).tolist()
+    df = df.dropna(subset=[location_col, date_col])
+    date_codes, dates = pd.factorize(df[date_col], sort=True)
+    location_codes, locations = pd.factorize(df[location_col])
+    membership = membership_matrix(locations, aggregates).astype(float)
+
+    # Rows (date, aggregate) of the output
+    presence = np.zeros((len(dates), len(locations)))
+    presence[date_codes, location_codes] = 1
+    aggregate_idx, date_idx = np.nonzero((presence @ membership).T)
+
+    result = pd.DataFrame(
+        {
+            date_col: dates.take(date_idx),
+            location_col: np.array(list(aggregates), dtype=object)[aggregate_idx],
+        }
+    )
+    for column in columns:
+        values = np.full((len(dates), len(locations)), np.nan)
+        values[date_codes, location_codes] = df[column].to_numpy(dtype=float, na_value=np.nan)
+        if ffill:
+            values = _ffill(values)
+        sums = np.nan_to_num(values) @ membership
+        result[column] = pd.Series(sums[date_idx, aggregate_idx]).astype(df[column].dtype)
+    return result
+
+
+def _ffill(values: np.ndarray) -> np.ndarray:
+    # Forward-fill NaNs along the first axis
+    idx = np.where(np.isnan(values), 0, np.arange(values.shape[0])[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return values[idx, np.arange(values.shape[1])]
@@ -0,0 +1,167 @@
+"""Reference data shared by the pipelines: population, continents, income groups and EU member states.
+
+Input files are parsed once per process (later calls get a copy of the parsed table). Parsed tables are also cached
+on disk as Parquet files, keyed by the file modification time and content hash, so that other processes skip parsing
+too.
+
+The cache directory defaults to `scripts/tmp/reference-cache`, and can be changed with the environment variable
+`OWID_COVID_REFERENCE_CACHE`.
+"""
+import os
+import json
+import hashlib
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cowidev.utils import paths
+
+
+POPULATION_CSV = os.path.join(paths.SCRIPTS.INPUT_UN, "population_latest.csv")
+CONTINENTS_CSV = os.path.join(paths.SCRIPTS.INPUT_OWID, "continents.csv")
+WB_INCOME_GROUPS_CSV = os.path.join(paths.SCRIPTS.INPUT_WB, "income_groups.csv")
+INCOME_GROUPS_COMPLEMENT_CSV = os.path.join(paths.SCRIPTS.INPUT_OWID, "income_groups_complement.csv")
+EU_COUNTRIES_CSV = os.path.join(paths.SCRIPTS.INPUT_OWID, "eu_countries.csv")
+
+CACHE_DIR = os.environ.get("OWID_COVID_REFERENCE_CACHE", os.path.join(paths.SCRIPTS.TMP, "reference-cache"))
+CACHE_VERSION = 2  # Increase when a parser changes
+# Key of the Parquet metadata with the cache entry details (modification time, size and hash of the source file)
+_CACHE_METADATA_KEY = b"cowidev.reference"
+# Column of the table used to store list values
+_LIST_COLUMN = "__list__"
+
+_tables = {}
+_lock = threading.Lock()
+
+
+def get_population(path: str = POPULATION_CSV) -> pd.DataFrame:
+    """Population table, with columns `entity`, `iso_code`, `year` and `population`."""
+    return _load(path, _parse_population)
+
+
+def get_population_closest_year(year: int = 2021, path: str = POPULATION_CSV) -> pd.DataFrame:
+    """Population of each location for the year closest to `year` (in either direction).
+
+    Returns:
+        pd.DataFrame: Columns `location`, `population_year` and `population`.
+    """
+    df = get_population(path)[["entity", "year", "population"]]
+    df = df.loc[df.year.sub(year).abs().groupby(df.entity).idxmin()]
+    return df.dropna().rename(columns={"entity": "location", "year": "population_year"})
+
+
+def get_continents(path: str = CONTINENTS_CSV) -> pd.DataFrame:
+    """OWID continents, with columns `location`, `iso_code` and `continent`."""
+    return _load(path, _parse_continents)
+
+
+def get_income_groups(path: str = WB_INCOME_GROUPS_CSV) -> pd.DataFrame:
+    """Income groups, with columns `location` and `income_group`.
+
+    Defaults to the World Bank classification. Use `INCOME_GROUPS_COMPLEMENT_CSV` for the locations it misses.
+    """
+    return _load(path, _parse_income_groups)
+
+
+def get_eu_countries(path: str = EU_COUNTRIES_CSV) -> list:
+    """Names of the EU member states."""
+    return _load(path, _parse_eu_countries)
+
+
+def _parse_population(path):
+    return pd.read_csv(
+        path, keep_default_na=False, na_values=[""], usecols=["entity", "iso_code", "year", "population"]
+    )
+
+
+def _parse_continents(path):
+    return pd.read_csv(
+        path,
+        keep_default_na=False,
+        na_values=[""],
+        header=0,
+        names=["location", "iso_code", "year", "continent"],
+        usecols=["location", "iso_code", "continent"],
+    )
+
+
+def _parse_income_groups(path):
+    df = pd.read_csv(path, keep_default_na=False, na_values=[""], usecols=["Country", "Income group"])
+    return df.rename(columns={"Country": "location", "Income group": "income_group"})
+
+
+def _parse_eu_countries(path):
+    return pd.read_csv(path, keep_default_na=False, na_values=[""], usecols=["Country"])["Country"].tolist()
+
+
+def _load(path, parser):
+    """Load `path` with `parser`, memoized per process and cached on disk."""
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = (path, parser.__name__)
+    with _lock:
+        if key not in _tables or _tables[key][0] != (stat.st_mtime_ns, stat.st_size):
+            _tables[key] = ((stat.st_mtime_ns, stat.st_size), _load_cached(path, parser, stat))
+        data = _tables[key][1]
+    return data.copy()
+
+
+def _load_cached(path, parser, stat):
+    name = hashlib.sha1(f"{CACHE_VERSION}:{parser.__name__}:{path}".encode()).hexdigest()
+    cache_path = os.path.join(CACHE_DIR, f"{name}.parquet")
+    cached = _read_cache(cache_path)
+    if cached is not None and (cached["mtime"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+        return cached["data"]
+    # Modification time changed: only parse again if the content did
+    content_hash = _hash_file(path)
+    if cached is not None and cached["hash"] == content_hash:
+        data = cached["data"]
+    else:
+        data = parser(path)
+    _write_cache(
+        cache_path, {"mtime": stat.st_mtime_ns, "size": stat.st_size, "hash": content_hash, "data": data}
+    )
+    return data
+
+
+def _hash_file(path):
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+def _read_cache(cache_path):
+    if not os.path.isfile(cache_path):
+        return None
+    try:
+        table = pq.read_table(cache_path)
+        cached = json.loads(table.schema.metadata[_CACHE_METADATA_KEY])
+        df = table.to_pandas()
+    except Exception:
+        return None
+    cached["data"] = df[_LIST_COLUMN].tolist() if cached.pop("is_list") else df
+    return cached
+
+
+def _write_cache(cache_path, cached):
+    data = cached["data"]
+    is_list = isinstance(data, list)
+    df = pd.DataFrame({_LIST_COLUMN: data}) if is_list else data
+    metadata = {k: v for k, v in cached.items() if k != "data"}
+    metadata["is_list"] = is_list
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        table = table.replace_schema_metadata(
+            {**table.schema.metadata, _CACHE_METADATA_KEY: json.dumps(metadata).encode()}
+        )
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        path_tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        pq.write_table(table, path_tmp)
+        os.replace(path_tmp, cache_path)
+    except (OSError, pa.ArrowException):
+        # The cache is an optimization: a read-only or full disk should not break the pipeline
+        pass
@@ -5,12 +5,16 @@ https://github.com/owid/walden/blob/master/owid/walden/owid_cache.py
 import os
 import re
 import json
+import hashlib
 import tempfile
+import threading
 from os import path
 from typing import Optional, Union
 
+from joblib import Parallel, delayed
 import pandas as pd
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 from cowidev.utils.log import get_logger
@@ -18,23 +22,49 @@ from cowidev.utils.log import get_logger
 
 logger = get_logger()
 
+# Files larger than MULTIPART_THRESHOLD are uploaded in parts of MULTIPART_CHUNKSIZE, in parallel threads
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_CHUNKSIZE = 8 * 1024 * 1024
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_THRESHOLD,
+    multipart_chunksize=MULTIPART_CHUNKSIZE,
+    max_concurrency=8,
+)
+
+# Default endpoint, can be changed with the environment variable OWID_COVID_S3_ENDPOINT
+SPACES_ENDPOINT = "https://nyc3.digitaloceanspaces.com"
+
+# Clients are thread-safe and expensive to build, so they are shared by all S3 instances (one per profile/endpoint)
+_clients = {}
+_clients_lock = threading.Lock()
+
 
 class S3:
-    spaces_endpoint = "https://nyc3.digitaloceanspaces.com"
+    def __init__(self, profile_name="default", endpoint_url=None):
+        self.client = self.connect(profile_name, endpoint_url)
 
-    def __init__(self, profile_name="default"):
-        self.client = self.connect(profile_name)
+    def connect(self, profile_name="default", endpoint_url=None):
+        """Return a connection to Walden's DigitalOcean space.
 
-    def connect(self, profile_name="default"):
-        "Return a connection to Walden's DigitalOcean space."
-        self.check_for_default_profile()
+        The client is created once per profile and endpoint, and reused afterwards.
 
-        session = boto3.Session(profile_name=profile_name)
-        client = session.client(
-            service_name="s3",
-            endpoint_url=self.spaces_endpoint,
-        )
-        return client
+        Args:
+            profile_name (str, optional): AWS profile. Use None for boto3's default credentials chain (e.g.
+                                            environment variables). Defaults to "default".
+            endpoint_url (str, optional): S3 endpoint, e.g. a local S3 stand-in. Defaults to the value of the
+                                            environment variable OWID_COVID_S3_ENDPOINT, or `SPACES_ENDPOINT` if unset.
+        """
+        endpoint_url = endpoint_url or os.environ.get("OWID_COVID_S3_ENDPOINT", SPACES_ENDPOINT)
+        with _clients_lock:
+            if (profile_name, endpoint_url) not in _clients:
+                if profile_name is not None:
+                    self.check_for_default_profile()
+                session = boto3.Session(profile_name=profile_name)
+                _clients[(profile_name, endpoint_url)] = session.client(
+                    service_name="s3",
+                    endpoint_url=endpoint_url,
+                )
+        return _clients[(profile_name, endpoint_url)]
 
     def check_for_default_profile(self):
         filename = path.expanduser("~/.aws/config")
@@ -53,6 +83,7 @@ class S3:
         local_path: Union[str, list],
         s3_path: Union[str, list],
         public: bool = False,
+        skip_unchanged: bool = False,
     ) -> Optional[str]:
         """
         Upload file to Walden.
@@ -62,21 +93,67 @@ class S3:
             s3_path (Union[str, list]): File location to load object from. It can be a list of paths, should match
                                         `local_path`'s length.
             public (bool): Set to True to expose the file to the public (read only). Defaults to False.
+            skip_unchanged (bool): Set to True to skip the upload if the remote file has the same content (i.e. its
+                                    ETag matches the local MD5). Defaults to False.
         """
-        print("Uploading to S3…")
         # Checks
         _check_s3_local_files(local_path, s3_path)
+        if isinstance(local_path, list):
+            self.upload_many(local_path, s3_path, public=public, skip_unchanged=skip_unchanged)
+            return None
+        print("Uploading to S3…")
+        self._upload_file(local_path, s3_path, public=public, skip_unchanged=skip_unchanged)
+        return None
+
+    def upload_many(
+        self, local_paths: list, s3_paths: list, public: bool = False, skip_unchanged: bool = False, n_jobs: int = 8
+    ) -> list:
+        """Upload several files concurrently.
+
+        Large files are uploaded using multipart transfers (see `TRANSFER_CONFIG`).
+
+        Args:
+            local_paths (list): Local paths to files.
+            s3_paths (list): S3 destinations, in the same order as `local_paths`.
+            public (bool, optional): Set to True to expose the files to the public (read only). Defaults to False.
+            skip_unchanged (bool, optional): Set to True to skip files whose remote ETag matches the local MD5.
+                                                Defaults to False.
+            n_jobs (int, optional): Number of files uploaded at the same time. Defaults to 8.
+
+        Returns:
+            list: For each file, True if it was uploaded, False if it was skipped.
+        """
+        _check_s3_local_files(local_paths, s3_paths)
+        print(f"Uploading {len(local_paths)} files to S3…")
+        return Parallel(n_jobs=n_jobs, backend="threading")(
+            delayed(self._upload_file)(local_path, s3_path, public, skip_unchanged)
+            for local_path, s3_path in zip(local_paths, s3_paths)
+        )
+
+    def _upload_file(self, local_path: str, s3_path: str, public: bool, skip_unchanged: bool) -> bool:
         # Obtain bucket & file
-        bucket_name, s3_file = _url_to_path_and_bucket_mult(s3_path)
+        bucket_name, s3_file = _url_to_path_and_bucket(s3_path)
+        if skip_unchanged and self._etag(bucket_name, s3_file) == _local_etag(local_path):
+            print(f"Skipping {s3_path} (unchanged)")
+            return False
         # Upload
         extra_args = {"ACL": "public-read"} if public else {}
         try:
-            self.client.upload_file(local_path, bucket_name, s3_file, ExtraArgs=extra_args)
+            self.client.upload_file(local_path, bucket_name, s3_file, ExtraArgs=extra_args, Config=TRANSFER_CONFIG)
         except ClientError as e:
             logger.error(e)
             raise UploadError(e)
+        return True
 
-        return None
+    def _etag(self, bucket_name: str, s3_file: str) -> Optional[str]:
+        # ETag of remote file (None if the file does not exist)
+        try:
+            response = self.client.head_object(Bucket=bucket_name, Key=s3_file)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return response["ETag"].strip('"')
 
     def download_from_s3(self, s3_path: Union[str, list], local_path: Union[str, list]) -> Optional[str]:
         """Download file from S3.
@@ -197,12 +274,29 @@ def _check_s3_local_files(local_file, s3_path):
     if type(local_file) is not type(s3_path):
         raise TypeError("`local_file` and `s3_path` should be of the same type")
     if isinstance(local_file, list):
-        if len(local_file) == len(s3_path):
+        if len(local_file) != len(s3_path):
             raise TypeError("`local_file` and `s3_path` should be of same length")
     elif not isinstance(local_file, str):
         raise TypeError("`local_file` and `s3_path` should be of type str or list")
 
 
+def _local_etag(local_path: str) -> str:
+    """ETag that S3 assigns to `local_path` when uploaded with `TRANSFER_CONFIG`.
+
+    For single-part uploads it is the MD5 of the file. For multipart uploads it is the MD5 of the concatenated part
+    MD5s, followed by the number of parts.
+    """
+    md5 = hashlib.md5()
+    digests = []
+    with open(local_path, "rb") as f:
+        for chunk in iter(lambda: f.read(MULTIPART_CHUNKSIZE), b""):
+            md5.update(chunk)
+            digests.append(hashlib.md5(chunk).digest())
+    if os.path.getsize(local_path) < MULTIPART_THRESHOLD:
+        return md5.hexdigest()
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
 def obj_to_s3(data: dict, s3_path: str = None, public: bool = False, **kwargs) -> Optional[str]:
     s3 = S3()
     s3.obj_to_s3(data, s3_path, public, **kwargs)
@@ -0,0 +1,158 @@
+"""Supervised execution of scraping modules.
+
+Each module runs in its own worker process with a wall-clock budget. Workers still running once the budget is spent
+are killed, together with any process they started (e.g. a Selenium driver). The outcome of a module (success, error
+message and traceback) is sent back to the parent through a pipe, so that a crash or a hang in a module can not take
+down or stall the rest of the step.
+
+Failed modules are retried with exponential backoff while the other modules keep running (see `run_supervised`).
+"""
+import heapq
+import importlib
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import psutil
+
+
+# Default maximum execution time of a module, in seconds
+MODULE_TIMEOUT = 15 * 60
+# Default maximum number of retries of a failed module
+MODULE_RETRIES = 2
+# Grace period for a worker to exit once its result has been received, in seconds
+_JOIN_TIMEOUT = 10
+
+
+def _worker(module_name, args, conn):
+    try:
+        module = importlib.import_module(module_name)
+        module.main(*args)
+    except BaseException as err:
+        conn.send({"success": False, "error": repr(err), "traceback": traceback.format_exc()})
+    else:
+        conn.send({"success": True, "error": None, "traceback": None})
+    finally:
+        conn.close()
+
+
+def _kill_process_tree(pid: int):
+    try:
+        parent = psutil.Process(pid)
+    except psutil.NoSuchProcess:
+        return
+    processes = parent.children(recursive=True) + [parent]
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.NoSuchProcess:
+            pass
+    psutil.wait_procs(processes, timeout=_JOIN_TIMEOUT)
+
+
+def run_module_in_process(module_name: str, timeout: float, args: list = []) -> dict:
+    """Run `module_name.main(*args)` in a new process, killing it if it takes longer than `timeout` seconds.
+
+    Workers are started with the "spawn" method, so that they do not inherit locks held by other threads of the
+    parent (e.g. HTTP connection pools).
+
+    Args:
+        module_name (str): Name of the module, e.g. "cowidev.vax.batch.australia".
+        timeout (float): Maximum execution time, in seconds.
+        args (list, optional): Arguments passed to `main`. Defaults to [].
+
+    Returns:
+        dict: Keys `success`, `timed_out`, `error` (message, None if success), `traceback` (None if success or
+                time out) and `time` (seconds).
+    """
+    t0 = time.time()
+    ctx = multiprocessing.get_context("spawn")
+    conn_recv, conn_send = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_worker, args=(module_name, args, conn_send), daemon=True)
+    process.start()
+    conn_send.close()
+    timed_out = True
+    try:
+        if conn_recv.poll(timeout):
+            timed_out = False
+            try:
+                result = {**conn_recv.recv(), "timed_out": False}
+            except EOFError:
+                # Worker died without reporting (e.g. killed by the OS)
+                process.join(_JOIN_TIMEOUT)
+                result = {
+                    "success": False,
+                    "timed_out": False,
+                    "error": f"Worker exited unexpectedly (exit code {process.exitcode})",
+                    "traceback": None,
+                }
+        else:
+            result = {
+                "success": False,
+                "timed_out": True,
+                "error": f"Timed out after {timeout} seconds",
+                "traceback": None,
+            }
+    finally:
+        conn_recv.close()
+        if not timed_out:
+            process.join(_JOIN_TIMEOUT)
+        if process.is_alive():
+            _kill_process_tree(process.pid)
+            process.join()
+    result["time"] = round(time.time() - t0, 2)
+    return result
+
+
+def run_supervised(
+    run,
+    modules_name: list,
+    max_workers: int = 1,
+    retries: int = 2,
+    backoff: float = 30,
+) -> list:
+    """Run modules concurrently, retrying failed ones with exponential backoff.
+
+    A module failing on attempt `n` is scheduled again `backoff * 2**(n-1)` seconds later, up to `retries` times.
+    Retries do not hold a worker while waiting, so other modules keep running in the meantime.
+
+    Args:
+        run (callable): Function running a module, given its name. Must return a dictionary with, at least, the
+                        key `success` (False if the module failed, True or None otherwise).
+        modules_name (list): Modules to run.
+        max_workers (int, optional): Maximum number of modules running at the same time. Defaults to 1.
+        retries (int, optional): Maximum number of retries per module. Defaults to 2.
+        backoff (float, optional): Waiting time before the first retry, in seconds. Defaults to 30.
+
+    Returns:
+        list: Result of the last attempt of each module (with the number of attempts under `attempts`), in the
+                order of `modules_name`.
+    """
+    max_workers = max(max_workers, 1)
+    results = {}
+    pending = [(0, i, module_name, 1) for i, module_name in enumerate(modules_name)]
+    heapq.heapify(pending)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while pending or running:
+            # Submit modules that are due
+            now = time.monotonic()
+            while pending and pending[0][0] <= now and len(running) < max_workers:
+                _, i, module_name, attempt = heapq.heappop(pending)
+                running[executor.submit(run, module_name)] = (i, module_name, attempt)
+            # Wait for a module to finish (or for the next retry to be due)
+            wait_time = max(pending[0][0] - now, 0) if pending and len(running) < max_workers else None
+            if not running:
+                time.sleep(wait_time)
+                continue
+            done, _ = wait(running, timeout=wait_time, return_when=FIRST_COMPLETED)
+            for future in done:
+                i, module_name, attempt = running.pop(future)
+                result = {**future.result(), "attempts": attempt}
+                if result["success"] is False and attempt <= retries:
+                    delay = backoff * 2 ** (attempt - 1)
+                    heapq.heappush(pending, (time.monotonic() + delay, i, module_name, attempt + 1))
+                else:
+                    results[i] = result
+    return [results[i] for i in range(len(modules_name))]
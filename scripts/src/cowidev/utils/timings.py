@@ -0,0 +1,144 @@
+"""Execution timings of scraping modules, and scheduling based on them.
+
+Timings are kept in a local SQLite file (one row per module, date and machine), so that ordering modules at the
+start of a run and logging their timings at the end does not require downloading and re-uploading the whole log.
+"""
+import heapq
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS executions (
+    module TEXT NOT NULL,
+    date TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    time REAL,
+    success INTEGER,
+    PRIMARY KEY (module, date, machine)
+);
+CREATE TABLE IF NOT EXISTS runs (
+    date TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    t_sec REAL,
+    t_sec_retry REAL,
+    PRIMARY KEY (date, machine)
+);
+"""
+
+
+class TimingStore:
+    """Local store of module execution timings.
+
+    Args:
+        path (str): Path to the SQLite file. It is created (with its parent directory) if it does not exist.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.path))
+
+    def _write(self, query: str, rows: list):
+        with self._connect() as conn:
+            with conn:
+                conn.executemany(query, rows)
+
+    def _read(self, query: str, params: tuple = ()) -> pd.DataFrame:
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn, params=params)
+
+    def is_empty(self) -> bool:
+        return self._read("SELECT COUNT(*) AS n FROM executions").n.iloc[0] == 0
+
+    def record_executions(self, df: pd.DataFrame, date: str, machine: str):
+        """Add module timings, replacing those of the same modules in the same date and machine.
+
+        Args:
+            df (pd.DataFrame): Columns `module`, `execution_time (sec)` and `success`. Modules without time (i.e.
+                                skipped) are ignored.
+            date (str): Date of the run (YYYY-MM-DD).
+            machine (str): Machine ID.
+        """
+        df = df.dropna(subset=["execution_time (sec)"])
+        rows = [
+            (module, date, machine, float(t), None if pd.isnull(success) else int(success))
+            for module, t, success in zip(df["module"], df["execution_time (sec)"], df["success"])
+        ]
+        self._write("INSERT OR REPLACE INTO executions VALUES (?, ?, ?, ?, ?)", rows)
+
+    def import_executions(self, df: pd.DataFrame):
+        """Add module timings from a log with columns `module`, `execution_time (sec)`, `success`, `date` and
+        `machine` (e.g. the log in S3)."""
+        for (date, machine), df_ in df.groupby(["date", "machine"]):
+            self.record_executions(df_, date, machine)
+
+    def record_run(self, date: str, machine: str, t_sec: float, t_sec_retry: float):
+        """Add the overall timing of a run (before and after retrying failed modules)."""
+        self._write("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?)", [(date, machine, t_sec, t_sec_retry)])
+
+    def executions(self) -> pd.DataFrame:
+        """Module timings, in the format of the S3 log."""
+        df = self._read("SELECT module, time, success, date, machine FROM executions ORDER BY date, module")
+        df["success"] = df["success"].map({1: True, 0: False})
+        return df.rename(columns={"time": "execution_time (sec)"})
+
+    def runs(self) -> pd.DataFrame:
+        """Overall timings of runs, in the format of the S3 log."""
+        return self._read("SELECT machine, date, t_sec, t_sec_retry FROM runs ORDER BY date")
+
+    def estimates(self, modules: list = None, percentile: float = 0.9, window: int = 10) -> dict:
+        """Estimated execution time of each module.
+
+        Args:
+            modules (list, optional): Modules to estimate. Defaults to all modules in the store.
+            percentile (float, optional): Percentile of the execution times used as estimate. Defaults to 0.9.
+            window (int, optional): Number of most recent executions considered per module. Defaults to 10.
+
+        Returns:
+            dict: Module -> estimated execution time (seconds). Modules without executions are not included.
+        """
+        df = self._read(
+            """
+            SELECT module, time FROM (
+                SELECT module, time, ROW_NUMBER() OVER (PARTITION BY module ORDER BY date DESC) AS n
+                FROM executions
+            )
+            WHERE n <= ?
+            """,
+            (window,),
+        )
+        if modules is not None:
+            df = df[df.module.isin(modules)]
+        return df.groupby("module").time.quantile(percentile).to_dict()
+
+
+def schedule_lpt(modules: list, estimates: dict, n_workers: int = 1):
+    """Order modules longest-processing-time first.
+
+    Workers pulling modules in this order from a shared queue finish within 4/3 of the optimal makespan. Modules
+    without estimate are assumed to be as long as the longest one, so that they start early.
+
+    Args:
+        modules (list): Modules to schedule.
+        estimates (dict): Module -> estimated execution time (seconds).
+        n_workers (int, optional): Number of modules running at the same time. Defaults to 1.
+
+    Returns:
+        list: Modules, in execution order.
+        float: Expected makespan (seconds).
+    """
+    default = max(estimates.values(), default=0)
+    durations = {module: estimates.get(module, default) for module in modules}
+    modules = sorted(modules, key=lambda module: -durations[module])
+    loads = [0.0] * max(min(n_workers, len(modules)), 1)
+    for module in modules:
+        heapq.heappush(loads, heapq.heappop(loads) + durations[module])
+    return modules, max(loads)
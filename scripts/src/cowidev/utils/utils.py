@@ -7,6 +7,7 @@ import pytz
 import tempfile
 
 from xlsx2csv import Xlsx2csv
+import numpy as np
 import pandas as pd
 
 from cowidev.utils.web.download import download_file_from_url
@@ -50,6 +51,55 @@ def series_monotonic(ds):
     return ds[(diff >= 0) | (diff.isna())]
 
 
+def latest_by_group(
+    df: pd.DataFrame, keys, window: timedelta = None, column_date: str = "date", ffill: bool = True
+) -> pd.DataFrame:
+    """Get the latest observation of each group.
+
+    Rows are sorted by date within each group. If `ffill` is True, each group is forward-filled before taking its last
+    row, so that every column has the last value known for the group.
+
+    Args:
+        df (pd.DataFrame): Input data.
+        keys (str or list): Column(s) defining the groups (e.g. location). Rows with missing keys are dropped.
+        window (timedelta, optional): If given, only rows dated within `window` of today are considered. Defaults to
+                                        None.
+        column_date (str, optional): Name of the date column. Defaults to "date".
+        ffill (bool, optional): Set to True to forward-fill values within each group. Defaults to True.
+
+    Returns:
+        pd.DataFrame: One row per group, sorted by `keys`.
+    """
+    keys = [keys] if isinstance(keys, str) else list(keys)
+    if window is not None:
+        cutoff = (datetime.today() - window).date()
+        if pd.api.types.is_datetime64_any_dtype(df[column_date]):
+            cutoff = pd.Timestamp(cutoff)
+        else:
+            cutoff = str(cutoff)
+        df = df[df[column_date] >= cutoff]
+    df = df.dropna(subset=keys).sort_values(keys + [column_date], kind="stable")
+    if ffill:
+        value_columns = [col for col in df.columns if col not in keys]
+        df[value_columns] = df.groupby(keys, sort=False)[value_columns].ffill()
+    return df.drop_duplicates(subset=keys, keep="last").reset_index(drop=True)
+
+
+def pct_change_to_doubling_days(pct_change, periods: int):
+    """Doubling time (in days) of a metric that grew by `pct_change` (as a ratio) over `periods` days.
+
+    Vectorized: `pct_change` can be a scalar, an array or a pd.Series (a pd.Series is returned in that case, with the
+    same index). Values are rounded to 2 decimals, and null or zero changes give NaN.
+    """
+    if isinstance(pct_change, pd.Series):
+        doubling_days = pct_change_to_doubling_days(pct_change.to_numpy(dtype=float, na_value=np.nan), periods)
+        return pd.Series(doubling_days, index=pct_change.index, name=pct_change.name)
+    pct_change = np.asarray(pct_change, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        doubling_days = np.round(periods * np.log(2) / np.log(1 + pct_change), decimals=2)
+    return np.where(np.isnan(pct_change) | (pct_change == 0), np.nan, doubling_days)
+
+
 def get_project_dir(err: bool = False):
     load_dotenv()
     project_dir = os.environ.get("OWID_COVID_PROJECT_DIR")
@@ -0,0 +1,80 @@
+"""Async variants of the `cowidev.utils.web` helpers.
+
+Requests still go through the shared HTTP layer (connection pools, optional cache and throttling, see
+`cowidev.utils.web.session`), but each call runs in its own thread, so that a coroutine can keep many requests in
+flight at once. How many of them reach a given host at the same time is capped by the session throttle.
+
+Example:
+
+```
+soups = await asyncio.gather(*[get_soup_async(url) for url in urls])
+```
+"""
+import asyncio
+import threading
+from functools import partial
+
+from cowidev.utils.web.download import read_csv_from_url, read_xlsx_from_url
+from cowidev.utils.web.scraping import get_response, get_soup, request_json, request_text
+
+
+async def run_in_thread(func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` in a new daemon thread and await its result.
+
+    Unlike the default executor, daemon threads do not keep the interpreter alive: if the awaiting task is cancelled
+    (e.g. on timeout), a call that hangs does not block the exit of the process.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def _set_result(result, error):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _target():
+        try:
+            result, error = func(*args, **kwargs), None
+        except BaseException as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(_set_result, result, error)
+        except RuntimeError:
+            # Event loop already closed (the caller gave up on this call)
+            pass
+
+    threading.Thread(target=_target, daemon=True).start()
+    return await future
+
+
+async def get_response_async(source: str, request_method: str = "get", **kwargs):
+    """Async version of `get_response`."""
+    return await run_in_thread(partial(get_response, source, request_method, **kwargs))
+
+
+async def get_soup_async(source: str, **kwargs):
+    """Async version of `get_soup`."""
+    return await run_in_thread(partial(get_soup, source, **kwargs))
+
+
+async def request_json_async(url: str, mode: str = "soup", **kwargs) -> dict:
+    """Async version of `request_json`."""
+    return await run_in_thread(partial(request_json, url, mode, **kwargs))
+
+
+async def request_text_async(url: str, mode: str = "soup", **kwargs) -> str:
+    """Async version of `request_text`."""
+    return await run_in_thread(partial(request_text, url, mode, **kwargs))
+
+
+async def read_csv_from_url_async(url: str, **kwargs):
+    """Async version of `read_csv_from_url`."""
+    return await run_in_thread(partial(read_csv_from_url, url, **kwargs))
+
+
+async def read_xlsx_from_url_async(url: str, **kwargs):
+    """Async version of `read_xlsx_from_url`."""
+    return await run_in_thread(partial(read_xlsx_from_url, url, **kwargs))
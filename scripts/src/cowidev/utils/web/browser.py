@@ -0,0 +1,197 @@
+"""Pool of warm browsers shared by the scrapers running in a process.
+
+Launching a browser takes a few seconds and a few hundred MB of memory, and with modules running in parallel (see
+`cowidev.vax.cmd.get_data`) many of them would otherwise start at the same time. Instead, `get_driver` leases one of
+at most `POOL_SIZE` headless Chrome browsers: browsers are launched on first use and kept open for later leases, and
+modules wait for a free browser when all of them are in use.
+
+Between leases, a browser is reset: extra windows are closed, cookies and the HTTP cache are cleared, so is the storage
+(local storage, session storage, IndexedDB, etc.) of the sites open at the end of the lease, the window goes back to
+its initial size, downloads go back to the default folder and timeouts are restored. Storage of other sites visited
+during the lease is kept. Browsers that raised a WebDriver error during a lease, or that have been leased `MAX_USES`
+times, are closed and replaced.
+
+Leases wait at most `LEASE_TIMEOUT` seconds for a free browser (e.g. if modules that timed out still hold theirs).
+
+The pool size defaults to 2, and can be changed with the environment variable `OWID_COVID_BROWSER_POOL` (0 disables
+the pool, i.e. each driver is a new browser).
+"""
+import os
+import threading
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import WebDriverException
+
+
+POOL_SIZE = int(os.environ.get("OWID_COVID_BROWSER_POOL", 2))
+MAX_USES = 20  # Leases before a browser is replaced
+LEASE_TIMEOUT = 5 * 60  # Maximum waiting time for a free browser, in seconds
+
+
+def send_command(driver, cmd: str, params: dict = None):
+    """Send a Chrome DevTools Protocol command to a Chrome driver."""
+    driver.command_executor._commands["send_command"] = (
+        "POST",
+        "/session/$sessionId/chromium/send_command",
+    )
+    return driver.execute("send_command", {"cmd": cmd, "params": params or {}})
+
+
+class PooledDriver:
+    """Driver leased from a `BrowserPool`.
+
+    Behaves like the underlying WebDriver, but closing it (`quit()` or the end of a `with` block) returns the browser
+    to the pool.
+    """
+
+    def __init__(self, pool, driver):
+        self._pool = pool
+        self._driver = driver
+        self._failed = False
+
+    def __getattr__(self, name):
+        if self._driver is None:
+            raise AttributeError(f"Driver already returned to the pool (accessing `{name}`)")
+        return getattr(self._driver, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None and issubclass(exc_type, WebDriverException):
+            self._failed = True
+        self.quit()
+
+    def quit(self):
+        if self._driver is not None:
+            driver, self._driver = self._driver, None
+            self._pool.release(driver, discard=self._failed)
+
+
+class BrowserPool:
+    """Bounded pool of browsers.
+
+    Args:
+        launch (callable): Function launching a new browser (returns a WebDriver).
+        size (int): Maximum number of browsers (i.e. leases at the same time).
+        max_uses (int, optional): Leases before a browser is replaced. Defaults to MAX_USES.
+    """
+
+    def __init__(self, launch, size: int, max_uses: int = MAX_USES):
+        self._launch = launch
+        self.size = size
+        self.max_uses = max_uses
+        self._slots = threading.BoundedSemaphore(max(size, 1))
+        self._lock = threading.Lock()
+        self._idle = []
+        self._uses = {}
+        self._window_sizes = {}
+        self._closed = False
+
+    def lease(self, download_folder: str = None, timeout: float = LEASE_TIMEOUT) -> PooledDriver:
+        """Lease a browser, waiting for one to be free if needed.
+
+        Args:
+            download_folder (str, optional): Folder where files downloaded during the lease are saved. Defaults to
+                                                None (default folder).
+            timeout (float, optional): Maximum waiting time for a free browser, in seconds. Defaults to
+                                        LEASE_TIMEOUT.
+
+        Raises:
+            TimeoutError: If no browser is free after `timeout` seconds.
+
+        Returns:
+            PooledDriver: Driver, to be closed with `quit()` (or used in a `with` block).
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No browser available after {timeout} seconds (pool size: {self.size})")
+        driver = None
+        try:
+            with self._lock:
+                if self._idle:
+                    driver = self._idle.pop()
+            if driver is None:
+                driver = self._launch()
+                size = driver.get_window_size()
+                with self._lock:
+                    self._window_sizes[id(driver)] = (size["width"], size["height"])
+            if download_folder:
+                send_command(
+                    driver,
+                    "Page.setDownloadBehavior",
+                    {"behavior": "allow", "downloadPath": download_folder},
+                )
+        except BaseException:
+            if driver is not None:
+                self._quit(driver)
+            self._slots.release()
+            raise
+        return PooledDriver(self, driver)
+
+    def release(self, driver, discard: bool = False):
+        """Return a leased browser to the pool (closing it if `discard`, or if it has been used too much)."""
+        try:
+            with self._lock:
+                uses = self._uses.get(id(driver), 0) + 1
+                self._uses[id(driver)] = uses
+            if discard or self._closed or uses >= self.max_uses:
+                self._quit(driver)
+                return
+            try:
+                self._reset(driver)
+            except WebDriverException:
+                self._quit(driver)
+                return
+            with self._lock:
+                self._idle.append(driver)
+        finally:
+            self._slots.release()
+
+    def _reset(self, driver):
+        handles = driver.window_handles
+        origins = set()
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            origins.add(_origin(driver.current_url))
+            driver.close()
+        driver.switch_to.window(handles[0])
+        origins.add(_origin(driver.current_url))
+        driver.execute_script("try { window.sessionStorage.clear(); } catch (e) {}")
+        driver.get("about:blank")
+        for origin in origins - {None}:
+            send_command(driver, "Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        send_command(driver, "Network.clearBrowserCache")
+        send_command(driver, "Network.clearBrowserCookies")
+        with self._lock:
+            window_size = self._window_sizes.get(id(driver))
+        if window_size is not None:
+            driver.set_window_size(*window_size)
+        send_command(driver, "Page.setDownloadBehavior", {"behavior": "default"})
+        driver.implicitly_wait(0)
+        driver.set_page_load_timeout(300)
+        driver.set_script_timeout(30)
+
+    def _quit(self, driver):
+        with self._lock:
+            self._uses.pop(id(driver), None)
+            self._window_sizes.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close idle browsers. Browsers leased at the moment are closed when returned."""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for driver in idle:
+            self._quit(driver)
+
+
+def _origin(url: str):
+    # Origin of a web page (None for pages without one, e.g. about:blank)
+    url = urlparse(url)
+    if url.scheme not in ("http", "https"):
+        return None
+    return f"{url.scheme}://{url.netloc}"
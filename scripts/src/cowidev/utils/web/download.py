@@ -3,15 +3,16 @@ from urllib.parse import urlparse
 import pandas as pd
 
 import requests
-from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.ssl_ import create_urllib3_context
 
+from cowidev.utils.web.session import ThrottledHTTPAdapter, cached_get
+
 
 CIPHERS = "HIGH:!DH:!aNULL:DEFAULT@SECLEVEL=1"
 
 
 def read_xlsx_from_url(
-    url: str, timeout=30, as_series: bool = False, verify=True, drop=False, ciphers_low=False, **kwargs
+    url: str, timeout=30, as_series: bool = False, verify=True, drop=False, ciphers_low=False, cache=False, **kwargs
 ) -> pd.DataFrame:
     """Download and load xls file from URL.
 
@@ -19,13 +20,14 @@ def read_xlsx_from_url(
         url (str): File url.
         as_series (bol): Set to True to return a pandas.Series object. Source file must be of shape 1xN (1 row, N
                             columns). Defaults to False.
+        cache (bool, optional): Set to True to use the HTTP cache (see `download_file_from_url`). Defaults to False.
         kwargs: Arguments for pandas.read_excel.
 
     Returns:
         pandas.DataFrame: Data loaded.
     """
     with tempfile.NamedTemporaryFile() as tmp:
-        download_file_from_url(url, tmp.name, timeout=timeout, verify=verify, ciphers_low=ciphers_low)
+        download_file_from_url(url, tmp.name, timeout=timeout, verify=verify, ciphers_low=ciphers_low, cache=cache)
         df = pd.read_excel(tmp.name, **kwargs)
     if as_series:
         return df.T.squeeze()
@@ -34,28 +36,49 @@ def read_xlsx_from_url(
     return df
 
 
-def read_csv_from_url(url, timeout=30, verify=True, ciphers_low=False, **kwargs):
+def read_csv_from_url(url, timeout=30, verify=True, ciphers_low=False, cache=False, **kwargs):
     with tempfile.NamedTemporaryFile(mode="w+", delete=False) as tmp:
-        download_file_from_url(url, tmp.name, timeout=timeout, verify=verify, ciphers_low=ciphers_low)
+        download_file_from_url(url, tmp.name, timeout=timeout, verify=verify, ciphers_low=ciphers_low, cache=cache)
         df = pd.read_csv(tmp.name, **kwargs)
     # df = df.dropna(how="all")
     return df
 
 
-def download_file_from_url(url, save_path, chunk_size=1024 * 1024, timeout=30, verify=True, ciphers_low=False):
+def download_file_from_url(
+    url, save_path, chunk_size=1024 * 1024, timeout=30, verify=True, ciphers_low=False, cache=False
+):
+    """Download file from URL.
+
+    Uses the shared connection pools (see `cowidev.utils.web.session`), unless `ciphers_low` is True.
+
+    Args:
+        url (str): File url.
+        save_path (str): Local path where file is saved.
+        cache (bool, optional): Set to True to use the HTTP cache (ignored if `ciphers_low`). Defaults to False.
+
+    Raises:
+        ValueError: If the response is not OK (nothing is written to `save_path`).
+    """
     if ciphers_low:
         base_url = get_base_url(url)
         s = requests.Session()
         s.mount(base_url, DESAdapter())
         r = s.get(url)
+        _check_response(r, url)
+        with open(save_path, "wb") as fd:
+            for chunk in r.iter_content(chunk_size=chunk_size):
+                fd.write(chunk)
     else:
-        r = requests.get(url, stream=True, timeout=timeout, verify=verify)
-    with open(save_path, "wb") as fd:
-        for chunk in r.iter_content(chunk_size=chunk_size):
-            fd.write(chunk)
+        r = cached_get(url, save_path=save_path, cache=cache, chunk_size=chunk_size, timeout=timeout, verify=verify)
+        _check_response(r, url)
+
+
+def _check_response(response, url):
+    if not response.ok:
+        raise ValueError(f"Source {url} not reached! Error code {response.status_code} {response.reason}")
 
 
-class DESAdapter(HTTPAdapter):
+class DESAdapter(ThrottledHTTPAdapter):
     """
     A TransportAdapter that re-enables 3DES support in Requests.
 
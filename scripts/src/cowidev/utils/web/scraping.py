@@ -1,12 +1,15 @@
 import json
+import atexit
 from urllib.error import URLError
 
 from bs4 import BeautifulSoup
-import requests
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options as ChroOpt
 from selenium.webdriver.firefox.options import Options as FireOpt
 
+from cowidev.utils.web.browser import POOL_SIZE, BrowserPool, send_command
+from cowidev.utils.web.session import cached_get, get_session
+
 
 def get_headers() -> dict:
     """Get generic header for requests.
@@ -28,16 +31,21 @@ def get_headers() -> dict:
 def get_response(
     source: str,
     request_method: str = "get",
+    cache: bool = False,
     **kwargs,
 ):
+    """Get response from `source`, using the shared HTTP session.
+
+    Set `cache` to True for GET responses to go through the HTTP cache (see `cowidev.utils.web.session`).
+    """
     kwargs["headers"] = kwargs.get("headers", get_headers())
     kwargs["verify"] = kwargs.get("verify", True)
     kwargs["timeout"] = kwargs.get("timeout", 20)
     try:
         if request_method == "get":
-            response = requests.get(source, **kwargs)
+            response = cached_get(source, cache=cache, **kwargs)
         elif request_method == "post":
-            response = requests.post(source, **kwargs)
+            response = get_session().post(source, **kwargs)
         else:
             raise ValueError(f"Invalid value for `request_method`: {request_method}. Use 'get' or 'post'")
     except Exception as err:
@@ -141,7 +149,19 @@ def sel_options(headless: bool = True, firefox: bool = False):
     return op
 
 
+BROWSER_POOL = BrowserPool(lambda: webdriver.Chrome(options=sel_options()), size=POOL_SIZE)
+atexit.register(BROWSER_POOL.close)
+
+
 def get_driver(headless: bool = True, download_folder: str = None, options=None, firefox: bool = False):
+    """Get a Selenium WebDriver.
+
+    Headless Chrome drivers with default options are leased from the shared browser pool (see
+    `cowidev.utils.web.browser`). Use the driver in a `with` block (or call `quit()`), so that the browser is returned
+    to the pool.
+    """
+    if options is None and headless and not firefox and POOL_SIZE > 0:
+        return BROWSER_POOL.lease(download_folder)
     if options is None:
         options = sel_options(headless=headless, firefox=firefox)
     if firefox:
@@ -158,15 +178,7 @@ def set_download_settings(driver, folder_name: str = None, firefox: bool = False
         raise NotImplementedError("Download capabilities only supported for Chromedriver!")
     if folder_name is None:
         folder_name = "/tmp"
-    driver.command_executor._commands["send_command"] = (
-        "POST",
-        "/session/$sessionId/chromium/send_command",
-    )
-    params = {
-        "cmd": "Page.setDownloadBehavior",
-        "params": {"behavior": "allow", "downloadPath": folder_name},
-    }
-    _ = driver.execute("send_command", params)
+    _ = send_command(driver, "Page.setDownloadBehavior", {"behavior": "allow", "downloadPath": folder_name})
 
 
 def scroll_till_element(driver, element):
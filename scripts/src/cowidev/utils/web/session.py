@@ -0,0 +1,341 @@
+"""Shared HTTP layer used by `cowidev.utils.web`.
+
+- Connection pools per host (shared by all sessions in the process) and retries with backoff. Each session has its
+  own cookies (see `get_session`), so cookies set while scraping one source are not sent by other modules.
+- Optional on-disk HTTP cache, enabled per call site (`cached_get(..., cache=True)`): responses are stored with their
+  `ETag`/`Last-Modified` validators, which are sent back on the next request (conditional GET), so that unchanged
+  content is not downloaded again. Entries are keyed on the full request (URL, parameters, headers, cookies,
+  authentication and body). The cache holds at most `CACHE_MAX_SIZE` bytes, least recently used entries are evicted
+  first.
+- Same-run deduplication: cached requests for an entry that is being downloaded (e.g. by another module running in
+  parallel) wait for that download and share it.
+- Throttling: at most `HOST_CONCURRENCY` requests in flight per host, and at most `RATE_LIMIT` requests started per
+  second overall, however many modules run at the same time.
+
+The cache directory defaults to `scripts/tmp/http-cache`, and can be changed with the environment variable
+`OWID_COVID_HTTP_CACHE` (its size limit, in bytes, with `OWID_COVID_HTTP_CACHE_SIZE`). Throttling limits can be changed
+with `OWID_COVID_HTTP_HOST_CONCURRENCY` and `OWID_COVID_HTTP_RATE_LIMIT` (0 disables the rate limit).
+"""
+import os
+import json
+import time
+import hashlib
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.exceptions import MaxRetryError
+from urllib3.util.retry import Retry
+
+from cowidev.utils import paths
+
+
+CACHE_DIR = os.environ.get("OWID_COVID_HTTP_CACHE", os.path.join(paths.SCRIPTS.TMP, "http-cache"))
+CACHE_MAX_SIZE = int(os.environ.get("OWID_COVID_HTTP_CACHE_SIZE", 2 * 1024**3))  # Bytes
+RETRY = Retry(
+    total=3,
+    backoff_factor=1,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(["HEAD", "GET"]),
+    raise_on_status=False,
+)
+POOL_CONNECTIONS = 128  # Number of hosts with a connection pool
+POOL_MAXSIZE = 16  # Connections per host
+HOST_CONCURRENCY = int(os.environ.get("OWID_COVID_HTTP_HOST_CONCURRENCY", 4))
+RATE_LIMIT = float(os.environ.get("OWID_COVID_HTTP_RATE_LIMIT", 50))  # Requests per second
+# Bodies are stored decoded, so Content-Encoding is not kept
+CACHED_HEADERS = ["Content-Type", "Content-Disposition", "ETag", "Last-Modified"]
+
+_adapter = None
+_global_lock = threading.Lock()
+_prune_lock = threading.Lock()
+_key_locks = {}
+_fetched = {}  # Cache key -> time its last download finished (time.monotonic)
+# Request arguments that change what is sent (see `_cache_key`)
+REQUEST_KWARGS = ["params", "headers", "cookies", "auth", "data", "json"]
+
+
+class RequestThrottle:
+    """Limit the number of concurrent requests per host and the overall request rate (thread-safe).
+
+    Args:
+        host_concurrency (int): Maximum number of requests in flight per host.
+        rate_limit (float): Maximum number of requests started per second. Use 0 for no limit.
+    """
+
+    def __init__(self, host_concurrency: int = HOST_CONCURRENCY, rate_limit: float = RATE_LIMIT):
+        self.host_concurrency = host_concurrency
+        self.rate_limit = rate_limit
+        self._semaphores = {}
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+
+    @contextmanager
+    def limit(self, url: str):
+        """Hold a slot for a request to `url` (waits until one is available)."""
+        with self._semaphore(urlparse(url).netloc):
+            self._wait_rate()
+            yield
+
+    def _semaphore(self, host):
+        with self._lock:
+            return self._semaphores.setdefault(host, threading.BoundedSemaphore(self.host_concurrency))
+
+    def _wait_rate(self):
+        # Requests are spaced by 1/rate_limit seconds
+        if not self.rate_limit:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + 1 / self.rate_limit
+        if start > now:
+            time.sleep(start - now)
+
+
+THROTTLE = RequestThrottle()
+
+
+class ThrottledHTTPAdapter(HTTPAdapter):
+    """HTTP adapter whose requests go through `THROTTLE`.
+
+    Retries are done here rather than by urllib3, so that the throttle slot is released while waiting for the next
+    attempt (urllib3 sleeps within `send`).
+
+    Args:
+        retry (Retry, optional): Retry policy. Failed connections and reads are retried for the methods allowed by the
+                                    policy. Defaults to None (no retries).
+        args, kwargs: Arguments for `HTTPAdapter` (except `max_retries`).
+    """
+
+    def __init__(self, *args, retry: Retry = None, **kwargs):
+        self.retry = retry
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        retry = self.retry
+        while True:
+            response = error = None
+            with THROTTLE.limit(request.url):
+                try:
+                    response = super().send(request, *args, **kwargs)
+                except (requests.ConnectionError, requests.Timeout) as err:
+                    error = err
+            if retry is None:
+                if error is not None:
+                    raise error
+                return response
+            if error is not None:
+                if not retry._is_method_retryable(request.method):
+                    raise error
+            elif not retry.is_retry(request.method, response.status_code, "Retry-After" in response.headers):
+                return response
+            try:
+                retry = retry.increment(
+                    method=request.method, url=request.url, response=None if response is None else response.raw
+                )
+            except MaxRetryError:
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                response.close()
+            retry.sleep(None if response is None else response.raw)
+
+
+def get_session() -> requests.Session:
+    """Get a new session using the shared connection pools.
+
+    Sessions do not share cookies: use one session per module (or per call).
+    """
+    session = requests.Session()
+    adapter = _get_adapter()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _get_adapter():
+    global _adapter
+    with _global_lock:
+        if _adapter is None:
+            _adapter = ThrottledHTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, retry=RETRY)
+    return _adapter
+
+
+def cached_get(
+    url: str,
+    save_path: str = None,
+    cache: bool = False,
+    chunk_size: int = 1024 * 1024,
+    session: requests.Session = None,
+    **kwargs,
+):
+    """GET `url` using the shared connection pools and, optionally, the HTTP cache.
+
+    Args:
+        url (str): URL.
+        save_path (str, optional): If given, the body of a successful response is also written to this file. Defaults
+                                    to None.
+        cache (bool, optional): Set to True to use the HTTP cache. Defaults to False.
+        chunk_size (int, optional): Chunk size used when streaming the body to disk. Defaults to 1MB.
+        session (requests.Session, optional): Session used (e.g. with the cookies of previous requests). Defaults to
+                                                a new session (see `get_session`).
+        kwargs: Arguments for `requests.Session.get` (e.g. `headers`, `params`, `timeout`, `verify`).
+
+    Returns:
+        requests.Response: Response. If served from the cache, it is rebuilt from the stored body and headers (with
+                            status 200). If `save_path` is given, the body is only written to the file (and not loaded
+                            into the response).
+    """
+    session = session or get_session()
+    stream = kwargs.pop("stream", False)
+    if not cache:
+        response = session.get(url, stream=stream or save_path is not None, **kwargs)
+        if save_path is not None and response.ok:
+            _write_body(response, save_path, chunk_size)
+        return response
+
+    key = _cache_key(session, url, kwargs)
+    body_path, meta_path = _cache_paths(key)
+    t_request = time.monotonic()
+    with _lock(key):
+        # Downloads finished after this request was made (i.e. while waiting for the lock) are shared
+        if _fetched.get(key, -1) < t_request or not os.path.isfile(meta_path):
+            response = _get_conditional(session, url, body_path, meta_path, chunk_size, **kwargs)
+            if not response.ok:
+                return response
+            _fetched[key] = time.monotonic()
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        # Access time for eviction (see `_prune_cache`)
+        os.utime(body_path)
+        if save_path is not None:
+            _copy_file(body_path, save_path, chunk_size)
+            response = _build_response(meta, None)
+        else:
+            response = _build_response(meta, body_path)
+    _prune_cache()
+    return response
+
+
+def _get_conditional(session, url, body_path, meta_path, chunk_size, **kwargs):
+    # Send validators of the cached response (if any), and store the new response if content changed
+    headers = dict(kwargs.pop("headers", None) or {})
+    if os.path.isfile(meta_path) and os.path.isfile(body_path):
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["headers"].get("ETag"):
+            headers["If-None-Match"] = meta["headers"]["ETag"]
+        if meta["headers"].get("Last-Modified"):
+            headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+    response = session.get(url, headers=headers, stream=True, **kwargs)
+    if response.status_code == 304:
+        response.close()
+        response.status_code = 200
+        return response
+    if response.ok:
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        # Invalidate metadata first, so that validators never point to a different body
+        if os.path.isfile(meta_path):
+            os.remove(meta_path)
+        _write_body(response, body_path, chunk_size)
+        meta = {
+            "url": response.url,
+            "headers": {k: response.headers[k] for k in CACHED_HEADERS if k in response.headers},
+        }
+        _write_atomic(meta_path, json.dumps(meta))
+    return response
+
+
+def _build_response(meta: dict, body_path: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response.reason = "OK"
+    response.url = meta["url"]
+    response.headers = CaseInsensitiveDict(meta["headers"])
+    response.encoding = get_encoding_from_headers(response.headers)
+    if body_path is None:
+        response._content = None
+    else:
+        with open(body_path, "rb") as f:
+            response._content = f.read()
+    response._content_consumed = True
+    return response
+
+
+def _write_body(response, path, chunk_size):
+    path_tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(path_tmp, "wb") as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            f.write(chunk)
+    os.replace(path_tmp, path)
+
+
+def _write_atomic(path, text):
+    path_tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(path_tmp, "w") as f:
+        f.write(text)
+    os.replace(path_tmp, path)
+
+
+def _copy_file(src, dst, chunk_size):
+    with open(src, "rb") as f_src, open(dst, "wb") as f_dst:
+        for chunk in iter(lambda: f_src.read(chunk_size), b""):
+            f_dst.write(chunk)
+
+
+def _cache_key(session, url, kwargs) -> str:
+    # Hash of the request as it would be sent by `session`
+    request = requests.Request("GET", url, **{k: kwargs[k] for k in REQUEST_KWARGS if k in kwargs})
+    request = session.prepare_request(request)
+    body = request.body or b""
+    if isinstance(body, str):
+        body = body.encode()
+    key = json.dumps([request.url, sorted(request.headers.items())]).encode()
+    return hashlib.sha256(key + b"\0" + body).hexdigest()
+
+
+def _cache_paths(key):
+    return os.path.join(CACHE_DIR, f"{key}.body"), os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _lock(key) -> threading.Lock:
+    with _global_lock:
+        return _key_locks.setdefault(key, threading.Lock())
+
+
+def _prune_cache():
+    # Evict least recently used entries until the cache fits in CACHE_MAX_SIZE. Entries in use are kept.
+    if not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        entries = []
+        with os.scandir(CACHE_DIR) as it:
+            for entry in it:
+                if entry.name.endswith(".body"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.name[: -len(".body")]))
+        size_total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if size_total <= CACHE_MAX_SIZE:
+                break
+            lock = _lock(key)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                # Metadata first, so that validators never point to a missing body
+                for path in reversed(_cache_paths(key)):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+            finally:
+                lock.release()
+            size_total -= size
+    finally:
+        _prune_lock.release()
@@ -1,12 +1,10 @@
-import os
 from datetime import timedelta, datetime
 
 import pandas as pd
 
-from cowidev.utils.utils import get_project_dir
 from cowidev.utils.clean.dates import clean_date, DATE_FORMAT
 from cowidev.utils.web import request_json
-from cowidev.utils import paths
+from cowidev.utils import reference
 from cowidev.utils.s3 import obj_to_s3
 
 
@@ -134,7 +132,7 @@ class VariantsETL:
         return total
 
     def pipe_per_capita(self, df: pd.DataFrame) -> pd.DataFrame:
-        df_pop = pd.read_csv(os.path.join(paths.SCRIPTS.INPUT_UN, "population_latest.csv"), index_col="entity")
+        df_pop = reference.get_population().set_index("entity")
         df = df.merge(df_pop["population"], left_on="location", right_index=True)
         df = df.assign(num_sequences_per_1M=(1000000 * df.num_sequences / df.population).round(2)).drop(
             columns=["population"]
@@ -216,9 +214,7 @@ class VariantsETL:
 
     def pipe_filter_locations(self, df: pd.DataFrame) -> pd.DataFrame:
         # Filter locations
-        populations_path = os.path.join(get_project_dir(), "scripts", "input", "un", "population_latest.csv")
-        dfc = pd.read_csv(populations_path)
-        df = df[df.location.isin(dfc.entity.unique())]
+        df = df[df.location.isin(reference.get_population().entity)]
         return df
 
     def pipe_variant_others(self, df: pd.DataFrame) -> pd.DataFrame:
@@ -103,7 +103,7 @@ class ECDC:
         self.vaccine_mapping = {**ECDC_VACCINES, "UNK": "Unknown"}
 
     def read(self):
-        return read_csv_from_url(self.source_url, timeout=20)
+        return read_csv_from_url(self.source_url, timeout=20, cache=True)
 
     def _load_country_mapping(self, iso_path: str):
         country_mapping = pd.read_csv(iso_path)
@@ -21,6 +21,11 @@ def main():
             n_jobs=cfg.njobs,
             modules_name=cfg.countries,
             skip_countries=cfg.skip_countries,
+            timeout=cfg.timeout,
+            supervised=cfg.supervised,
+            retries=cfg.retries,
+            sync_timings=cfg.sync_timings,
+            max_concurrency=cfg.max_concurrency,
         )
     if "process" in config.mode:
         cfg = config.ProcessDataConfig()
@@ -30,6 +35,8 @@ def main():
             skip_complete=cfg.skip_complete,
             skip_monotonic=cfg.skip_monotonic_check,
             skip_anomaly=cfg.skip_anomaly_check,
+            n_jobs=cfg.njobs,
+            incremental=cfg.incremental,
         )
     if "generate" in config.mode:
         if config.check_r:
@@ -5,7 +5,9 @@ from pyaml_env import parse_config
 from itertools import chain
 
 from cowidev.utils.gdrive import GSheetApi
+from cowidev.utils.supervisor import MODULE_RETRIES, MODULE_TIMEOUT
 from cowidev.vax.cmd.get_data import (
+    MAX_CONCURRENCY,
     MODULES_NAME,
     MODULES_NAME_BATCH,
     MODULES_NAME_INCREMENTAL,
@@ -129,6 +131,11 @@ class ConfigParams(object):
             {
                 "parallel": self._return_value_pipeline("get-data", "parallel", self._parallel),
                 "njobs": self._return_value_pipeline("get-data", "njobs", self._njobs),
+                "max_concurrency": self._return_value_pipeline("get-data", "max_concurrency", MAX_CONCURRENCY),
+                "timeout": self._return_value_pipeline("get-data", "timeout", MODULE_TIMEOUT),
+                "supervised": self._return_value_pipeline("get-data", "supervised", False),
+                "retries": self._return_value_pipeline("get-data", "retries", MODULE_RETRIES),
+                "sync_timings": self._return_value_pipeline("get-data", "sync_timings", False),
                 "countries": _countries_to_modules(
                     self._return_value_pipeline("get-data", "countries", self._countries)
                 ),
@@ -166,6 +173,8 @@ class ConfigParams(object):
                 "skip_complete": self._return_value_pipeline("process-data", "skip_complete", []),
                 "skip_monotonic_check": self._get_skip_check("skip_monotonic_check"),
                 "skip_anomaly_check": self._get_skip_check("skip_anomaly_check"),
+                "njobs": self._return_value_pipeline("process-data", "njobs", -2),
+                "incremental": self._return_value_pipeline("process-data", "incremental", True),
             }
         )
 
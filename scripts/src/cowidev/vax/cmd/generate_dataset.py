@@ -1,5 +1,4 @@
 import os
-import itertools
 from datetime import datetime
 from math import isnan
 import glob
@@ -10,8 +9,9 @@ from shutil import copyfile
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
 
-from cowidev.utils import paths
-from cowidev.utils.utils import pd_series_diff_values
+from cowidev.utils import paths, reference
+from cowidev.utils.aggregates import aggregate_locations
+from cowidev.utils.utils import pd_series_diff_values, latest_by_group
 from cowidev.utils.clean import clean_date
 from cowidev.utils.log import get_logger
 from cowidev.vax.utils.checks import VACCINES_ACCEPTED
@@ -53,12 +53,12 @@ class DatasetGenerator:
         ]
 
     def build_aggregates(self):
-        continent_countries = pd.read_csv(self.inputs.continent_countries, usecols=["Entity", "Unnamed: 3"])
-        eu_countries = pd.read_csv(self.inputs.eu_countries, usecols=["Country"], squeeze=True).tolist()
+        continent_countries = reference.get_continents(self.inputs.continent_countries)
+        eu_countries = reference.get_eu_countries(self.inputs.eu_countries)
         income_groups = pd.concat(
             [
-                pd.read_csv(self.inputs.income_groups, usecols=["Country", "Income group"]),
-                pd.read_csv(self.inputs.income_groups_compl, usecols=["Country", "Income group"]),
+                reference.get_income_groups(self.inputs.income_groups),
+                reference.get_income_groups(self.inputs.income_groups_compl),
             ],
             ignore_index=True,
         )
@@ -88,13 +88,13 @@ class DatasetGenerator:
             aggregates[continent] = {
                 "excluded_locs": None,
                 "included_locs": (
-                    continent_countries.loc[continent_countries["Unnamed: 3"] == continent, "Entity"].tolist()
+                    continent_countries.loc[continent_countries.continent == continent, "location"].tolist()
                 ),
             }
-        for group in income_groups["Income group"].unique():
+        for group in income_groups.income_group.unique():
             aggregates[group] = {
                 "excluded_locs": None,
-                "included_locs": (income_groups.loc[income_groups["Income group"] == group, "Country"].tolist()),
+                "included_locs": (income_groups.loc[income_groups.income_group == group, "location"].tolist()),
             }
         return aggregates
 
@@ -113,8 +113,7 @@ class DatasetGenerator:
             return ", ".join(sorted(v.strip() for v in vaccines.split(",")))
 
         df_vax = (
-            df_vax.sort_values(by=["location", "date"])
-            .drop_duplicates(subset=["location"], keep="last")
+            latest_by_group(df_vax, "location", ffill=False)
             .rename(
                 columns={
                     "date": "last_observation_date",
@@ -146,53 +145,30 @@ class DatasetGenerator:
             ]
         ]
 
-    def _get_aggregate(self, df, agg_name, included_locs, excluded_locs):
-        # Take rows that matter
-        agg = df[~df.location.isin(self.aggregates.keys())]  # remove aggregated rows
-        if excluded_locs is not None:
-            agg = agg[~agg.location.isin(excluded_locs)]
-        elif included_locs is not None:
-            agg = agg[agg.location.isin(included_locs)]
-
-        # Get full location-date grid
-        agg = (
-            pd.DataFrame(
-                itertools.product(agg.location.unique(), agg.date.unique()),
-                columns=[agg.location.name, agg.date.name],
-            )
-            .merge(agg, on=["date", "location"], how="outer")
-            .sort_values(by=["location", "date"])
-        )
-
-        # NaN: Forward filling + Zero-filling if all metric is NaN
-        cols = [
-            "total_vaccinations",
-            "people_vaccinated",
-            "people_fully_vaccinated",
-            "total_boosters",
-        ]
-        grouper = agg.groupby("location")
-        for col in cols:
-            agg[col] = grouper[col].apply(lambda x: x.fillna(0) if x.isnull().all() else x.fillna(method="ffill"))
-
-        # Aggregate
-        agg = agg.groupby("date").sum().reset_index().assign(location=agg_name)
-        agg = agg[agg.date.dt.date < datetime.now().date()]
-        return agg
-
     def pipe_aggregates(self, df: pd.DataFrame) -> pd.DataFrame:
         logger.info(f"Building aggregate regions {list(self.aggregates.keys())}")
-        aggs = []
-        for agg_name, _ in self.aggregates.items():
-            aggs.append(
-                self._get_aggregate(
-                    df=df,
-                    agg_name=agg_name,
-                    included_locs=self.aggregates[agg_name]["included_locs"],
-                    excluded_locs=self.aggregates[agg_name]["excluded_locs"],
-                )
+        aggregates = {
+            agg_name: (
+                {"exclude": params["excluded_locs"]}
+                if params["excluded_locs"] is not None
+                else {"include": params["included_locs"]}
             )
-        return pd.concat([df] + aggs, ignore_index=True)
+            for agg_name, params in self.aggregates.items()
+        }
+        # NaN: Forward filling (locations without data count as zero)
+        aggs = aggregate_locations(
+            df[~df.location.isin(self.aggregates.keys())],  # remove aggregated rows
+            aggregates,
+            columns=[
+                "total_vaccinations",
+                "people_vaccinated",
+                "people_fully_vaccinated",
+                "total_boosters",
+            ],
+            ffill=True,
+        )
+        aggs = aggs[aggs.date.dt.date < datetime.now().date()]
+        return pd.concat([df, aggs], ignore_index=True)
 
     def pipe_daily(self, df: pd.DataFrame) -> pd.DataFrame:
         logger.info("Adding daily metrics")
@@ -261,7 +237,7 @@ class DatasetGenerator:
     def get_population(self, df_subnational: pd.DataFrame) -> pd.DataFrame:
         # Build population dataframe
         column_rename = {"entity": "location", "population": "population"}
-        pop = pd.read_csv(self.inputs.population, usecols=column_rename.keys()).rename(columns=column_rename)
+        pop = reference.get_population(self.inputs.population)[list(column_rename)].rename(columns=column_rename)
         pop = pd.concat([pop, df_subnational], ignore_index=True)
 
         # The US population denominator is more complex to calculate, as the US CDC is pulling
@@ -407,7 +383,7 @@ class DatasetGenerator:
         ].sort_values(["location", "date", "vaccine"])
 
     def pipe_manufacturer_add_eu(self, df: pd.DataFrame) -> pd.DataFrame:
-        eu_countries = pd.read_csv(self.inputs.eu_countries, usecols=["Country"], squeeze=True).tolist()
+        eu_countries = reference.get_eu_countries(self.inputs.eu_countries)
         eu_manufacturer = (
             df[df.location.isin(eu_countries)]
             .pivot(index=["location", "vaccine"], columns="date", values="total_vaccinations")
@@ -1,14 +1,22 @@
+import os
 import time
+import asyncio
 import importlib
+import threading
+from functools import partial
 
-from joblib import Parallel, delayed
+from joblib import effective_n_jobs
 import pandas as pd
 
+from cowidev.utils import paths
 from cowidev.vax.batch import __all__ as batch_countries
 from cowidev.vax.incremental import __all__ as incremental_countries
 from cowidev.utils.log import get_logger, print_eoe, system_details
 from cowidev.utils.s3 import obj_from_s3, obj_to_s3
 from cowidev.utils.clean.dates import localdate
+from cowidev.utils.supervisor import MODULE_RETRIES, MODULE_TIMEOUT, run_module_in_process, run_supervised
+from cowidev.utils.timings import TimingStore, schedule_lpt
+from cowidev.utils.web.aio import run_in_thread
 
 
 # Logger
@@ -30,10 +38,35 @@ LOG_MACHINES = "s3://covid-19/log/machines.json"
 LOG_GET_COUNTRIES = "s3://covid-19/log/vax-get-data-countries.csv"
 LOG_GET_GLOBAL = "s3://covid-19/log/vax-get-data-global.csv"
 
+# Local timings (see `cowidev.utils.timings`)
+TIMINGS_FILE = os.path.join(paths.SCRIPTS.OUTPUT_VAX_LOG, "get-data.sqlite")
+# Module execution time estimate: percentile of the last TIMING_WINDOW executions
+TIMING_PERCENTILE = 0.9
+TIMING_WINDOW = 10
+
+# Maximum number of modules running at the same time with `parallel`. Modules are I/O-bound, so this does not depend
+# on the number of CPUs: load on each host is limited by the shared HTTP session (see `cowidev.utils.web.session`)
+MAX_CONCURRENCY = 32
+
 
 class CountryDataGetter:
-    def __init__(self, skip_countries: list):
+    def __init__(self, skip_countries: list, timeout: float = None):
+        """Module runner.
+
+        Args:
+            skip_countries (list): Countries to skip.
+            timeout (float, optional): If given, each module runs in a new process, which is killed after `timeout`
+                                        seconds (see `cowidev.utils.supervisor`). Defaults to None.
+        """
         self.skip_countries = skip_countries
+        self.timeout = timeout
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def is_running(self, module_name: str) -> bool:
+        """Check if a module is still running (e.g. in the thread of a module that timed out)."""
+        with self._lock:
+            return module_name in self._running
 
     def run(self, module_name: str):
         t0 = time.time()
@@ -43,43 +76,99 @@ class CountryDataGetter:
             return {"module_name": module_name, "success": None, "skipped": True, "time": None}
         args = []
         logger.info(f"VAX - {module_name}: started")
-        module = importlib.import_module(module_name)
+        with self._lock:
+            self._running.add(module_name)
         try:
-            # with time_limit(TIMEOUT):
-            module.main(*args)
-        except Exception as err:
-            success = False
-            logger.error(f"VAX - {module_name}: ❌ {err}", exc_info=True)
-        else:
-            success = True
-            logger.info(f"VAX - {module_name}: SUCCESS ✅")
+            success = self._run(module_name, args)
+        finally:
+            with self._lock:
+                self._running.discard(module_name)
         t = round(time.time() - t0, 2)
         return {"module_name": module_name, "success": success, "skipped": False, "time": t}
 
+    def _run(self, module_name, args):
+        if self.timeout is not None:
+            result = run_module_in_process(module_name, self.timeout, args)
+            success = result["success"]
+            if success:
+                logger.info(f"VAX - {module_name}: SUCCESS ✅")
+            else:
+                logger.error(f"VAX - {module_name}: ❌ {result['error']}\n{result['traceback'] or ''}")
+        else:
+            module = importlib.import_module(module_name)
+            try:
+                module.main(*args)
+            except Exception as err:
+                success = False
+                logger.error(f"VAX - {module_name}: ❌ {err}", exc_info=True)
+            else:
+                success = True
+                logger.info(f"VAX - {module_name}: SUCCESS ✅")
+        return success
+
 
 def main_get_data(
     parallel: bool = False,
     n_jobs: int = -2,
     modules_name: list = MODULES_NAME,
     skip_countries: list = [],
+    timeout: float = MODULE_TIMEOUT,
+    supervised: bool = False,
+    retries: int = MODULE_RETRIES,
+    sync_timings: bool = False,
+    max_concurrency: int = MAX_CONCURRENCY,
 ):
     """Get data from sources and export to output folder.
 
     Is equivalent to script `run_python_scripts.py`
+
+    Args:
+        parallel (bool, optional): Set to True to run modules concurrently (see `run_modules_async`). Defaults to
+                                    False.
+        n_jobs (int, optional): Maximum number of processes running at the same time (only if `supervised`), with
+                                joblib semantics. Defaults to -2.
+        modules_name (list, optional): Modules to run. Defaults to all modules.
+        skip_countries (list, optional): Countries to skip. Defaults to [].
+        timeout (float, optional): Maximum execution time of a module, in seconds (only if `parallel` or
+                                    `supervised`). Defaults to MODULE_TIMEOUT.
+        supervised (bool, optional): Set to True to run each module in its own process, killed on time out, with
+                                        `n_jobs` processes at a time (joblib semantics). Failed modules are retried
+                                        with backoff (see `cowidev.utils.supervisor.run_supervised`). Overrides
+                                        `parallel`. Defaults to False.
+        retries (int, optional): Maximum number of retries of a failed module (only if `supervised`). Defaults to
+                                    MODULE_RETRIES.
+        sync_timings (bool, optional): Set to True to merge the local timings (see TIMINGS_FILE) into the logs in
+                                        S3 after a complete run. If the local store is empty, it is first seeded from
+                                        S3. Defaults to False.
+        max_concurrency (int, optional): Maximum number of modules running at the same time (only if `parallel`).
+                                            Defaults to MAX_CONCURRENCY.
     """
     t0 = time.time()
     print("-- Getting data... --")
     skip_countries = [x.lower() for x in skip_countries]
-    country_data_getter = CountryDataGetter(skip_countries)
-    modules_name = _load_modules_order(modules_name)
-    if parallel:
-        modules_execution_results = Parallel(n_jobs=n_jobs, backend="threading")(
-            delayed(country_data_getter.run)(
-                module_name,
-            )
-            for module_name in modules_name
+    n_workers = _n_workers(parallel, supervised, n_jobs, max_concurrency, len(modules_name))
+    modules_name = _load_modules_order(modules_name, n_workers, sync_timings)
+    run_modules = None
+    if supervised:
+        # Retries happen within the run (with backoff)
+        country_data_getter = CountryDataGetter(skip_countries, timeout=timeout)
+        modules_execution_results = run_supervised(
+            country_data_getter.run,
+            modules_name,
+            max_workers=effective_n_jobs(n_jobs),
+            retries=retries,
+        )
+    elif parallel:
+        country_data_getter = CountryDataGetter(skip_countries)
+        run_modules = partial(
+            run_modules_async,
+            country_data_getter,
+            max_concurrency=max_concurrency,
+            timeout=timeout,
         )
+        modules_execution_results = run_modules(modules_name)
     else:
+        country_data_getter = CountryDataGetter(skip_countries)
         modules_execution_results = []
         for module_name in modules_name:
             modules_execution_results.append(
@@ -91,15 +180,63 @@ def main_get_data(
     # Get timing dataframe
     df_exec = _build_df_execution(modules_execution_results)
     # Retry failed modules
-    _retry_modules_failed(modules_execution_results, country_data_getter)
+    if supervised:
+        _print_modules_failed(modules_execution_results)
+    else:
+        _retry_modules_failed(modules_execution_results, country_data_getter, run_modules)
     # Print timing details
     t_sec_1, t_min_1, t_sec_2, t_min_2 = _print_timing(t0, t_sec_1, df_exec)
     # Export log info
-    _export_log_info(df_exec, t_sec_1, t_sec_2)
+    _export_log_info(df_exec, t_sec_1, t_sec_2, sync_timings)
 
     print_eoe()
 
 
+def run_modules_async(
+    country_data_getter: CountryDataGetter,
+    modules_name: list,
+    max_concurrency: int = None,
+    timeout: float = MODULE_TIMEOUT,
+) -> list:
+    """Run modules concurrently on an asyncio event loop.
+
+    Modules are synchronous, so each of them runs in its own (daemon) thread. A module still running after `timeout`
+    seconds is reported as failed; its thread is left behind and does not block the end of the step (it is not
+    retried while it keeps running, see `_retry_modules_failed`).
+
+    Args:
+        country_data_getter (CountryDataGetter): Module runner.
+        modules_name (list): Modules to run.
+        max_concurrency (int, optional): Maximum number of modules running at the same time. Defaults to None (no
+                                            limit).
+        timeout (float, optional): Maximum execution time of a module, in seconds. Defaults to MODULE_TIMEOUT.
+
+    Returns:
+        list: Execution results (see `CountryDataGetter.run`), in the order of `modules_name`.
+    """
+    return asyncio.run(_run_modules_async(country_data_getter, modules_name, max_concurrency, timeout))
+
+
+async def _run_modules_async(country_data_getter, modules_name, max_concurrency, timeout):
+    semaphore = asyncio.Semaphore(max_concurrency or max(len(modules_name), 1))
+
+    async def _run(module_name):
+        async with semaphore:
+            t0 = time.time()
+            try:
+                return await asyncio.wait_for(run_in_thread(country_data_getter.run, module_name), timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"VAX - {module_name}: ❌ Timed out after {timeout} seconds")
+                return {
+                    "module_name": module_name,
+                    "success": False,
+                    "skipped": False,
+                    "time": round(time.time() - t0, 2),
+                }
+
+    return await asyncio.gather(*[_run(module_name) for module_name in modules_name])
+
+
 def _build_df_execution(modules_execution_results):
     df_exec = (
         pd.DataFrame(
@@ -114,60 +251,75 @@ def _build_df_execution(modules_execution_results):
     return df_exec
 
 
-def _export_log_info(df_exec, t_sec_1, t_sec_2):
+def _export_log_info(df_exec, t_sec_1, t_sec_2, sync_timings=False):
+    details = system_details()
+    date_now = localdate(force_today=True)
+    machine = details["id"]
+    # Export timings per country
+    store = TimingStore(TIMINGS_FILE)
+    store.record_executions(df_exec.reset_index(), date_now, machine)
     # print(len(df_new), len(MODULES_NAME), len(df_new) == len(MODULES_NAME))
     if len(df_exec) == len(MODULES_NAME):
         print("EXPORTING LOG DETAILS")
-        details = system_details()
-        date_now = localdate(force_today=True)
-        machine = details["id"]
-        # Export timings per country
-        df_exec = df_exec.reset_index().assign(date=date_now, machine=machine)
-        df = obj_from_s3(LOG_GET_COUNTRIES)
-        df = df[df.date + df.machine != date_now + machine]
-        df = pd.concat([df, df_exec])
-        obj_to_s3(df, LOG_GET_COUNTRIES)
-        # Export machine info
-        data = obj_from_s3(LOG_MACHINES)
-        if machine not in data:
-            data = {**details, machine: details["info"]}
-            obj_to_s3(data, LOG_MACHINES)
         # Export overall timing
-        report = {"machine": machine, "date": date_now, "t_sec": t_sec_1, "t_sec_retry": t_sec_2}
-        df_new = pd.DataFrame([report])
-        df = obj_from_s3(LOG_GET_GLOBAL)
-        df = df[df.date + df.machine != date_now + machine]
-        df = pd.concat([df, df_new])
-        obj_to_s3(df, LOG_GET_GLOBAL)
-
-
-def _load_modules_order(modules_name):
-    if len(modules_name) < 10:
-        return modules_name
-    df = obj_from_s3(LOG_GET_COUNTRIES)
-    # Filter by machine
-    # details = system_details()
-    # machine = details["id"]
-    # if machine in df.machine:
-    #     df = df[df.machine == machine]
-    # df = pd.read_csv(os.path.join(paths.SCRIPTS.OUTPUT_VAX_LOG, "get-data.csv"))
-    module_order_all = (
-        df.sort_values("date")
-        .drop_duplicates(subset=["module"], keep="last")
-        .sort_values("execution_time (sec)", ascending=False)
-        .module.tolist()
-    )
-    modules_name_order = [m for m in module_order_all if m in modules_name]
-    missing = [m for m in modules_name if m not in modules_name_order]
-    return modules_name_order + missing
+        store.record_run(date_now, machine, t_sec_1, t_sec_2)
+        if sync_timings:
+            _sync_log_info(store, details)
+
+
+def _sync_log_info(store, details):
+    # Merge local timings into the logs in S3 (local rows replace S3 rows from the same date and machine)
+    machine = details["id"]
+    for df_local, s3_path in [(store.executions(), LOG_GET_COUNTRIES), (store.runs(), LOG_GET_GLOBAL)]:
+        df = obj_from_s3(s3_path)
+        df = df[~(df.date + df.machine).isin(df_local.date + df_local.machine)]
+        obj_to_s3(pd.concat([df, df_local]), s3_path)
+    # Export machine info
+    data = obj_from_s3(LOG_MACHINES)
+    if machine not in data:
+        data = {**data, machine: details["info"]}
+        obj_to_s3(data, LOG_MACHINES)
 
 
-def _retry_modules_failed(modules_execution_results, country_data_getter):
+def _load_modules_order(modules_name, n_workers=1, sync_timings=False):
+    store = TimingStore(TIMINGS_FILE)
+    if sync_timings and store.is_empty():
+        # First run on this machine: start from the timings of all machines
+        store.import_executions(obj_from_s3(LOG_GET_COUNTRIES))
+    estimates = store.estimates(modules_name, percentile=TIMING_PERCENTILE, window=TIMING_WINDOW)
+    modules_name, makespan = schedule_lpt(modules_name, estimates, n_workers)
+    if estimates:
+        print(f"Expected time: {round(makespan / 60, 2)} minutes ({n_workers} modules at a time).")
+    return modules_name
+
+
+def _n_workers(parallel, supervised, n_jobs, max_concurrency, n_modules):
+    if supervised:
+        return min(effective_n_jobs(n_jobs), max(n_modules, 1))
+    if parallel:
+        return min(max_concurrency, max(n_modules, 1))
+    return 1
+
+
+def _retry_modules_failed(modules_execution_results, country_data_getter, run_modules=None):
     modules_failed = [m["module_name"] for m in modules_execution_results if m["success"] is False]
+    # A module that timed out may still be running (and writing its output), so it is not started again
+    modules_running = [m for m in modules_failed if country_data_getter.is_running(m)]
+    modules_failed = [m for m in modules_failed if m not in modules_running]
+    for module_name in modules_running:
+        logger.warning(f"VAX - {module_name}: still running, not retried")
     logger.info(f"\n---\n\nRETRIES ({len(modules_failed)})")
-    modules_execution_results = []
-    for module_name in modules_failed:
-        modules_execution_results.append(country_data_getter.run(module_name))
+    if run_modules is not None:
+        modules_execution_results = run_modules(modules_failed)
+    else:
+        modules_execution_results = [country_data_getter.run(module_name) for module_name in modules_failed]
+    modules_execution_results += [
+        {"module_name": m, "success": False, "skipped": False, "time": None} for m in modules_running
+    ]
+    _print_modules_failed(modules_execution_results)
+
+
+def _print_modules_failed(modules_execution_results):
     modules_failed_retrial = [m["module_name"] for m in modules_execution_results if m["success"] is False]
     if len(modules_failed_retrial) > 0:
         failed_str = "\n".join([f"* {m}" for m in modules_failed_retrial])
@@ -1,6 +1,13 @@
 import os
+import io
+import json
+import hashlib
+import importlib
+import inspect
+from datetime import datetime
 
 import pandas as pd
+from joblib import Parallel, delayed
 
 from pandas.core.base import DataError
 from pandas.errors import ParserError
@@ -12,6 +19,26 @@ from cowidev.vax.process import process_location
 
 logger = get_logger()
 
+# Hashes of the inputs (and outputs) processed in previous runs
+CACHE_FILE = os.path.join(paths.SCRIPTS.OUTPUT_VAX_LOG, "process-data.json")
+# Bump to invalidate the cache when its format changes
+CACHE_VERSION = 1
+# Modules with the processing code: changes to their source invalidate the cache
+CODE_MODULES = [
+    "cowidev.vax.process.process",
+    "cowidev.vax.utils.checks",
+    "cowidev.utils.clean.dates",
+    "cowidev.utils.clean.urls",
+]
+# Columns read as nullable integers when loading processed country files back
+COLUMNS_INT = [
+    "total_vaccinations",
+    "people_vaccinated",
+    "people_partly_vaccinated",
+    "people_fully_vaccinated",
+    "total_boosters",
+]
+
 
 def read_csv(filepath):
     try:
@@ -26,21 +53,36 @@ def main_process_data(
     skip_complete: list = None,
     skip_monotonic: dict = {},
     skip_anomaly: dict = {},
+    n_jobs: int = -2,
+    incremental: bool = True,
 ):
+    """Process country data and build the preliminary vaccinations file.
+
+    Args:
+        gsheets_api: Google Sheets API.
+        google_spreadsheet_vax_id (str): ID of the spreadsheet with manual data and metadata.
+        skip_complete (list, optional): Countries to leave out. Defaults to None.
+        skip_monotonic (dict, optional): Country -> metrics to skip in the monotonic check. Defaults to {}.
+        skip_anomaly (dict, optional): Country -> anomalies to skip in the anomaly check. Defaults to {}.
+        n_jobs (int, optional): Number of processes for countries that need processing (joblib semantics). Defaults
+                                to -2.
+        incremental (bool, optional): Set to True to reuse the public file of countries whose input, check settings
+                                        and processing code (see CODE_MODULES) did not change since they were last
+                                        processed (see CACHE_FILE). Defaults to True.
+    """
     print("-- Processing data... --")
     # Get data from sheets
     logger.info("Getting data from Google Spreadsheet...")
     gsheet = VaccinationGSheet(gsheets_api, google_spreadsheet_vax_id)
     df_manual_list = gsheet.df_list()
 
-    # Get automated-country data
+    # Get automated-country data (files are only read if they need processing)
     logger.info("Getting data from output...")
     automated = gsheet.automated_countries
     filepaths_auto = [paths.out_vax(country) for country in automated]
-    df_auto_list = [read_csv(filepath) for filepath in filepaths_auto]
 
     # Concatenate
-    vax = df_manual_list + df_auto_list
+    vax = df_manual_list + filepaths_auto
 
     # Check that no location is present in both manual and automated data
     manual_locations = set([df.location[0] for df in df_manual_list])
@@ -52,27 +94,113 @@ def main_process_data(
 
     # vax = [v for v in vax if v.location.iloc[0] == "Pakistan"]  # DEBUG
     # Process locations
-    def _process_location(df):
-        monotonic_check_skip = skip_monotonic.get(df.loc[0, "location"], [])
-        anomaly_check_skip = skip_anomaly.get(df.loc[0, "location"], [])
-        return process_location(df, monotonic_check_skip, anomaly_check_skip)
-
     logger.info("Processing and exporting data...")
-    vax_valid = []
-    for df in vax:
-        if "location" not in df:
-            raise ValueError(f"Column `location` missing. df: {df.tail(5)}")
-        country = df.loc[0, "location"]
-        if country.lower() not in skip_complete:
-            df = _process_location(df)
-            vax_valid.append(df)
-            # Export
-            df.to_csv(paths.out_vax(country, public=True), index=False)
-            logger.info(f"{country}: SUCCESS ✅")
+    today = str(datetime.now().date())
+    cache = _load_cache() if incremental else {}
+    checks = {"skip_monotonic": skip_monotonic, "skip_anomaly": skip_anomaly, "skip_complete": skip_complete}
+    code_hash = _code_hash()
+    keys = [_input_key(source, checks, code_hash) for source in vax]
+    results = {}
+    for i, key in enumerate(keys):
+        entry = cache.get(key)
+        if entry is not None and (not entry["date_dependent"] or entry["date"] == today):
+            df = None if entry["skipped"] else _read_processed(entry)
+            if entry["skipped"] or df is not None:
+                results[i] = {**entry, "df": df}
+                logger.info(f"{entry['location']}: {'SKIPPED 🚧' if entry['skipped'] else 'UNCHANGED ✅'}")
+    pending = [i for i in range(len(vax)) if i not in results]
+    processed = Parallel(n_jobs=n_jobs)(
+        delayed(_process_source)(vax[i], skip_complete, skip_monotonic, skip_anomaly) for i in pending
+    )
+    for i, result in zip(pending, processed):
+        results[i] = {**result, "date": today}
+        if result["skipped"]:
+            logger.info(f"{result['location']}: SKIPPED 🚧")
         else:
-            logger.info(f"{country}: SKIPPED 🚧")
+            logger.info(f"{result['location']}: SUCCESS ✅")
+    vax_valid = [results[i]["df"] for i in range(len(vax)) if not results[i]["skipped"]]
     df = pd.concat(vax_valid).sort_values(by=["location", "date"])
     df.to_csv(paths.SCRIPTS.TMP_VAX, index=False)
     gsheet.metadata.to_csv(paths.SCRIPTS.TMP_VAX_META, index=False)
+    _save_cache({key: {k: v for k, v in results[i].items() if k != "df"} for i, key in enumerate(keys)})
     logger.info("Exported ✅")
     print_eoe()
+
+
+def _process_source(source, skip_complete, skip_monotonic, skip_anomaly):
+    # Process one country (file path or DataFrame) and export its public file
+    df = read_csv(source) if isinstance(source, str) else source
+    if "location" not in df:
+        raise ValueError(f"Column `location` missing. df: {df.tail(5)}")
+    country = df.loc[0, "location"]
+    if country.lower() in skip_complete:
+        return {"location": country, "skipped": True, "df": None, "output_hash": None, "date_dependent": False}
+    monotonic_check_skip = skip_monotonic.get(country, [])
+    anomaly_check_skip = skip_anomaly.get(country, [])
+    df_processed = process_location(df, monotonic_check_skip, anomaly_check_skip)
+    # Export
+    content = df_processed.to_csv(index=False)
+    with open(paths.out_vax(country, public=True), "w", newline="") as f:
+        f.write(content)
+    return {
+        "location": country,
+        "skipped": False,
+        "df": df_processed,
+        "output_hash": _hash(content.encode()),
+        # Rows dated today or later are dropped, so the output depends on the processing date
+        "date_dependent": len(df_processed) < len(df),
+    }
+
+
+def _input_key(source, checks, code_hash):
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            content = f.read()
+    else:
+        content = source.to_csv(index=False).encode()
+    checks = json.dumps(checks, sort_keys=True, default=str).encode()
+    return _hash(content + checks + code_hash.encode())
+
+
+def _code_hash():
+    sources = [inspect.getsource(importlib.import_module(module)) for module in CODE_MODULES]
+    return _hash("\n".join(sources).encode())
+
+
+def _read_processed(entry):
+    # Load a public country file, as returned by `process_location`, if it has not changed since it was exported
+    try:
+        with open(paths.out_vax(entry["location"], public=True), "rb") as f:
+            content = f.read()
+    except FileNotFoundError:
+        return None
+    if _hash(content) != entry["output_hash"]:
+        return None
+    columns = pd.read_csv(io.BytesIO(content), nrows=0).columns
+    return pd.read_csv(
+        io.BytesIO(content),
+        dtype={col: "Int64" if col in COLUMNS_INT else str for col in columns},
+        keep_default_na=False,
+        na_values={col: "" for col in columns},
+    )
+
+
+def _hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def _load_cache():
+    try:
+        with open(CACHE_FILE) as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    if cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache["entries"]
+
+
+def _save_cache(entries):
+    os.makedirs(os.path.dirname(CACHE_FILE), exist_ok=True)
+    with open(CACHE_FILE, "w") as f:
+        json.dump({"version": CACHE_VERSION, "entries": entries}, f, indent=2)
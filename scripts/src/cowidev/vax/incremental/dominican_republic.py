@@ -1,18 +1,14 @@
 import time
 
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 
 from cowidev.utils.clean import clean_count, clean_date
+from cowidev.utils.web.scraping import get_driver
 from cowidev.vax.utils.incremental import enrich_data, increment
 
 
 def read(source: str) -> pd.Series:
-    op = Options()
-    op.add_argument("--headless")
-
-    with webdriver.Chrome(options=op) as driver:
+    with get_driver() as driver:
         driver.get(source)
         time.sleep(3)
 
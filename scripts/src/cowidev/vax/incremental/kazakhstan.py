@@ -1,15 +1,13 @@
 import pandas as pd
 from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 
 from cowidev.utils.clean import clean_count, clean_date
+from cowidev.utils.web.scraping import get_driver
 from cowidev.vax.utils.incremental import increment, enrich_data
 
 
 def read(source: str) -> pd.Series:
-    op = Options()
-    op.add_argument("--headless")
-    with webdriver.Chrome(options=op) as driver:
+    with get_driver() as driver:
         driver.get(source)
         people_vaccinated, people_fully_vaccinated = parse_vaccinations(driver)
         date = parse_date(driver)
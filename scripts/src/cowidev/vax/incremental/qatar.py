@@ -2,11 +2,10 @@ import re
 import time
 
 import pandas as pd
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
 
 from cowidev.utils.clean import clean_count
 from cowidev.utils.clean.dates import localdate
+from cowidev.utils.web.scraping import get_driver
 from cowidev.vax.utils.incremental import enrich_data, increment
 
 
@@ -15,10 +14,7 @@ def read(source: str) -> pd.Series:
 
 
 def connect_parse_data(source: str) -> pd.Series:
-    op = Options()
-    op.add_argument("--headless")
-
-    with webdriver.Chrome(options=op) as driver:
+    with get_driver() as driver:
         driver.get(source)
         time.sleep(5)
 
@@ -0,0 +1,4 @@
+import os
+
+# `cowidev.utils.paths` needs the project directory (the root of the repository)
+os.environ.setdefault("OWID_COVID_PROJECT_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
@@ -0,0 +1,130 @@
+"""Regression tests: derived JHU variables must match the row-by-row implementations they replaced."""
+
+import pandas as pd
+import pytest
+
+from cowidev.utils import paths
+from cowidev.jhu import shared
+from cowidev.megafile.steps.jhu import get_jhu
+
+LOCATIONS = ["Afghanistan", "China", "France", "Iceland", "International", "Peru", "Tonga", "World"]
+LOCATIONS_TESTING = ["France", "Peru"]
+
+
+# Implementations before vectorization
+
+
+def _get_date_of_threshold_old(df, col, threshold):
+    try:
+        return df["date"][df[col] >= threshold].iloc[0]
+    except:  # noqa: E722
+        return None
+
+
+def _date_diff_old(a, b, positive_only=False):
+    if pd.isnull(a) or pd.isnull(b):
+        return None
+    diff = (a - b).days
+    if positive_only and diff < 0:
+        return None
+    return diff
+
+
+def _days_since_old(df, spec):
+    ref_date = pd.to_datetime(_get_date_of_threshold_old(df, spec["value_col"], spec["value_threshold"]))
+    return (
+        pd.to_datetime(df["date"])
+        .map(lambda date: _date_diff_old(date, ref_date, spec["positive_only"]))
+        .astype("Int64")
+    )
+
+
+def inject_days_since_old(df):
+    df = df.copy()
+    for col, spec in shared.days_since_spec.items():
+        df[col] = (
+            df[["date", "location", spec["value_col"]]]
+            .groupby("location")
+            .apply(lambda df_group: _days_since_old(df_group, spec))
+            .reset_index(level=0, drop=True)
+        )
+    return df
+
+
+def _apply_row_cfr_100_old(row):
+    if pd.notnull(row["total_cases"]) and row["total_cases"] >= 100:
+        return row["cfr"]
+    return pd.NA
+
+
+def inject_cfr_old(df):
+    cfr_series = (df["total_deaths"] / df["total_cases"]) * 100
+    df["cfr"] = cfr_series.round(decimals=3)
+    df["cfr_100_cases"] = df.apply(_apply_row_cfr_100_old, axis=1)
+    return df
+
+
+def inject_exemplars_old(df):
+    df = shared.inject_population(df)
+
+    def mapper_days_since(row):
+        if pd.notnull(row["population"]) and row["population"] >= 5e6:
+            return row["days_since_100_total_cases"]
+        return pd.NA
+
+    df["days_since_100_total_cases_and_5m_pop"] = df.apply(mapper_days_since, axis=1)
+    countries_with_testing_data = set(shared.get_testing()["location"])
+
+    def mapper_bool(row):
+        if (
+            pd.notnull(row["days_since_100_total_cases"])
+            and pd.notnull(row["population"])
+            and row["days_since_100_total_cases"] >= 21
+            and row["population"] >= 5e6
+            and row["location"] in countries_with_testing_data
+        ):
+            return 1
+        return 0
+
+    df["5m_pop_and_21_days_since_100_cases_and_testing"] = df.apply(mapper_bool, axis=1)
+    return shared.drop_population(df)
+
+
+@pytest.fixture(scope="module")
+def df_jhu():
+    df = get_jhu(paths.DATA.JHU)
+    df = df[df.location.isin(LOCATIONS)]
+    columns = [
+        "date",
+        "location",
+        "total_cases",
+        "total_deaths",
+        "total_cases_per_million",
+        "total_deaths_per_million",
+    ]
+    return df[columns].sort_values("date").reset_index(drop=True)
+
+
+@pytest.fixture
+def testing(monkeypatch):
+    monkeypatch.setattr(shared, "get_testing", lambda: pd.DataFrame({"location": LOCATIONS_TESTING}))
+
+
+def test_inject_days_since(df_jhu):
+    pd.testing.assert_frame_equal(shared.inject_days_since(df_jhu), inject_days_since_old(df_jhu))
+
+
+def test_inject_cfr(df_jhu):
+    pd.testing.assert_frame_equal(shared.inject_cfr(df_jhu.copy()), inject_cfr_old(df_jhu.copy()))
+
+
+def test_inject_exemplars(df_jhu, testing):
+    df = shared.inject_days_since(df_jhu)
+    pd.testing.assert_frame_equal(shared.inject_exemplars(df), inject_exemplars_old(df))
+
+
+def test_csv_output(df_jhu, testing):
+    # Values are written to CSV in the same way
+    df_new = shared.inject_exemplars(shared.inject_cfr(shared.inject_days_since(df_jhu)))
+    df_old = inject_exemplars_old(inject_cfr_old(inject_days_since_old(df_jhu)))
+    assert df_new.to_csv(index=False) == df_old.to_csv(index=False)
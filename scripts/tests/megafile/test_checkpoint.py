@@ -0,0 +1,67 @@
+import pandas as pd
+import pytest
+
+from cowidev.megafile.checkpoint import MegafileCheckpoint, build_incremental
+
+
+def _build(sources):
+    # Stand-in for `build_megafile`: outer join of all sources
+    df = None
+    for source in sources.values():
+        df = source if df is None else df.merge(source, on=["location", "date"], how="outer")
+    return df.sort_values(["location", "date"]).reset_index(drop=True)
+
+
+def _sources(locations):
+    cases = pd.DataFrame(
+        {
+            "location": ["France", "France", "Spain", "Peru"],
+            "date": ["2021-01-01", "2021-01-02", "2021-01-01", "2021-01-01"],
+            "total_cases": [1.0, 2.0, 10.0, 100.0],
+        }
+    )
+    vax = pd.DataFrame(
+        {
+            "location": ["France", "Spain"],
+            "date": ["2021-01-02", "2021-01-01"],
+            "total_vaccinations": [5.0, 50.0],
+        }
+    )
+    return {name: df[df.location.isin(locations)] for name, df in {"cases": cases, "vax": vax}.items()}
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    checkpoint = MegafileCheckpoint(str(tmp_path))
+    df, changed, fingerprints = build_incremental(_sources(["France", "Spain", "Peru"]), _build, checkpoint)
+    assert changed
+    checkpoint.save(df, fingerprints)
+    return checkpoint
+
+
+def test_build_incremental_unchanged(checkpoint):
+    df, changed, _ = build_incremental(_sources(["France", "Spain", "Peru"]), _build, checkpoint)
+    assert not changed
+    pd.testing.assert_frame_equal(df, _build(_sources(["France", "Spain", "Peru"])))
+
+
+def test_build_incremental_removed_location(checkpoint):
+    df, changed, fingerprints = build_incremental(_sources(["France", "Peru"]), _build, checkpoint)
+    # Only removals: the table changed and must be exported
+    assert changed
+    pd.testing.assert_frame_equal(df, _build(_sources(["France", "Peru"])))
+    checkpoint.save(df, fingerprints)
+    df_saved, fingerprints_saved = checkpoint.load()
+    assert "Spain" not in set(df_saved.location)
+    assert "Spain" not in fingerprints_saved.index
+    # Next run has nothing to do
+    _, changed, _ = build_incremental(_sources(["France", "Peru"]), _build, checkpoint)
+    assert not changed
+
+
+def test_build_incremental_changed_location(checkpoint):
+    sources = _sources(["France", "Spain", "Peru"])
+    sources["cases"] = sources["cases"].assign(total_cases=lambda df: df.total_cases.where(df.location != "Peru", 200))
+    df, changed, _ = build_incremental(sources, _build, checkpoint)
+    assert changed
+    pd.testing.assert_frame_equal(df, _build(sources))
@@ -0,0 +1,71 @@
+import os
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cowidev.utils import paths
+from cowidev.megafile.steps.hosp import get_hosp
+from cowidev.megafile.steps.jhu import get_jhu
+from cowidev.megafile.steps.join import join_sources
+
+HOSP_FILE = os.path.join(paths.SCRIPTS.GRAPHER, "COVID-2019 - Hospital & ICU.csv")
+XM_FILE = os.path.join(paths.DATA.EXCESS_MORTALITY, "excess_mortality.csv")
+
+
+def _merge(sources):
+    # Reference implementation: chained merges, sorted by location and date
+    df = reduce(
+        lambda df, source: pd.merge(df, source[0], on=["date", "location"], how=source[1]), sources[1:], sources[0][0]
+    )
+    return df.sort_values(["location", "date"]).reset_index(drop=True)
+
+
+@pytest.fixture(scope="module")
+def public_sources():
+    vax = pd.concat(
+        [
+            pd.read_csv(os.path.join(paths.DATA.VAX_COUNTRY, filename))
+            for filename in sorted(os.listdir(paths.DATA.VAX_COUNTRY))
+            if filename.endswith(".csv")
+        ],
+        ignore_index=True,
+    )
+    vax = vax[["location", "date", "total_vaccinations", "people_vaccinated"]]
+    xm = pd.read_csv(XM_FILE, usecols=["location", "date", "p_scores_all_ages"])
+    return [
+        (get_jhu(paths.DATA.JHU), "outer"),
+        (get_hosp(HOSP_FILE), "outer"),
+        (vax, "outer"),
+        (xm, "left"),
+    ]
+
+
+def test_join_sources_public_data(public_sources):
+    df = join_sources(public_sources)
+    pd.testing.assert_frame_equal(df, _merge(public_sources))
+
+
+def test_join_sources_left_only_keeps_keys():
+    df_1 = pd.DataFrame({"location": ["A", "B"], "date": ["2021-01-02", "2021-01-01"], "x": [1, 2]})
+    df_2 = pd.DataFrame({"location": ["A", "C"], "date": ["2021-01-02", "2021-01-01"], "y": [3.0, 4.0]})
+    sources = [(df_1, "outer"), (df_2, "left")]
+    df = join_sources(sources)
+    pd.testing.assert_frame_equal(df, _merge(sources))
+    assert df.location.tolist() == ["A", "B"]
+
+
+@pytest.mark.parametrize("value", [np.nan, None])
+def test_join_sources_missing_keys(value):
+    df_1 = pd.DataFrame({"location": ["A", value], "date": ["2021-01-01", "2021-01-01"], "x": [1, 2]})
+    df_2 = pd.DataFrame({"location": ["A"], "date": ["2021-01-01"], "y": [3]})
+    with pytest.raises(ValueError, match="missing location/date"):
+        join_sources([(df_1, "outer"), (df_2, "outer")])
+
+
+def test_join_sources_mixed_key_types():
+    df_1 = pd.DataFrame({"location": ["A"], "date": ["2021-01-01"], "x": [1]})
+    df_2 = pd.DataFrame({"location": ["A"], "date": pd.to_datetime(["2021-01-01"]), "y": [3]})
+    with pytest.raises(ValueError, match="different types in column `date`"):
+        join_sources([(df_1, "outer"), (df_2, "outer")])
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cowidev.utils.aggregates import aggregate_locations, membership_matrix
+
+LOCATIONS = ["France", "Spain", "Peru"]
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame(
+        {
+            "location": ["France", "France", "Spain", "Peru"],
+            "date": ["2021-01-01", "2021-01-02", "2021-01-01", "2021-01-02"],
+            "value": [1.0, 2.0, 10.0, 100.0],
+        }
+    )
+
+
+def test_membership_matrix():
+    membership = membership_matrix(
+        LOCATIONS,
+        {
+            "All": {},
+            "All (None)": {"include": None, "exclude": None},
+            "Empty": {"include": []},
+            "Europe": {"include": ["France", "Spain"]},
+            "Not Spain": {"exclude": ["Spain"]},
+            "Not Spain (empty include)": {"include": [], "exclude": ["Spain"]},
+        },
+    )
+    expected = np.array(
+        [
+            [True, True, False, True, True, False],
+            [True, True, False, True, False, False],
+            [True, True, False, False, True, False],
+        ]
+    )
+    np.testing.assert_array_equal(membership, expected)
+
+
+def test_aggregate_locations_empty_include(df):
+    # Same as the previous vaccinations aggregates: no location, no rows
+    result = aggregate_locations(df, {"Empty": {"include": []}})
+    assert result.empty
+    assert result.columns.tolist() == ["date", "location", "value"]
+
+
+def test_aggregate_locations(df):
+    result = aggregate_locations(
+        df, {"World": {"include": None}, "Empty": {"include": []}, "Europe": {"exclude": ["Peru"]}}
+    )
+    expected = pd.DataFrame(
+        {
+            "date": ["2021-01-01", "2021-01-02", "2021-01-01", "2021-01-02"],
+            "location": ["World", "World", "Europe", "Europe"],
+            "value": [11.0, 102.0, 11.0, 2.0],
+        }
+    )
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_aggregate_locations_ffill(df):
+    result = aggregate_locations(df, {"Europe": {"include": ["France", "Spain"]}}, ffill=True)
+    assert result.value.tolist() == [11.0, 12.0]
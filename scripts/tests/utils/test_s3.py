@@ -0,0 +1,72 @@
+import socket
+
+import pandas as pd
+import pytest
+
+moto_server = pytest.importorskip("moto.server")
+
+from cowidev.utils.s3 import S3, _local_etag
+
+BUCKET = "covid-19"
+
+
+@pytest.fixture(scope="module")
+def endpoint():
+    # Local S3 stand-in
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = moto_server.ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    yield f"http://127.0.0.1:{port}"
+    server.stop()
+
+
+@pytest.fixture
+def s3(endpoint, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv("OWID_COVID_S3_ENDPOINT", endpoint)
+    s3 = S3(profile_name=None)
+    s3.client.create_bucket(Bucket=BUCKET)
+    return s3
+
+
+def test_endpoint_from_environment(s3, endpoint):
+    # The endpoint is read when the client is created, not when the module is imported
+    assert s3.client.meta.endpoint_url == endpoint
+
+
+def test_obj_roundtrip(s3):
+    df = pd.DataFrame({"location": ["France", "Spain"], "value": [1, 2]})
+    s3.obj_to_s3(df, f"s3://{BUCKET}/test/data.csv")
+    pd.testing.assert_frame_equal(s3.obj_from_s3(f"s3://{BUCKET}/test/data.csv"), df)
+    s3.obj_to_s3({"a": 1}, f"s3://{BUCKET}/test/data.json")
+    assert s3.obj_from_s3(f"s3://{BUCKET}/test/data.json") == {"a": 1}
+
+
+def test_upload_many_skip_unchanged(s3, tmp_path):
+    paths_local = []
+    for name in ["a.txt", "b.txt"]:
+        path = tmp_path / name
+        path.write_text(name)
+        paths_local.append(str(path))
+    paths_s3 = [f"s3://{BUCKET}/test/a.txt", f"s3://{BUCKET}/test/b.txt"]
+    assert s3.upload_many(paths_local, paths_s3, skip_unchanged=True) == [True, True]
+    # Only changed files are uploaded again
+    (tmp_path / "b.txt").write_text("b (changed)")
+    assert s3.upload_many(paths_local, paths_s3, skip_unchanged=True) == [False, True]
+    assert s3.obj_from_s3(paths_s3[1]) == "b (changed)"
+    # Without `skip_unchanged`, all files are uploaded
+    assert s3.upload_many(paths_local, paths_s3) == [True, True]
+
+
+def test_local_etag_multipart(s3, tmp_path):
+    # Multipart uploads have a different ETag than the MD5 of the file
+    path = tmp_path / "large.bin"
+    path.write_bytes(b"0123456789" * 1024 * 1024)
+    s3_path = f"s3://{BUCKET}/test/large.bin"
+    s3.upload_to_s3(str(path), s3_path)
+    assert s3._etag(BUCKET, "test/large.bin") == _local_etag(str(path))
+    assert s3.upload_many([str(path)], [s3_path], skip_unchanged=True) == [False]